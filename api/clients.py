@@ -0,0 +1,119 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+
+from throttle import RETRY_CONFIG, rate_limited
+from tracing import traced
+
+# Most clients kept at once; the least recently used one goes first
+CLIENT_POOL_SIZE = int(os.environ.get("CLIENT_POOL_SIZE", "512"))
+
+# Seconds a pooled client is reused before it is built again, so rotated or
+# revoked keys do not linger; 0 disables pooling
+CLIENT_POOL_TTL = float(os.environ.get("CLIENT_POOL_TTL", "900"))
+
+
+def credential_fingerprint(access_key_id, secret_access_key):
+    """Return a short hash identifying a key pair, so secrets are never used as cache keys"""
+    return hashlib.sha256(f"{access_key_id}:{secret_access_key}".encode()).hexdigest()[:16]
+
+
+class ClientPool:
+    """
+    Thread-safe LRU pool of boto3 clients with a time to live
+
+    Clients are keyed by (credential fingerprint, region, service) and share
+    one boto3 Session per key pair, so endpoint and service models are
+    loaded once instead of on every request. Every client is rate limited
+    and traced (see throttle.rate_limited and tracing.traced); both look up
+    the current request when a call is made, so a pooled client can serve
+    any number of requests.
+
+    Usage:
+        ec2 = CLIENTS.client(access_key_id, secret_access_key, "ec2", "eu-west-1")
+        CLIENTS.stats()  # {"hits": 40, "misses": 2, "hit_rate": 0.952, ...}
+    """
+
+    def __init__(self, max_size=CLIENT_POOL_SIZE, ttl=CLIENT_POOL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._clients = OrderedDict()   # (fingerprint, region, service) -> (expires, client)
+        self._sessions = OrderedDict()  # fingerprint -> (session, lock)
+        self._lock = threading.Lock()
+
+    def _session(self, fingerprint, access_key_id, secret_access_key):
+        # Called with self._lock held; a boto3 Session is not safe to build
+        # clients from concurrently, hence its own lock
+        entry = self._sessions.get(fingerprint)
+        if entry is None:
+            session = boto3.Session(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key)
+            entry = self._sessions[fingerprint] = (session, threading.Lock())
+        self._sessions.move_to_end(fingerprint)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+        return entry
+
+    def client(self, access_key_id, secret_access_key, service, region):
+        """Return the pooled, rate-limited and traced client for service in region"""
+        fingerprint = credential_fingerprint(access_key_id, secret_access_key)
+        key = (fingerprint, region, service)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.hits += 1
+                    self._clients.move_to_end(key)
+                    return entry[1]
+                self.expired += 1
+                del self._clients[key]
+            self.misses += 1
+            session, session_lock = self._session(fingerprint, access_key_id, secret_access_key)
+
+        with session_lock:
+            client = traced(rate_limited(session.client(service, region_name=region, config=RETRY_CONFIG),
+                                         fingerprint))
+        if self.ttl <= 0:
+            return client
+
+        with self._lock:
+            # Another thread may have built the same client meanwhile; keep the first
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            self._clients[key] = (now + self.ttl, client)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._sessions.clear()
+
+    def stats(self):
+        """Return the pool counters, with hit_rate over every lookup so far"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "size": len(self._clients),
+                "sessions": len(self._sessions),
+            }
+
+
+# Shared by every endpoint
+CLIENTS = ClientPool()
@@ -0,0 +1,256 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from tracing import in_context
+
+# CloudWatch accepts at most 500 MetricDataQuery entries per GetMetricData call
+MAX_QUERIES_PER_REQUEST = 500
+
+# Datapoints get_metric_statistics returns per call. Windows are split so no
+# series in a chunk is longer than this, which also keeps GetMetricData pages small
+MAX_DATAPOINTS_PER_QUERY = 1440
+
+# Concurrent chunk fetches per collect()
+CHUNK_WORKERS = 4
+
+# Datapoint period per report frequency, so longer reports stay within the limit
+PERIOD_BY_FREQUENCY = {
+    "daily": 300,      # 288 datapoints
+    "weekly": 900,     # 672 datapoints
+    "monthly": 3600,   # 720 datapoints
+}
+
+# Dimension that identifies the resource in each namespace
+RESOURCE_DIMENSIONS = {
+    "AWS/EC2": "InstanceId",
+    "CWAgent": "InstanceId",
+    "AWS/RDS": "DBInstanceIdentifier",
+}
+
+# Dimensions a CloudWatch agent metric must carry, per (metric, platform), so the
+# root volume or the memory counter is picked among everything the agent publishes
+AGENT_DIMENSIONS = {
+    ("MemoryUtilization", "windows"): [{"Name": "objectname", "Value": "Memory"}],
+    ("DiskUtilization", "linux"): [{"Name": "path", "Value": "/"}],
+    ("DiskUtilization", "windows"): [{"Name": "objectname", "Value": "LogicalDisk"}],
+}
+
+
+def plan_period(frequency):
+    """Return the datapoint period in seconds for a report frequency"""
+    return PERIOD_BY_FREQUENCY.get(frequency, PERIOD_BY_FREQUENCY["monthly"])
+
+
+def split_window(start_time, end_time, period, max_points=MAX_DATAPOINTS_PER_QUERY):
+    """
+    Split [start_time, end_time) into consecutive chunks of at most max_points datapoints
+
+    Returns:
+    List of (chunk_start, chunk_end) tuples covering the window
+    """
+    step = timedelta(seconds=period * max_points)
+    chunks = []
+    chunk_start = start_time
+    while chunk_start < end_time:
+        chunk_end = min(chunk_start + step, end_time)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def resolve_agent_dimensions(catalog, metric_name, resource_id, platform=None):
+    """
+    Return the dimension set to query a CloudWatch agent metric for one instance
+
+    Only dimension sets carrying the AGENT_DIMENSIONS of the platform qualify;
+    among several (e.g. one per Windows volume) the lowest sorted one wins, so
+    C: is picked before D:. Returns None when the agent does not publish it.
+    """
+    os_name = "windows" if str(platform).lower() == "windows" else "linux"
+    matches = catalog.find("CWAgent", metric_name, resource_id,
+                           required=AGENT_DIMENSIONS.get((metric_name, os_name)))
+    if not matches:
+        return None
+    return min(matches, key=lambda dimensions: sorted((d["Name"], d["Value"]) for d in dimensions))
+
+
+class MetricDataCollector:
+    """
+    Batch many CloudWatch metric lookups into as few GetMetricData calls as possible
+
+    Usage:
+        collector = MetricDataCollector(cloudwatch)
+        collector.add(("i-123", "CPUUtilization"), "AWS/EC2", "CPUUtilization",
+                      [{"Name": "InstanceId", "Value": "i-123"}], unit="Percent")
+        results = collector.collect(start_time, end_time)
+        results[("i-123", "CPUUtilization")]  # {'Datapoints': [...]}
+
+    Results keep the get_metric_statistics shape: each datapoint is a dict with
+    'Timestamp', the statistic name (e.g. 'Average') and 'Unit'.
+    """
+
+    def __init__(self, cloudwatch, period=300, stat="Average"):
+        self.cloudwatch = cloudwatch
+        self.period = period
+        self.stat = stat
+        self.queries = []
+
+    def add(self, key, namespace, metric_name, dimensions, unit=None):
+        """Queue a metric; key is any hashable used to look the result up after collect()"""
+        self.queries.append({
+            "key": key,
+            "namespace": namespace,
+            "metric_name": metric_name,
+            "dimensions": dimensions,
+            "unit": unit,
+        })
+
+    def collect(self, start_time, end_time):
+        """
+        Fetch every queued metric for the window and return {key: {'Datapoints': [...]}}
+
+        Windows longer than MAX_DATAPOINTS_PER_QUERY periods are split into
+        chunks that are fetched concurrently and stitched back together.
+        Keys whose series came back empty are left out.
+        """
+        chunks = split_window(start_time, end_time, self.period)
+        with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(chunks)))) as executor:
+            chunk_series = list(executor.map(in_context(lambda chunk: self._fetch_window(*chunk)), chunks))
+
+        # Chunks are half-open so they never overlap; keying by timestamp still
+        # guards against a datapoint being reported on both sides of a boundary
+        series = defaultdict(dict)
+        for fetched in chunk_series:
+            for query_id, points in fetched.items():
+                series[query_id].update(points)
+
+        results = {}
+        for index, query in enumerate(self.queries):
+            points = series.get(f"m{index}")
+            if not points:
+                continue
+            results[query["key"]] = {
+                "Label": query["metric_name"],
+                "Datapoints": [
+                    {"Timestamp": timestamp, self.stat: points[timestamp], "Unit": query["unit"] or "None"}
+                    for timestamp in sorted(points)
+                ],
+            }
+        return results
+
+    def _fetch_window(self, start_time, end_time):
+        series = defaultdict(dict)
+        for offset in range(0, len(self.queries), MAX_QUERIES_PER_REQUEST):
+            batch = self.queries[offset:offset + MAX_QUERIES_PER_REQUEST]
+            for query_id, timestamp, value in self._fetch_batch(offset, batch, start_time, end_time):
+                series[query_id][timestamp] = value
+        return series
+
+    def _fetch_batch(self, offset, batch, start_time, end_time):
+        # Ids are global so results from every batch can be matched back to self.queries
+        metric_queries = [
+            {
+                "Id": f"m{offset + position}",
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": query["namespace"],
+                        "MetricName": query["metric_name"],
+                        "Dimensions": query["dimensions"],
+                    },
+                    "Period": self.period,
+                    "Stat": self.stat,
+                },
+                "ReturnData": True,
+            }
+            for position, query in enumerate(batch)
+        ]
+
+        request = {
+            "MetricDataQueries": metric_queries,
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "ScanBy": "TimestampAscending",
+        }
+        while True:
+            response = self.cloudwatch.get_metric_data(**request)
+            for result in response["MetricDataResults"]:
+                for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                    yield result["Id"], timestamp, value
+            for message in response.get("Messages", []):
+                print(f"GetMetricData: {message.get('Code')} {message.get('Value')}")
+
+            next_token = response.get("NextToken")
+            if not next_token:
+                break
+            request["NextToken"] = next_token
+
+
+class MetricCatalog:
+    """
+    In-memory index of the metrics CloudWatch publishes in one region
+
+    Each namespace is listed once, with pagination, the first time it is
+    queried. Lookups are then dictionary hits instead of one list_metrics
+    probe per (instance, metric).
+
+    Usage:
+        catalog = MetricCatalog(cloudwatch)
+        catalog.find("CWAgent", "mem_used_percent", "i-123")
+        # [[{'Name': 'InstanceId', 'Value': 'i-123'}, {'Name': 'ImageId', ...}]]
+    """
+
+    def __init__(self, cloudwatch):
+        self.cloudwatch = cloudwatch
+        self.list_calls = 0
+        self._loaded = set()
+        self._lock = threading.Lock()
+        # (namespace, metric name) -> {resource id: [dimension list, ...]}
+        self._index = defaultdict(lambda: defaultdict(list))
+        # (namespace, metric name) -> set of dimension-name sets the metric is published under
+        self._dimension_sets = defaultdict(set)
+
+    def load(self, namespace):
+        """List every metric in a namespace and index it, unless already done"""
+        with self._lock:
+            if namespace in self._loaded:
+                return
+            resource_dimension = RESOURCE_DIMENSIONS.get(namespace)
+            for page in self.cloudwatch.get_paginator('list_metrics').paginate(Namespace=namespace):
+                self.list_calls += 1
+                for metric in page['Metrics']:
+                    key = (namespace, metric['MetricName'])
+                    dimensions = metric.get('Dimensions', [])
+                    self._dimension_sets[key].add(frozenset(d['Name'] for d in dimensions))
+                    resource_id = next((d['Value'] for d in dimensions if d['Name'] == resource_dimension), None)
+                    if resource_id is not None:
+                        self._index[key][resource_id].append(dimensions)
+            self._loaded.add(namespace)
+
+    def find(self, namespace, metric_name, resource_id, required=None):
+        """
+        Return the dimension lists a resource publishes a metric under
+
+        Parameters:
+        - required: Optional list of {'Name', 'Value'} dimensions every match must contain
+
+        Returns:
+        List of dimension lists, empty if the metric is not published for the resource
+        """
+        self.load(namespace)
+        matches = self._index.get((namespace, metric_name), {}).get(resource_id, [])
+        if required:
+            matches = [dimensions for dimensions in matches
+                       if all(dimension in dimensions for dimension in required)]
+        return matches
+
+    def resources(self, namespace, metric_name):
+        """Return the ids of every resource that publishes a metric"""
+        self.load(namespace)
+        return set(self._index.get((namespace, metric_name), {}))
+
+    def dimension_sets(self, namespace, metric_name):
+        """Return the distinct sets of dimension names a metric is published under"""
+        self.load(namespace)
+        return set(self._dimension_sets.get((namespace, metric_name), set()))
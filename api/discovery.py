@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clients import CLIENTS
+from tracing import in_context
+
+# Upper bound on concurrent (region, service) scans
+DISCOVERY_MAX_WORKERS = int(os.environ.get("DISCOVERY_MAX_WORKERS", "16"))
+
+# Error markers we report per region, in the order they are checked
+REGION_ERROR_CODES = ["AuthFailure", "OptInRequired", "UnauthorizedOperation", "AccessDenied"]
+
+
+def classify_error(error):
+    """
+    Map an exception raised while scanning a region to a short status code
+
+    Returns one of REGION_ERROR_CODES, or "Error" for anything else
+    """
+    error_msg = str(error)
+    for code in REGION_ERROR_CODES:
+        if code in error_msg:
+            return code
+    return "Error"
+
+
+def list_regions(access_key_id, secret_access_key):
+    # Default region to get region list
+    ec2_client = CLIENTS.client(access_key_id, secret_access_key, 'ec2', 'us-east-1')
+    return [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
+
+
+def scan_ec2(access_key_id, secret_access_key, region):
+    ec2 = CLIENTS.client(access_key_id, secret_access_key, 'ec2', region)
+
+    instances = []
+    for page in ec2.get_paginator('describe_instances').paginate():
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                # Only add non-terminated instances
+                if instance['State']['Name'] == 'terminated':
+                    continue
+                name = next((tag['Value'] for tag in instance.get('Tags', [])
+                             if tag['Key'] == 'Name'), instance['InstanceId'])
+                instances.append({
+                    "id": instance['InstanceId'],
+                    "name": name,
+                    "type": instance['InstanceType'],
+                    "state": instance['State']['Name'],
+                    "region": region,
+                    "selected": False
+                })
+    return instances
+
+
+def scan_rds(access_key_id, secret_access_key, region):
+    rds = CLIENTS.client(access_key_id, secret_access_key, 'rds', region)
+
+    instances = []
+    for page in rds.get_paginator('describe_db_instances').paginate():
+        for instance in page['DBInstances']:
+            instances.append({
+                "id": instance['DBInstanceIdentifier'],
+                "name": instance.get('DBName', ''),
+                "type": instance['DBInstanceClass'],
+                "engine": instance['Engine'],
+                "size": str(instance.get('AllocatedStorage', 0)) + ' GB',
+                "state": instance['DBInstanceStatus'],
+                "region": region,
+                "selected": False
+            })
+    return instances
+
+
+SCANNERS = {
+    "ec2": scan_ec2,
+    "rds": scan_rds,
+}
+
+
+def stream_fleet(access_key_id, secret_access_key, regions, max_workers=DISCOVERY_MAX_WORKERS):
+    """
+    Scan EC2 and RDS in every region concurrently, yielding each region as
+    soon as all its scans are done
+
+    Parameters are those of discover_fleet. Closing the generator early
+    cancels the scans that have not started yet.
+
+    Yields:
+    Dictionaries with "region", "ec2Instances", "rdsInstances" and "status",
+    the region's per-service status described in discover_fleet, in the
+    order the regions finish
+    """
+    results = {region: {} for region in regions}
+    region_status = {region: {} for region in regions}
+    remaining = {region: len(SCANNERS) for region in regions}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(regions) * len(SCANNERS))))
+    try:
+        futures = {
+            executor.submit(in_context(scanner), access_key_id, secret_access_key, region): (region, service)
+            for region in regions
+            for service, scanner in SCANNERS.items()
+        }
+        for future in as_completed(futures):
+            region, service = futures[future]
+            try:
+                instances = future.result()
+                results[region][service] = instances
+                region_status[region][service] = {"status": "ok", "count": len(instances)}
+            except Exception as e:
+                status = classify_error(e)
+                print(f"{status} while scanning {service} in region {region}: {e}")
+                region_status[region][service] = {"status": status, "error": str(e)}
+
+            remaining[region] -= 1
+            if remaining[region] == 0:
+                yield {
+                    "region": region,
+                    "ec2Instances": results[region].get("ec2", []),
+                    "rdsInstances": results[region].get("rds", []),
+                    "status": region_status[region],
+                }
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def discover_fleet(access_key_id, secret_access_key, regions, max_workers=DISCOVERY_MAX_WORKERS):
+    """
+    Scan EC2 and RDS in every region concurrently
+
+    Parameters:
+    - access_key_id, secret_access_key: Credentials used for every region
+    - regions: List of region names to scan
+    - max_workers: Size of the worker pool shared by all (region, service) scans
+
+    Returns:
+    Dictionary with "ec2Instances", "rdsInstances" and "regions", where
+    "regions" maps each region to a per-service status, e.g.
+    {"ec2": {"status": "ok", "count": 3}, "rds": {"status": "OptInRequired", "error": "..."}}
+    """
+    finished = {record["region"]: record
+                for record in stream_fleet(access_key_id, secret_access_key, regions, max_workers)}
+
+    # Merge in region order so the response is stable between calls
+    return {
+        "ec2Instances": [i for region in regions for i in finished[region]["ec2Instances"]],
+        "rdsInstances": [i for region in regions for i in finished[region]["rdsInstances"]],
+        "regions": {region: finished[region]["status"] for region in regions},
+    }
@@ -1,12 +1,29 @@
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import threading
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
+from datetime import datetime, timedelta
+
+from clients import CLIENTS
+from cloudwatch import MetricCatalog, MetricDataCollector, plan_period, resolve_agent_dimensions
+from discovery import discover_fleet, list_regions, stream_fleet
+from executor import run_io, shutdown as shutdown_executors
+from prometheus import TraceMetrics, render_client_pool
+from tracing import Trace, add_observer, count, stage
+from validation import cached_regions, validate
 
 app = FastAPI()
+app.router.add_event_handler("shutdown", shutdown_executors)
+
+# Every finished request trace also feeds the counters served at /metrics
+trace_metrics = TraceMetrics()
+add_observer(trace_metrics.observe)
 
 # Configure CORS
 app.add_middleware(
@@ -30,232 +47,295 @@ class Instance(BaseModel):
     state: str
     region: str
     selected: bool = False
+    engine: Optional[str] = None
+    platform: Optional[str] = None
+
+def validation_region(credentials: Credentials):
+    # Default region for validation when the user gave none
+    return credentials.region if credentials.region else 'me-central-1'
+
+def check_credentials(credentials: Credentials):
+    return validate(credentials.accessKeyId, credentials.secretAccessKey, validation_region(credentials))
 
 @app.post("/validate-credentials")
 async def validate_credentials(credentials: Credentials):
     try:
-        # Use us-east-1 as default region for validation
-        region = credentials.region if credentials.region else 'me-central-1'
-        session = boto3.Session(
-            aws_access_key_id=credentials.accessKeyId,
-            aws_secret_access_key=credentials.secretAccessKey,
-            region_name=region
-        )
-        ec2 = session.client('ec2')
-        ec2.describe_instances()
-        return {"status": "success", "message": "Credentials validated successfully"}
+        with Trace("validate_credentials").activate():
+            result = await run_io(check_credentials, credentials)
+        denied = [name for name, probe in result["permissions"].items() if probe["status"] != "ok"]
+        message = "Credentials validated successfully"
+        if denied:
+            message += f"; missing or failed permissions: {', '.join(sorted(denied))}"
+        return {"status": "success", "message": message, **result}
     except (ClientError, NoCredentialsError) as e:
         raise HTTPException(status_code=401, detail=str(e))
 
+async def fleet_regions(credentials: Credentials):
+    # Listed already if the same key pair was just validated
+    regions = cached_regions(credentials.accessKeyId, credentials.secretAccessKey, validation_region(credentials))
+    if regions is None:
+        return await run_io(list_regions, credentials.accessKeyId, credentials.secretAccessKey)
+    count("cached_regions")
+    return regions
+
+def user_region_error(credentials: Credentials, region_status):
+    # An EC2 error in the user's specified region fails the request
+    user_region = region_status.get(credentials.region, {}).get("ec2", {})
+    if user_region.get("status", "ok") != "ok":
+        return f"Error accessing region {credentials.region}: {user_region['error']}"
+    return None
+
 @app.post("/instances")
 async def get_instances(credentials: Credentials):
     try:
-        # First create a session with default region to get list of all regions
-        session = boto3.Session(
-            aws_access_key_id=credentials.accessKeyId,
-            aws_secret_access_key=credentials.secretAccessKey,
-            region_name='us-east-1'  # Default region to get region list
-        )
-
-        ec2_client = session.client('ec2')
-        regions = [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
-
-        ec2_instances = []
-
-        print("Fetching instances from all AWS regions:")
-        print("----------------------------------------")
-
-        # Iterate through each region
-        for region in regions:
-            print(f"\nScanning region: {region}")
-            regional_session = boto3.Session(
-                aws_access_key_id=credentials.accessKeyId,
-                aws_secret_access_key=credentials.secretAccessKey,
-                region_name=region
-            )
-
-            ec2 = regional_session.client('ec2')
-            try:
-                response = ec2.describe_instances()
-
-                for reservation in response['Reservations']:
-                    for instance in reservation['Instances']:
-                        name = next((tag['Value'] for tag in instance.get('Tags', []) 
-                                   if tag['Key'] == 'Name'), instance['InstanceId'])
-                        # Only add non-terminated instances
-                        if instance['State']['Name'] != 'terminated':
-                            instance_data = {
-                                "id": instance['InstanceId'],
-                                "name": name,
-                                "type": instance['InstanceType'],
-                                "state": instance['State']['Name'],
-                                "region": region,
-                                "selected": False
-                            }
-                            print(f"✓ Found instance: {instance_data['name']} ({instance_data['id']}) - {instance_data['type']} - {instance_data['state']}")
-                            ec2_instances.append(instance_data)
-
-                if len(response['Reservations']) == 0:
-                    print(f"No instances found in region {region}")
-            except Exception as e:
-                error_msg = str(e)
-                if 'AuthFailure' in error_msg:
-                    print(f"Authentication failed for region {region}: {error_msg}")
-                elif 'OptInRequired' in error_msg:
-                    print(f"Region {region} requires opt-in: {error_msg}")
-                elif 'UnauthorizedOperation' in error_msg:
-                    print(f"Unauthorized operation in region {region}: {error_msg}")
-                elif 'AccessDenied' in error_msg:
-                    print(f"Access denied in region {region}: {error_msg}")
-                else:
-                    print(f"Error in region {region}: {error_msg}")
+        with Trace("instances").activate():
+            with stage("regions"):
+                regions = await fleet_regions(credentials)
+
+            print(f"Fetching instances from {len(regions)} AWS regions")
+            with stage("discovery"):
+                fleet = await run_io(discover_fleet, credentials.accessKeyId, credentials.secretAccessKey, regions)
+            count("regions", len(regions))
+            count("ec2_instances", len(fleet["ec2Instances"]))
+            count("rds_instances", len(fleet["rdsInstances"]))
+
+            # If this is the user's specified region, raise the error
+            error = user_region_error(credentials, fleet["regions"])
+            if error:
+                raise HTTPException(status_code=400, detail=error)
 
-                # If this is the user's specified region, raise the error
-                if region == credentials.region:
-                    raise HTTPException(status_code=400, detail=f"Error accessing region {region}: {error_msg}")
-                continue
+            # If no instances found in any region, add debug info
+            if len(fleet["ec2Instances"]) == 0:
+                print("No instances found in any region. Credentials region:", credentials.region)
+                print("AWS Access Key ID:", credentials.accessKeyId[:4] + "..." + credentials.accessKeyId[-4:])
 
-        # If no instances found in any region, add debug info
-        if len(ec2_instances) == 0:
-            print("No instances found in any region. Credentials region:", credentials.region)
-            print("AWS Access Key ID:", credentials.accessKeyId[:4] + "..." + credentials.accessKeyId[-4:])
+            print(f"✓ Found {len(fleet['ec2Instances'])} EC2 and {len(fleet['rdsInstances'])} RDS instances")
+            return fleet
 
-        # Get RDS instances for each region
-        rds_instances = []
-        for region in regions:
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Streaming formats of /instances/stream, chosen by the Accept header
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def encode_record(record, media_type):
+    data = json.dumps(record)
+    if media_type == SSE_MEDIA_TYPE:
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def scan_fleet(credentials: Credentials, trace: Trace, regions, emit):
+    """
+    Scan every region under trace, calling emit(record) with a "region"
+    record as soon as a region's EC2 and RDS scans finish, then with a
+    "summary" record (or an "error" record if the scan broke)
+    """
+    with trace.activate():
+        loop = asyncio.get_running_loop()
+        stopped = threading.Event()
+        region_status = {}
+        counts = {"ec2Count": 0, "rdsCount": 0}
+
+        def scan():
+            records = stream_fleet(credentials.accessKeyId, credentials.secretAccessKey, regions)
             try:
-                rds_client = boto3.client('rds',
-                                        region_name=region,
-                                        aws_access_key_id=credentials.accessKeyId,
-                                        aws_secret_access_key=credentials.secretAccessKey)
-
-                rds_response = rds_client.describe_db_instances()
-                for instance in rds_response['DBInstances']:
-                    rds_instances.append({
-                        "id": instance['DBInstanceIdentifier'],
-                        "name": instance.get('DBName', ''),
-                        "type": instance['DBInstanceClass'],
-                        "engine": instance['Engine'],
-                        "size": str(instance.get('AllocatedStorage', 0)) + ' GB',
-                        "state": instance['DBInstanceStatus'],
-                        "region": region,
-                        "selected": False
-                    })
-                    print(f"✓ Found RDS instance: {instance['DBInstanceIdentifier']} - {instance['Engine']} - {instance['DBInstanceStatus']}")
+                for record in records:
+                    region_status[record["region"]] = record["status"]
+                    counts["ec2Count"] += len(record["ec2Instances"])
+                    counts["rdsCount"] += len(record["rdsInstances"])
+                    loop.call_soon_threadsafe(emit, {"type": "region", **record})
+                    if stopped.is_set():
+                        break
+            finally:
+                records.close()
+
+        with stage("discovery"):
+            try:
+                await run_io(scan)
             except Exception as e:
-                if 'OptInRequired' not in str(e) and 'AuthFailure' not in str(e):
-                    print(f"Error fetching RDS instances in region {region}: {str(e)}")
+                trace.status = "error"
+                emit({"type": "error", "detail": str(e)})
+                return
+            finally:
+                # The client went away or the scan failed: start no more scans
+                stopped.set()
+        count("regions", len(regions))
+        count("ec2_instances", counts["ec2Count"])
+        count("rds_instances", counts["rdsCount"])
+
+        summary = {"type": "summary", **counts,
+                   "regions": {region: region_status.get(region, {}) for region in regions}}
+        error = user_region_error(credentials, region_status)
+        if error:
+            summary["error"] = error
+        print(f"✓ Streamed {counts['ec2Count']} EC2 and {counts['rdsCount']} RDS instances from {len(regions)} regions")
+        emit(summary)
 
-        return {
-            "ec2Instances": ec2_instances,
-            "rdsInstances": rds_instances
-        }
+@app.post("/instances/stream")
+async def stream_instances(credentials: Credentials, accept: Optional[str] = Header(None)):
+    """
+    /instances as a stream of JSON records, sent as NDJSON, or as
+    Server-Sent Events when the request accepts text/event-stream
 
+    Records, each with a "type":
+    - "start": {"regions": [...]}, the regions that will be scanned
+    - "region": {"region", "ec2Instances", "rdsInstances", "status"}, one per region as it finishes
+    - "summary": {"ec2Count", "rdsCount", "regions", "error"?}, with "error" set
+      where /instances would answer 400
+    - "error": {"detail"}, if the scan itself failed
+    """
+    media_type = SSE_MEDIA_TYPE if accept and SSE_MEDIA_TYPE in accept else NDJSON_MEDIA_TYPE
+    # Errors before the first record still get a proper status code
+    trace = Trace("instances_stream")
+    try:
+        with trace.stage("regions"):
+            regions = await fleet_regions(credentials)
     except Exception as e:
+        trace.status = "error"
+        trace.finish()
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/generate-report")
-async def generate_report(provider: str, credentials: Credentials, selected_instances: List[Instance], frequency: str):
-    try:
-        # Calculate time period based on frequency
-        now = datetime.now()
-        if frequency == "daily":
-            start_time = now - timedelta(days=1)
-        elif frequency == "weekly":
-            start_time = now - timedelta(weeks=1)
-        else:  # monthly
-            start_time = now - timedelta(days=30)
-
-        # Initialize AWS client
-        session = boto3.Session(
-            aws_access_key_id=credentials.accessKeyId,
-            aws_secret_access_key=credentials.secretAccessKey,
-            region_name=credentials.region or 'me-central-1'
-        )
-
-        cloudwatch = session.client('cloudwatch')
-        ec2 = session.client('ec2')
-        rds = session.client('rds')
-
-        report_data = {
-            "instances": [],
-            "rds_instances": []
-        }
-
-        # Get metrics for each instance
-        for instance in selected_instances:
-            if hasattr(instance, 'engine'):  # RDS instance
-                metrics = {
-                    'CPUUtilization': {'Namespace': 'AWS/RDS'},
-                    'FreeableMemory': {'Namespace': 'AWS/RDS'},
-                    'FreeStorageSpace': {'Namespace': 'AWS/RDS'}
-                }
-                instance_data = {
-                    "id": instance.id,
-                    "type": instance.type,
-                    "engine": instance.engine,
-                    "metrics": {}
-                }
-            else:  # EC2 instance
-                metrics = {
-                    'CPUUtilization': {'Namespace': 'AWS/EC2'},
-                    'MemoryUtilization': {'Namespace': 'CWAgent'},
-                    'DiskUtilization': {'Namespace': 'CWAgent'}
-                }
-                instance_data = {
-                    "id": instance.id,
-                    "name": instance.name,
-                    "type": instance.type,
-                    "metrics": {}
-                }
-
-                # Get Windows disk metrics if it's a Windows instance
-                if instance.platform == 'windows':
+    async def body():
+        # The scan runs as its own task, so the trace starts and ends in one
+        # context however the stream ends; a client disconnect cancels it
+        queue = asyncio.Queue()
+        scanning = asyncio.create_task(scan_fleet(credentials, trace, regions, queue.put_nowait))
+        scanning.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            yield encode_record({"type": "start", "regions": regions}, media_type)
+            while (record := await queue.get()) is not None:
+                yield encode_record(record, media_type)
+            await scanning
+        finally:
+            scanning.cancel()
+
+    # No-transform and no buffering, so proxies pass each record on as it comes
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
+def collect_report_data(credentials: Credentials, selected_instances: List[Instance], frequency: str):
+    # Calculate time period based on frequency
+    now = datetime.now()
+    if frequency == "daily":
+        start_time = now - timedelta(days=1)
+    elif frequency == "weekly":
+        start_time = now - timedelta(weeks=1)
+    else:  # monthly
+        start_time = now - timedelta(days=30)
+
+    # Pooled AWS clients; every collector call shares the account's per-service rate limits
+    region = credentials.region or 'me-central-1'
+    cloudwatch = CLIENTS.client(credentials.accessKeyId, credentials.secretAccessKey, 'cloudwatch', region)
+    ec2 = CLIENTS.client(credentials.accessKeyId, credentials.secretAccessKey, 'ec2', region)
+
+    report_data = {
+        "instances": [],
+        "rds_instances": []
+    }
+
+    # Queue every (instance, metric) pair, then fetch them together with GetMetricData
+    # Coarser periods for longer reports keep every series within the datapoint limit
+    collector = MetricDataCollector(cloudwatch, period=plan_period(frequency))
+    # One paginated listing per namespace instead of a list_metrics probe per instance
+    catalog = MetricCatalog(cloudwatch)
+    queued = []
+
+    for instance in selected_instances:
+        if instance.engine:  # RDS instance
+            metrics = {
+                'CPUUtilization': {'Namespace': 'AWS/RDS', 'Unit': 'Percent'},
+                'FreeableMemory': {'Namespace': 'AWS/RDS', 'Unit': 'Bytes'},
+                'FreeStorageSpace': {'Namespace': 'AWS/RDS', 'Unit': 'Bytes'}
+            }
+            dimensions = [{'Name': 'DBInstanceIdentifier', 'Value': instance.id}]
+            instance_data = {
+                "id": instance.id,
+                "type": instance.type,
+                "engine": instance.engine,
+                "metrics": {}
+            }
+        else:  # EC2 instance
+            metrics = {
+                'CPUUtilization': {'Namespace': 'AWS/EC2', 'Unit': 'Percent'},
+                'MemoryUtilization': {'Namespace': 'CWAgent', 'Unit': 'Percent'},
+                'DiskUtilization': {'Namespace': 'CWAgent', 'Unit': 'Percent'}
+            }
+            dimensions = [{'Name': 'InstanceId', 'Value': instance.id}]
+            instance_data = {
+                "id": instance.id,
+                "name": instance.name,
+                "type": instance.type,
+                "metrics": {}
+            }
+
+            # Get Windows disk metrics if it's a Windows instance
+            if instance.platform == 'windows':
+                with stage("volumes"):
                     response = ec2.describe_volumes(
                         Filters=[{'Name': 'attachment.instance-id', 'Values': [instance.id]}]
                     )
-                    instance_data["disk_volumes"] = response['Volumes']
+                instance_data["disk_volumes"] = response['Volumes']
 
-            # Get CloudWatch metrics, focusing on CPU if others unavailable
-            for metric_name, metric_info in metrics.items():
+        # Only queue CloudWatch agent metrics the instance actually publishes
+        for metric_name, metric_info in metrics.items():
+            metric_dimensions = dimensions
+            if metric_info['Namespace'] == 'CWAgent':
                 try:
-                    # Only try non-CPU metrics if they're available
-                    if metric_name != 'CPUUtilization' and metric_info['Namespace'] == 'CWAgent':
-                        # Test if CloudWatch agent metrics exist
-                        test_response = cloudwatch.list_metrics(
-                            Namespace=metric_info['Namespace'],
-                            MetricName=metric_name,
-                            Dimensions=[{'Name': 'InstanceId', 'Value': instance.id}]
-                        )
-                        if not test_response.get('Metrics'):
-                            print(f"Skipping {metric_name} - CloudWatch agent metrics not available for {instance.id}")
-                            continue
-
-                    response = cloudwatch.get_metric_statistics(
-                        Namespace=metric_info['Namespace'],
-                        MetricName=metric_name,
-                        Dimensions=[{'Name': 'InstanceId', 'Value': instance.id}],
-                        StartTime=start_time,
-                        EndTime=now,
-                        Period=300,  # 5-minute intervals
-                        Statistics=['Average']
-                    )
-                    
-                    if response['Datapoints']:
-                        instance_data["metrics"][metric_name] = response['Datapoints']
-                    else:
-                        print(f"No {metric_name} data points available for {instance.id}")
+                    with stage("metric_catalog"):
+                        metric_dimensions = resolve_agent_dimensions(catalog, metric_name, instance.id,
+                                                                     instance.platform)
                 except Exception as e:
-                    print(f"Error getting {metric_name} for instance {instance.id}: {str(e)}")
-                    # If CPU metrics fail, note it in the response
-                    if metric_name == 'CPUUtilization':
-                        instance_data["metrics"][metric_name] = "Metrics unavailable"
+                    print(f"Error checking {metric_name} for instance {instance.id}: {str(e)}")
+                    continue
+                if metric_dimensions is None:
+                    print(f"Skipping {metric_name} - CloudWatch agent metrics not available for {instance.id}")
+                    continue
+            collector.add((instance.id, metric_name), metric_info['Namespace'], metric_name,
+                          metric_dimensions, unit=metric_info['Unit'])
 
-            if hasattr(instance, 'engine'):
-                report_data["rds_instances"].append(instance_data)
-            else:
-                report_data["instances"].append(instance_data)
+        queued.append((instance, instance_data, metrics))
 
-        return report_data
+    try:
+        with stage("metric_data"):
+            results = collector.collect(start_time, now)
+    except Exception as e:
+        print(f"Error getting metrics for {len(queued)} instances: {str(e)}")
+        results = None
+
+    for instance, instance_data, metrics in queued:
+        if results is None:
+            # If CPU metrics fail, note it in the response
+            instance_data["metrics"]['CPUUtilization'] = "Metrics unavailable"
+        else:
+            for metric_name in metrics:
+                data = results.get((instance.id, metric_name))
+                if data:
+                    instance_data["metrics"][metric_name] = data['Datapoints']
+                    count("datapoints", len(data['Datapoints']))
+                else:
+                    print(f"No {metric_name} data points available for {instance.id}")
+
+        if instance.engine:
+            report_data["rds_instances"].append(instance_data)
+        else:
+            report_data["instances"].append(instance_data)
+
+    return report_data
+
+@app.post("/generate-report")
+async def generate_report(provider: str, credentials: Credentials, selected_instances: List[Instance], frequency: str):
+    try:
+        with Trace("generate_report", frequency=frequency).activate():
+            count("instances", len(selected_instances))
+            return await run_io(collect_report_data, credentials, selected_instances, frequency)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus counters of the traced /instances and /generate-report runs and of the client pool"""
+    body = trace_metrics.render() + render_client_pool(CLIENTS.stats())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,95 @@
+import threading
+
+from tracing import peak_rss_bytes
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "cloud_reports"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + text + "}" if text else ""
+
+
+def _metric(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{METRIC_PREFIX}_{name}{_labels(labels)} {value}")
+
+
+class TraceMetrics:
+    """
+    Prometheus counters built from finished trace records
+
+    Only the trace and stage names become labels; account IDs and other
+    per-run labels stay in the JSON records to keep the series count fixed.
+
+    Usage:
+        metrics = TraceMetrics()
+        tracing.add_observer(metrics.observe)
+        ...
+        body = metrics.render()  # text exposition format for GET /metrics
+    """
+
+    def __init__(self):
+        self._runs = {}        # (trace, status) -> count
+        self._seconds = {}     # trace -> seconds
+        self._stages = {}      # (trace, stage) -> {"seconds", "calls", "api_calls", "response_bytes"}
+        self._counters = {}    # (trace, counter) -> total
+        self._lock = threading.Lock()
+
+    def observe(self, record):
+        trace = record["trace"]
+        with self._lock:
+            key = (trace, record["status"])
+            self._runs[key] = self._runs.get(key, 0) + 1
+            self._seconds[trace] = self._seconds.get(trace, 0.0) + record["seconds"]
+            for name, values in record["stages"].items():
+                totals = self._stages.setdefault((trace, name), dict.fromkeys(
+                    ("seconds", "calls", "api_calls", "response_bytes"), 0))
+                for field in totals:
+                    totals[field] += values.get(field, 0)
+            for name, value in record["counters"].items():
+                self._counters[(trace, name)] = self._counters.get((trace, name), 0) + value
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            _metric(lines, name, kind, help_text, samples)
+
+        with self._lock:
+            metric("runs_total", "counter", "Finished traced runs",
+                   [({"trace": trace, "status": status}, count) for (trace, status), count in self._runs.items()])
+            metric("run_seconds_total", "counter", "Wall time of finished traced runs",
+                   [({"trace": trace}, round(seconds, 6)) for trace, seconds in self._seconds.items()])
+            for field, help_text in (("seconds", "Wall time spent in a stage"),
+                                     ("calls", "Times a stage ran"),
+                                     ("api_calls", "AWS HTTP requests made in a stage, retries included"),
+                                     ("response_bytes", "AWS response bytes received in a stage")):
+                metric(f"stage_{field}_total", "counter", help_text,
+                       [({"trace": trace, "stage": name}, round(totals[field], 6))
+                        for (trace, name), totals in self._stages.items()])
+            metric("events_total", "counter", "Trace counters (charts, PDF bytes, instances, ...)",
+                   [({"trace": trace, "counter": name}, value) for (trace, name), value in self._counters.items()])
+        metric("process_peak_rss_bytes", "gauge", "Peak resident set size of the API process",
+               [({}, peak_rss_bytes())])
+        return "\n".join(lines) + "\n"
+
+
+def render_client_pool(stats):
+    """Return the counters of clients.ClientPool.stats() in the text exposition format"""
+    lines = []
+    _metric(lines, "client_pool_lookups_total", "counter", "Client pool lookups by result",
+            [({"result": result}, stats[result]) for result in ("hits", "misses")])
+    _metric(lines, "client_pool_removed_total", "counter", "Pooled clients dropped, by reason",
+            [({"reason": reason}, stats[reason]) for reason in ("expired", "evictions")])
+    _metric(lines, "client_pool_clients", "gauge", "Clients currently pooled", [({}, stats["size"])])
+    _metric(lines, "client_pool_sessions", "gauge", "Sessions (key pairs) currently pooled", [({}, stats["sessions"])])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,67 @@
+import pytest
+
+import clients
+from clients import ClientPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(clients, "time", clock)
+    return clock
+
+
+def access_key(client):
+    return client._request_signer._credentials.access_key
+
+
+def test_least_recently_used_client_is_evicted(clock):
+    pool = ClientPool(max_size=2, ttl=60)
+    ec2 = pool.client("key", "secret", "ec2", "us-east-1")
+    s3 = pool.client("key", "secret", "s3", "us-east-1")
+    assert pool.client("key", "secret", "ec2", "us-east-1") is ec2
+
+    pool.client("key", "secret", "sts", "us-east-1")
+
+    assert pool.client("key", "secret", "ec2", "us-east-1") is ec2
+    assert pool.client("key", "secret", "s3", "us-east-1") is not s3
+    stats = pool.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 2
+    assert (stats["hits"], stats["misses"]) == (2, 4)
+
+
+def test_client_is_built_again_after_its_ttl(clock):
+    pool = ClientPool(ttl=60)
+    ec2 = pool.client("key", "secret", "ec2", "us-east-1")
+
+    clock.now += 59
+    assert pool.client("key", "secret", "ec2", "us-east-1") is ec2
+    clock.now += 2
+    assert pool.client("key", "secret", "ec2", "us-east-1") is not ec2
+    assert pool.stats()["expired"] == 1
+
+
+def test_zero_ttl_disables_pooling(clock):
+    pool = ClientPool(ttl=0)
+    assert pool.client("key", "secret", "ec2", "us-east-1") is not pool.client("key", "secret", "ec2", "us-east-1")
+    assert pool.stats()["size"] == 0
+
+
+def test_key_pairs_never_share_a_client(clock):
+    pool = ClientPool(ttl=60)
+    first = pool.client("AKIAFIRST", "secret", "ec2", "us-east-1")
+    second = pool.client("AKIASECOND", "secret", "ec2", "us-east-1")
+    rotated = pool.client("AKIAFIRST", "rotated", "ec2", "us-east-1")
+
+    assert len({id(first), id(second), id(rotated)}) == 3
+    assert (access_key(first), access_key(second)) == ("AKIAFIRST", "AKIASECOND")
+    assert pool.stats()["sessions"] == 3
@@ -0,0 +1,52 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from cloudwatch import MetricCatalog, resolve_agent_dimensions
+
+INSTANCE = [{"Name": "InstanceId", "Value": "i-123"}]
+
+
+@pytest.fixture
+def cloudwatch():
+    with mock_aws():
+        yield boto3.client("cloudwatch", region_name="us-east-1")
+
+
+def publish(cloudwatch, metric_name, *dimension_sets):
+    cloudwatch.put_metric_data(Namespace="CWAgent", MetricData=[
+        {"MetricName": metric_name, "Dimensions": INSTANCE + dimensions, "Value": 50.0, "Unit": "Percent"}
+        for dimensions in dimension_sets
+    ])
+
+
+def test_linux_disk_uses_the_root_path(cloudwatch):
+    publish(cloudwatch, "DiskUtilization",
+            [{"Name": "path", "Value": "/boot"}, {"Name": "device", "Value": "xvda1"}],
+            [{"Name": "path", "Value": "/"}, {"Name": "device", "Value": "xvda2"}],
+            [{"Name": "path", "Value": "/data"}, {"Name": "device", "Value": "xvdb"}])
+
+    dimensions = resolve_agent_dimensions(MetricCatalog(cloudwatch), "DiskUtilization", "i-123", "Linux/UNIX")
+
+    assert {"Name": "path", "Value": "/"} in dimensions
+    assert {"Name": "device", "Value": "xvda2"} in dimensions
+
+
+def test_windows_disk_uses_a_logical_disk_and_prefers_c(cloudwatch):
+    publish(cloudwatch, "DiskUtilization",
+            [{"Name": "objectname", "Value": "PhysicalDisk"}, {"Name": "instance", "Value": "0 C:"}],
+            [{"Name": "objectname", "Value": "LogicalDisk"}, {"Name": "instance", "Value": "D:"}],
+            [{"Name": "objectname", "Value": "LogicalDisk"}, {"Name": "instance", "Value": "C:"}])
+
+    dimensions = resolve_agent_dimensions(MetricCatalog(cloudwatch), "DiskUtilization", "i-123", "windows")
+
+    assert {"Name": "objectname", "Value": "LogicalDisk"} in dimensions
+    assert {"Name": "instance", "Value": "C:"} in dimensions
+
+
+def test_missing_agent_metric_resolves_to_none(cloudwatch):
+    publish(cloudwatch, "DiskUtilization", [{"Name": "path", "Value": "/data"}])
+
+    catalog = MetricCatalog(cloudwatch)
+    assert resolve_agent_dimensions(catalog, "DiskUtilization", "i-123") is None
+    assert resolve_agent_dimensions(catalog, "MemoryUtilization", "i-123") is None
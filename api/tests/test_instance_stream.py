@@ -0,0 +1,79 @@
+import json
+
+import boto3
+import httpx
+import pytest
+from moto import mock_aws
+
+import main
+from clients import CLIENTS
+
+CREDENTIALS = {"accessKeyId": "testing", "secretAccessKey": "testing", "region": "us-east-1"}
+REGIONS = ["us-east-1", "eu-west-1"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fleet_regions(credentials):
+        return REGIONS
+
+    monkeypatch.setattr(main, "fleet_regions", fleet_regions)
+    CLIENTS.clear()
+    with mock_aws():
+        ec2 = boto3.client("ec2", region_name="us-east-1")
+        image = ec2.describe_images()["Images"][0]["ImageId"]
+        ec2.run_instances(ImageId=image, InstanceType="t3.micro", MinCount=1, MaxCount=1)
+        yield httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test", timeout=30)
+    CLIENTS.clear()
+
+
+def check_records(records):
+    assert records[0] == {"type": "start", "regions": REGIONS}
+    assert sorted(record["region"] for record in records[1:-1]) == sorted(REGIONS)
+    assert {record["type"] for record in records[1:-1]} == {"region"}
+    summary = records[-1]
+    assert summary["type"] == "summary"
+    assert (summary["ec2Count"], summary["rdsCount"]) == (1, 0)
+    assert set(summary["regions"]) == set(REGIONS)
+
+
+@pytest.mark.anyio
+async def test_records_are_sent_as_ndjson_by_default(client):
+    async with client:
+        response = await client.post("/instances/stream", json=CREDENTIALS)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(main.NDJSON_MEDIA_TYPE)
+    assert response.text.endswith("\n")
+    check_records([json.loads(line) for line in response.text.splitlines()])
+
+
+@pytest.mark.anyio
+async def test_records_are_sent_as_events_when_accepted(client):
+    async with client:
+        response = await client.post("/instances/stream", json=CREDENTIALS,
+                                     headers={"Accept": "text/event-stream"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(main.SSE_MEDIA_TYPE)
+    assert response.text.endswith("\n\n")
+    records = []
+    for event in response.text.split("\n\n")[:-1]:
+        name, data = event.split("\n")
+        record = json.loads(data.removeprefix("data: "))
+        assert name == f"event: {record['type']}"
+        records.append(record)
+    check_records(records)
+
+
+@pytest.mark.anyio
+async def test_region_lookup_failure_is_a_bad_request(client, monkeypatch):
+    async def fleet_regions(credentials):
+        raise RuntimeError("no regions")
+
+    monkeypatch.setattr(main, "fleet_regions", fleet_regions)
+    async with client:
+        response = await client.post("/instances/stream", json=CREDENTIALS)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "no regions"
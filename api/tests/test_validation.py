@@ -0,0 +1,72 @@
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import validation
+from clients import CLIENTS
+from validation import PROBES, cached_regions, validate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(validation, "time", clock)
+    monkeypatch.setattr(validation, "_cache", {})
+    CLIENTS.clear()
+    with mock_aws():
+        yield clock
+    CLIENTS.clear()
+
+
+def failing(code):
+    def call(client):
+        raise ClientError({"Error": {"Code": code, "Message": code}}, "Probe")
+    return call
+
+
+def test_working_keys_pass_every_probe(clock):
+    result = validate("testing", "testing", "us-east-1")
+
+    assert result["account"] == "123456789012"
+    assert set(result["permissions"]) == set(PROBES) | {"ec2:DescribeRegions"}
+    assert {permission["status"] for permission in result["permissions"].values()} == {"ok"}
+    assert "us-east-1" in result["regions"]
+
+
+@pytest.mark.parametrize("code, status", [
+    ("DryRunOperation", "ok"),
+    ("UnauthorizedOperation", "denied"),
+    ("AccessDenied", "denied"),
+    ("Throttling", "error"),
+])
+def test_probe_status_follows_the_error_code(clock, code, status):
+    assert validation._probe("testing", "testing", "us-east-1", "ec2", failing(code))["status"] == status
+
+
+def test_validation_is_reused_until_its_ttl(clock):
+    first = validate("testing", "testing", "us-east-1")
+
+    clock.now += validation.VALIDATION_TTL - 1
+    assert validate("testing", "testing", "us-east-1") is first
+    assert cached_regions("testing", "testing", "us-east-1") == first["regions"]
+    assert cached_regions("testing", "testing", "eu-west-1") is None
+
+    clock.now += 2
+    assert cached_regions("testing", "testing", "us-east-1") is None
+    assert validate("testing", "testing", "us-east-1") is not first
+
+
+def test_zero_ttl_disables_the_cache(clock, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_TTL", 0)
+    first = validate("testing", "testing", "us-east-1")
+
+    assert validate("testing", "testing", "us-east-1") is not first
+    assert cached_regions("testing", "testing", "us-east-1") is None
@@ -0,0 +1,163 @@
+# Kept identical in api/throttle.py and clio-main/app/throttle.py: the API and
+# the report Lambda are deployed as separate packages and share no code
+import os
+import threading
+import time
+from functools import partial
+
+from botocore.config import Config
+
+# Error codes AWS services answer with when a caller exceeds its request rate
+THROTTLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "RequestThrottled",
+    "SlowDown",
+    "PriorRequestNotComplete",
+}
+
+# Starting and maximum requests per second per (account, service, region).
+# The maximum is kept a little under the published API quota
+INITIAL_RATES = {"monitoring": 20.0, "ec2": 20.0, "rds": 10.0}
+MAX_RATES = {"monitoring": 45.0, "ec2": 90.0, "rds": 18.0}
+DEFAULT_INITIAL_RATE = 10.0
+DEFAULT_MAX_RATE = 20.0
+MIN_RATE = 0.5
+
+# AIMD: add this many requests/second after each second without throttling,
+# multiply by the factor on a throttling response
+RATE_INCREASE = float(os.environ.get("AWS_RATE_INCREASE", "2"))
+RATE_DECREASE_FACTOR = float(os.environ.get("AWS_RATE_DECREASE_FACTOR", "0.5"))
+
+# Throttling responses within this many seconds of the last rate change count
+# once, since they were caused by requests sent at the same rate
+RATE_DECREASE_INTERVAL = 1.0
+
+# Clients used behind the limiter retry throttled calls instead of giving up,
+# so a slowdown never turns into missing data
+RETRY_CONFIG = Config(retries={"max_attempts": 10, "mode": "standard"})
+
+
+class TokenBucket:
+    """
+    Token bucket whose refill rate adapts to throttling (AIMD)
+
+    Every request takes a token; tokens refill at `rate` per second up to a
+    one-second burst. A throttling response halves the rate (at most once
+    per second, so a burst of throttles counts once), and each second
+    without one adds RATE_INCREASE back, up to max_rate.
+    """
+
+    def __init__(self, rate, max_rate, min_rate=MIN_RATE):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.tokens = 1.0
+        self.requests = 0
+        self.throttles = 0
+        self.wait_seconds = 0.0
+        self._updated = time.monotonic()
+        self._last_change = self._updated
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        # The token is reserved right away, leaving the balance negative while
+        # requests queue; each caller then sleeps off its own share of the debt
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            self.requests += 1
+            wait = max(0.0, -self.tokens) / self.rate
+            self.wait_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_change >= 1:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+                self._last_change = now
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= RATE_DECREASE_INTERVAL:
+                self._refill(now)
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+                self.tokens = min(self.tokens, 0.0)
+                self._last_change = self._last_decrease = now
+
+    def stats(self):
+        return {"rate": round(self.rate, 2), "requests": self.requests, "throttles": self.throttles,
+                "wait_seconds": round(self.wait_seconds, 3)}
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(account, service, region):
+    """Return the bucket shared by every client of an account, service and region"""
+    key = (account, service, region)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(INITIAL_RATES.get(service, DEFAULT_INITIAL_RATE),
+                                        MAX_RATES.get(service, DEFAULT_MAX_RATE))
+        return _buckets[key]
+
+
+def limiter_stats():
+    """Return {"account/service/region": bucket stats} for logging"""
+    with _buckets_lock:
+        return {"/".join(str(part) for part in key): bucket.stats() for key, bucket in _buckets.items()}
+
+
+def _before_send(bucket, **kwargs):
+    bucket.acquire()
+
+
+def _needs_retry(bucket, response=None, **kwargs):
+    if response is None:
+        return None
+    code = response[1].get("Error", {}).get("Code")
+    if code in THROTTLE_CODES:
+        bucket.on_throttle()
+    elif response[0].status_code < 400:
+        bucket.on_success()
+    # Leave the retry decision to botocore
+    return None
+
+
+def rate_limited(client, account=None):
+    """
+    Put a boto3 client behind the shared limiter for its service and region
+
+    Every HTTP attempt, retries included, waits for a token from the bucket
+    of (account, service, region); throttling responses shrink the bucket's
+    rate for every client sharing it. Create the client with
+    config=RETRY_CONFIG so throttled calls are retried rather than lost.
+
+    Parameters:
+    - client: boto3 client
+    - account: Anything identifying the caller's AWS account (quotas are per account)
+
+    Returns:
+    The same client
+    """
+    service = client.meta.service_model.endpoint_prefix
+    bucket = get_bucket(account, service, client.meta.region_name)
+    client.meta.events.register("before-send", partial(_before_send, bucket), unique_id="rate-limit-send")
+    client.meta.events.register("needs-retry", partial(_needs_retry, bucket), unique_id="rate-limit-retry")
+    return client
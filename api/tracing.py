@@ -0,0 +1,202 @@
+# Kept identical in api/, clio-main/api/ and clio-main/app/, one copy per
+# deployed service, as none of them can import from another
+import contextvars
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# (trace, stage name) the current thread or task is working on; stage is None outside any stage
+_active = contextvars.ContextVar("trace", default=(None, None))
+
+# Callbacks receiving every finished trace record, e.g. a metrics exporter
+_observers = []
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_bytes(who=resource.RUSAGE_SELF):
+    """Return the peak resident set size of this process (or of its finished children)"""
+    return resource.getrusage(who).ru_maxrss * _RSS_UNIT
+
+
+class Trace:
+    """
+    Wall time, AWS requests, response bytes and peak memory per stage of a run
+
+    A trace is activated around a whole run (a report, an API request) and
+    split into named stages. Every HTTP request made by a client passed
+    through traced() while a stage is active counts towards that stage.
+    Anything else worth counting (charts, PDF bytes, instances) goes into
+    named counters. On exit from activate() the trace prints one JSON record
+    and hands it to every observer.
+
+    Usage:
+        with Trace("account", account_id=account_id).activate():
+            with stage("metrics"):
+                collector.collect(start, end)
+            count("charts", len(specs))
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.status = "ok"
+        self.stages = {}
+        self.counters = {}
+        self.api_calls = 0
+        self.response_bytes = 0
+        self._started = time.perf_counter()
+        self._seconds = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make this the current trace, then finish and emit it"""
+        token = _active.set((self, None))
+        try:
+            yield self
+        except BaseException:
+            self.status = "error"
+            raise
+        finally:
+            _active.reset(token)
+            self.finish()
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "api_calls": 0, "response_bytes": 0})
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the run; API requests made inside it are counted towards it"""
+        token = _active.set((self, name))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            _active.reset(token)
+            with self._lock:
+                record = self._stage(name)
+                record["seconds"] += elapsed
+                record["calls"] += 1
+                record["peak_rss_bytes"] = peak_rss_bytes()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_request(self, stage_name, size):
+        with self._lock:
+            self.api_calls += 1
+            self.response_bytes += size
+            if stage_name is not None:
+                record = self._stage(stage_name)
+                record["api_calls"] += 1
+                record["response_bytes"] += size
+
+    def merge(self, record, prefix=""):
+        """
+        Add the stages and counters of a record from another process (e.g. an
+        account worker), with stage names prefixed by prefix
+        """
+        if not record:
+            return
+        with self._lock:
+            self.api_calls += record.get("api_calls", 0)
+            self.response_bytes += record.get("response_bytes", 0)
+            for name, values in record.get("stages", {}).items():
+                merged = self._stage(prefix + name)
+                for key in ("seconds", "calls", "api_calls", "response_bytes"):
+                    merged[key] += values.get(key, 0)
+                merged["peak_rss_bytes"] = max(merged.get("peak_rss_bytes", 0), values.get("peak_rss_bytes", 0))
+            for name, value in record.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        if self._seconds is None:
+            self._seconds = time.perf_counter() - self._started
+            emit(self.record())
+
+    def record(self):
+        """Return the trace as a JSON-serialisable dict"""
+        seconds = self._seconds if self._seconds is not None else time.perf_counter() - self._started
+        with self._lock:
+            stages = {name: {key: round(value, 3) if isinstance(value, float) else value
+                             for key, value in values.items()}
+                      for name, values in self.stages.items()}
+            return {
+                "trace": self.name,
+                **self.labels,
+                "status": self.status,
+                "seconds": round(seconds, 3),
+                "api_calls": self.api_calls,
+                "response_bytes": self.response_bytes,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "children_peak_rss_bytes": peak_rss_bytes(resource.RUSAGE_CHILDREN),
+                "counters": dict(self.counters),
+                "stages": stages,
+            }
+
+
+def current_trace():
+    return _active.get()[0]
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current trace; does nothing when no trace is active"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.stage(name):
+        yield
+
+
+def count(name, value=1):
+    """Add value to a counter of the current trace, if any"""
+    trace = current_trace()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def add_observer(callback):
+    """Call callback(record) with every finished trace record"""
+    _observers.append(callback)
+
+
+def emit(record):
+    print(json.dumps(record, default=str))
+    for callback in _observers:
+        callback(record)
+
+
+def _response_received(response_dict=None, **kwargs):
+    trace, stage_name = _active.get()
+    if trace is None:
+        return
+    body = (response_dict or {}).get("body") or b""
+    trace.add_request(stage_name, len(body) if isinstance(body, (bytes, bytearray)) else 0)
+
+
+def traced(client):
+    """
+    Count every HTTP request of a boto3 client, retries included, towards the
+    trace and stage active in the calling thread
+
+    Returns:
+    The same client
+    """
+    client.meta.events.register("response-received", _response_received, unique_id="trace-response")
+    return client
+
+
+def in_context(func):
+    """Wrap func to run in a copy of the caller's context, so worker threads see its trace"""
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time, so each call runs in its own copy
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
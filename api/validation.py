@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from clients import CLIENTS, credential_fingerprint
+from discovery import list_regions
+from tracing import in_context, stage
+
+# Seconds a successful validation is reused, so the UI's validate-then-list
+# flow does not check the same key pair twice; 0 disables the cache
+VALIDATION_TTL = float(os.environ.get("VALIDATION_TTL", "300"))
+
+# Error codes meaning the key pair works but lacks the permission
+DENIED_CODES = {"UnauthorizedOperation", "AccessDenied", "AccessDeniedException", "UnauthorizedException"}
+
+# Instance ID no account has, so probes that cannot dry-run return nothing
+_NO_INSTANCE = [{"Name": "InstanceId", "Value": "i-00000000000000000"}]
+
+
+def _probe_cloudwatch_data(cloudwatch):
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    cloudwatch.get_metric_data(
+        MetricDataQueries=[{"Id": "probe", "MetricStat": {
+            "Metric": {"Namespace": "AWS/EC2", "MetricName": "CPUUtilization", "Dimensions": _NO_INSTANCE},
+            "Period": 300, "Stat": "Average"}}],
+        StartTime=end - timedelta(minutes=5),
+        EndTime=end,
+    )
+
+
+# The calls /instances and /generate-report need, each probed without
+# downloading any inventory: EC2 supports DryRun, the others get a query
+# that matches nothing or the smallest page
+PROBES = {
+    "ec2:DescribeInstances": ("ec2", lambda ec2: ec2.describe_instances(DryRun=True)),
+    "ec2:DescribeVolumes": ("ec2", lambda ec2: ec2.describe_volumes(DryRun=True)),
+    "rds:DescribeDBInstances": ("rds", lambda rds: rds.describe_db_instances(MaxRecords=20)),
+    "cloudwatch:ListMetrics": ("cloudwatch", lambda cloudwatch: cloudwatch.list_metrics(
+        Namespace="AWS/EC2", MetricName="CPUUtilization", Dimensions=_NO_INSTANCE)),
+    "cloudwatch:GetMetricData": ("cloudwatch", _probe_cloudwatch_data),
+}
+
+_cache = {}  # (fingerprint, region) -> (expires, result)
+_cache_lock = threading.Lock()
+
+
+def _probe(access_key_id, secret_access_key, region, service, call):
+    try:
+        call(CLIENTS.client(access_key_id, secret_access_key, service, region))
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        if code == "DryRunOperation":
+            return {"status": "ok"}
+        return {"status": "denied" if code in DENIED_CODES else "error", "error": str(e)}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    return {"status": "ok"}
+
+
+def _regions(access_key_id, secret_access_key):
+    try:
+        return {"status": "ok"}, list_regions(access_key_id, secret_access_key)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code", "")
+        return {"status": "denied" if code in DENIED_CODES else "error", "error": str(e)}, None
+
+
+def validate(access_key_id, secret_access_key, region):
+    """
+    Check a key pair with sts:GetCallerIdentity and probe the permissions the reports need
+
+    The identity check comes first, so invalid keys fail fast with the
+    ClientError from STS. The permission probes and the region listing
+    then run in parallel. Successful results are cached per credential
+    fingerprint and region for VALIDATION_TTL seconds.
+
+    Returns:
+    Dictionary with "account", "arn", "permissions" ({"ec2:DescribeInstances":
+    {"status": "ok"}, "rds:DescribeDBInstances": {"status": "denied", "error": ...}, ...})
+    and "regions" (enabled region names, or None if they could not be listed)
+    """
+    key = (credential_fingerprint(access_key_id, secret_access_key), region)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+    with stage("identity"):
+        identity = CLIENTS.client(access_key_id, secret_access_key, "sts", region).get_caller_identity()
+
+    with stage("permissions"), ThreadPoolExecutor(max_workers=len(PROBES) + 1) as executor:
+        regions = executor.submit(in_context(_regions), access_key_id, secret_access_key)
+        probes = {
+            name: executor.submit(in_context(_probe), access_key_id, secret_access_key, region, service, call)
+            for name, (service, call) in PROBES.items()
+        }
+        permissions = {name: future.result() for name, future in probes.items()}
+        permissions["ec2:DescribeRegions"], region_names = regions.result()
+
+    result = {
+        "account": identity["Account"],
+        "arn": identity["Arn"],
+        "permissions": permissions,
+        "regions": region_names,
+    }
+    if VALIDATION_TTL > 0:
+        with _cache_lock:
+            _cache[key] = (time.monotonic() + VALIDATION_TTL, result)
+            # Drop expired entries so the cache stays as small as the set of active users
+            for stale in [k for k, (expires, _) in _cache.items() if expires <= now]:
+                del _cache[stale]
+    return result
+
+
+def cached_regions(access_key_id, secret_access_key, region):
+    """Return the region names of a still-valid cached validation, or None"""
+    key = (credential_fingerprint(access_key_id, secret_access_key), region)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]["regions"]
+    return None
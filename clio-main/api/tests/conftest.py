@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The api modules import each other by bare name (main, executor, tracing), and the
+# root api/ tree has modules with the same names
+for name in ("main", "executor", "tracing"):
+    sys.modules.pop(name, None)
+sys.path.insert(0, API_DIR)
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
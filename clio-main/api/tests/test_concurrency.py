@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from moto import mock_aws
+
+import executor
+import main
+
+REPORT_SECONDS = 2.0
+
+# Kept before the tests monkeypatch main; forked pool workers inherit the patch
+build_summary_pdf = main.build_summary_pdf
+
+CREDENTIALS = {"accessKeyId": "testing", "secretAccessKey": "testing", "region": "us-east-1"}
+INSTANCES = [{"id": "i-123", "name": "web", "type": "t3.micro", "state": "running", "region": "us-east-1"}]
+
+
+def slow_build_summary_pdf(selected_instances, frequency):
+    # Runs in the render pool; the sleep stands in for chart rendering
+    time.sleep(REPORT_SECONDS)
+    return build_summary_pdf(selected_instances, frequency)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def render_pool():
+    yield
+    if executor._cpu_executor is not None:
+        executor._cpu_executor.shutdown(wait=True)
+        executor._cpu_executor = None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "build_summary_pdf", slow_build_summary_pdf)
+    with mock_aws():
+        transport = httpx.ASGITransport(app=main.app)
+        yield httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30)
+
+
+async def timed_validate(client):
+    started = time.perf_counter()
+    response = await client.post("/validate-credentials", json=CREDENTIALS)
+    assert response.status_code == 200
+    return time.perf_counter() - started
+
+
+async def generate_report(client):
+    return await client.post("/generate-report", params={"provider": "aws", "frequency": "daily"},
+                             json={"credentials": CREDENTIALS, "selected_instances": INSTANCES})
+
+
+@pytest.mark.anyio
+async def test_validate_latency_stays_flat_during_reports(client):
+    async with client:
+        await timed_validate(client)  # warm up the boto3 and moto imports
+        idle = [await timed_validate(client) for _ in range(3)]
+
+        reports = [asyncio.create_task(generate_report(client)) for _ in range(2)]
+        await asyncio.sleep(0.2)
+        busy = []
+        while not all(report.done() for report in reports):
+            busy.append(await timed_validate(client))
+            await asyncio.sleep(0.05)
+        responses = await asyncio.gather(*reports)
+
+    assert len(busy) >= 5
+    assert max(busy) < max(idle) + 0.5 < REPORT_SECONDS
+    for response in responses:
+        assert response.status_code == 200
+        assert response.content.startswith(b"%PDF")
+
+
+def test_build_summary_pdf_uses_a_file_per_request():
+    instances = [main.Instance(**instance) for instance in INSTANCES]
+    first = main.build_summary_pdf(instances, "daily")
+    second = main.build_summary_pdf(instances, "daily")
+    try:
+        assert first != second
+        assert os.path.exists(first) and os.path.exists(second)
+    finally:
+        os.remove(first)
+        os.remove(second)
+
+
+@pytest.mark.anyio
+async def test_report_file_is_removed_after_response(client, monkeypatch):
+    built = []
+
+    def build(selected_instances, frequency):
+        built.append(build_summary_pdf(selected_instances, frequency))
+        return built[-1]
+
+    async def run_inline(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(main, "run_cpu", run_inline)
+    monkeypatch.setattr(main, "build_summary_pdf", build)
+    async with client:
+        response = await generate_report(client)
+
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert not os.path.exists(built[0])
+
+
+def test_generate_report_is_registered_once():
+    routes = [route for route in main.app.routes if getattr(route, "path", None) == "/generate-report"]
+    assert len(routes) == 1
@@ -0,0 +1,51 @@
+import httpx
+import pytest
+from moto import mock_aws
+
+import main
+import tracing
+
+CREDENTIALS = {"accessKeyId": "testing", "secretAccessKey": "testing", "region": "us-east-1"}
+INSTANCES = [{"id": "i-123", "name": "web", "type": "t3.micro", "state": "running", "region": "us-east-1"}]
+
+
+@pytest.fixture
+def records(monkeypatch):
+    records = []
+    monkeypatch.setattr(tracing, "_observers", [records.append])
+    return records
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def run_inline(func, *args):
+        return func(*args)
+
+    # The render pool is covered by test_concurrency; inline keeps this test fast
+    monkeypatch.setattr(main, "run_cpu", run_inline)
+    with mock_aws():
+        yield httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+@pytest.mark.anyio
+async def test_generate_report_is_traced(client, records):
+    async with client:
+        response = await client.post("/generate-report", params={"provider": "aws", "frequency": "daily"},
+                                     json={"credentials": CREDENTIALS, "selected_instances": INSTANCES})
+
+    assert response.status_code == 200
+    record, = [record for record in records if record["trace"] == "generate_report"]
+    assert record["frequency"] == "daily"
+    assert record["counters"]["instances"] == 1
+    assert record["counters"]["pdf_bytes"] == len(response.content)
+    assert record["stages"]["render"]["calls"] == 1
+
+
+@pytest.mark.anyio
+async def test_validate_counts_its_aws_requests(client, records):
+    async with client:
+        response = await client.post("/validate-credentials", json=CREDENTIALS)
+
+    assert response.status_code == 200
+    record, = [record for record in records if record["trace"] == "validate_credentials"]
+    assert record["api_calls"] == 1
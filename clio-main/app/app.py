@@ -1,23 +1,106 @@
+import io
 import os
+import sqlite3
+from collections import Counter
 from datetime import datetime
-import matplotlib.pyplot as plt
-import matplotlib
 import pytz
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 
-from .provider.aws.client import Client as Aws_Client
-import boto3
+from .charts import (CHART_BACKEND, CHART_BACKENDS, ChartImages, PendingChart, chart_spec,
+                     chart_workers, preload_chart_backend, render_charts)
+from .inventory import ResourceContext
+from .metric_store import get_metric_store
+from .metrics import MetricCatalog, MetricDataCollector, get_metric_definition, resolve_dimensions
+from .scheduler import ACCOUNT_WORKERS, run_isolated
+from .series import HIGH_UTILIZATION_THRESHOLD, MetricSeries
+from .tracing import Trace, count, stage
+from .uploads import report_s3_client, upload_report
+from .warm_cache import ACCOUNTS, ASSETS
+
+# Region the reports are generated for
+REPORT_REGION = "ap-south-1"
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'nubinix_logo.jpg')
+
+def build_report_styles():
+    """
+    Build the paragraph styles used by the report
+
+    Returns:
+    Dictionary with the sample stylesheet and the custom styles
+    """
+    # Define styles
+    sheet = getSampleStyleSheet()
+    
+    # Create custom styles
+    title_style = ParagraphStyle(
+        name='TitleStyle',
+        parent=sheet['Title'],
+        fontSize=18,
+        alignment=1,  # Center alignment
+        spaceAfter=0.2*inch
+    )
+    
+    header_style = ParagraphStyle(
+        name='HeaderStyle',
+        parent=sheet['Heading1'],
+        fontSize=14,
+        spaceAfter=0.1*inch
+    )
+    
+    normal_style = ParagraphStyle(
+        name='NormalStyle',
+        parent=sheet['Normal'],
+        fontSize=10,
+        spaceAfter=0.05*inch
+    )
+    
+    label_style = ParagraphStyle(
+        name='LabelStyle',
+        parent=sheet['Normal'],
+        fontSize=10,
+        spaceBefore=0.1*inch,
+        spaceAfter=0.05*inch,
+        fontName='Helvetica-Bold'
+    )
+    
+    remark_style = ParagraphStyle(
+        name='RemarkStyle',
+        parent=sheet['Normal'],
+        fontSize=10,
+        spaceAfter=0.1*inch,
+        fontName='Helvetica-Oblique'
+    )
+
+    return {
+        "sheet": sheet,
+        "title": title_style,
+        "header": header_style,
+        "normal": normal_style,
+        "label": label_style,
+        "remark": remark_style,
+    }
+
+
+def load_logo():
+    """Read the logo into memory; an in-memory reader is safe to share with forked workers"""
+    with open(LOGO_PATH, 'rb') as logo_file:
+        return ImageReader(io.BytesIO(logo_file.read()))
+
 
 class ConsolidatedCloudReport:
     def __init__(self, 
                  account_name, 
                  cloud_provider="AWS", 
                  account_id=None, 
-                 report_date=None):
+                 report_date=None,
+                 chart_backend=None,
+                 chart_workers=None):
         """
         Initialize the consolidated report generator
         
@@ -26,178 +109,80 @@ class ConsolidatedCloudReport:
         - cloud_provider: Name of the cloud provider (e.g., AWS)
         - account_id: Account identifier
         - report_date: Date of the report (defaults to today)
+        - chart_backend: "matplotlib" or "reportlab" (defaults to CHART_BACKEND)
+        - chart_workers: Processes rendering this report's charts (defaults to charts.chart_workers())
         """
         self.account_name = account_name
         self.cloud_provider = cloud_provider
         self.account_id = account_id
         self.report_date = report_date or datetime.now().strftime("%Y-%m-%d")
+        self.chart_backend = chart_backend or CHART_BACKEND
+        if self.chart_backend not in CHART_BACKENDS:
+            raise ValueError(f"Unknown chart backend: {self.chart_backend}")
+        self.chart_workers = chart_workers
         
         # Define metrics to collect
         self.metrics = {
             "linux": ["cpu", "memory", "disk"],
             "windows": ["cpu", "memory", "disk"]
             }
-        
-        # Define styles
-        self.styles = getSampleStyleSheet()
-        
-        # Create custom styles
-        self.title_style = ParagraphStyle(
-            name='TitleStyle',
-            parent=self.styles['Title'],
-            fontSize=18,
-            alignment=1,  # Center alignment
-            spaceAfter=0.2*inch
-        )
-        
-        self.header_style = ParagraphStyle(
-            name='HeaderStyle',
-            parent=self.styles['Heading1'],
-            fontSize=14,
-            spaceAfter=0.1*inch
-        )
-        
-        self.normal_style = ParagraphStyle(
-            name='NormalStyle',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            spaceAfter=0.05*inch
-        )
-        
-        self.label_style = ParagraphStyle(
-            name='LabelStyle',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            spaceBefore=0.1*inch,
-            spaceAfter=0.05*inch,
-            fontName='Helvetica-Bold'
-        )
-        
-        self.remark_style = ParagraphStyle(
-            name='RemarkStyle',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            spaceAfter=0.1*inch,
-            fontName='Helvetica-Oblique'
-        )
+        self.rds_metrics = ["cpu", "memory", "disk"]
+        
+        # Stylesheets are built once per container and shared by every report
+        styles = ASSETS.get("styles", build_report_styles)
+        self.styles = styles["sheet"]
+        self.title_style = styles["title"]
+        self.header_style = styles["header"]
+        self.normal_style = styles["normal"]
+        self.label_style = styles["label"]
+        self.remark_style = styles["remark"]
     
-    def generate_metric_graph(self, metric_data, metric_name, instance_name, output_dir="graphs"):
+    def render_pending_charts(self, elements):
         """
-        Generate a graph for metric data with time range derived from available datapoints
+        Render every queued chart and swap the PendingChart placeholders in
+        elements for the result: vector drawings with the reportlab backend,
+        images rendered in one parallel batch with the matplotlib backend
         
         Parameters:
-        - metric_data: Dictionary with time-series data
-        - metric_name: Name of the metric
-        - instance_name: Name of the instance
-        - output_dir: Directory to save graphs
-        
+        - elements: A list containing the elements used to build the PDF
+
         Returns:
-        Path to the generated graph
+        ChartImages holding the rendered charts; call cleanup() after doc.build
         """
-        if not metric_data or not metric_data.get('Datapoints'):
-            return None
-            
-        # Make sure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Extract data
-        time_series = metric_data['Datapoints']
-
-        # Sort the time series by timestamp for proper plotting
-        time_series.sort(key=lambda x: x['Timestamp'])
-        
-        # Extract all timestamps from the data
-        timestamps = [point['Timestamp'] for point in time_series]
-
-        # Find the start and end times from the available timestamps
-        start_time = min(timestamps)
-        end_time = max(timestamps)
-
-        
-        # Re-extract timestamps and values after sorting
-        sorted_timestamps = [point['Timestamp'] for point in time_series]
-        sorted_avg_values = [point['Average'] for point in time_series]
-        
-        # Create a new figure
-        plt.figure(figsize=(10, 4))
-        
-        # Plot the data with a bright, highlighted color
-        plt.plot(sorted_timestamps, sorted_avg_values, color='#FF0066', linewidth=2.5, 
-                 marker='o', markersize=3, markerfacecolor='#FF0066', 
-                 label='Average', alpha=0.9)
-        
-        unit = ""
-        # Add labels and title
-        unit_val = time_series[0]['Unit'] if time_series else 'Percent'
-
-        if 'bytes' in str(unit).lower():
-            unit = unit_val.replace("bytes", "GB")
-        else:
-            unit = unit_val
-        plt.xlabel('Time', fontweight='bold')
-        plt.ylabel(f"{metric_name} ({unit})", fontweight='bold')
-        
-        # Format the time span in the title
-        start_str = start_time.strftime('%Y-%m-%d %H:%M')
-        end_str = end_time.strftime('%Y-%m-%d %H:%M')
-        plt.title(f'{instance_name}: {metric_name}\n{start_str} to {end_str}', fontweight='bold')
-        
-        # Format the x-axis to show dates nicely
-        plt.gcf().autofmt_xdate()
-
-        # Set explicit x-axis range based on the data
-        plt.xlim(start_time, end_time)
-        
-        # Calculate time difference and use appropriate formatter
-        time_diff = end_time - start_time
-        hours_diff = time_diff.total_seconds() / 3600
-        
-        if hours_diff <= 24:
-            plt.gca().xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%H:%M', tz=pytz.timezone('Asia/Kolkata')))
-        else:
-            plt.gca().xaxis.set_major_formatter(matplotlib.dates.DateFormatter('%m-%d %H:%M', tz=pytz.timezone('Asia/Kolkata')))
-        
-        # Add legend
-        plt.legend(loc='upper right', frameon=True)
-        
-        # Add grid
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        # Add statistics
-        if sorted_avg_values:
-            min_val = min(sorted_avg_values)
-            max_val = max(sorted_avg_values)
-            avg_val = sum(sorted_avg_values) / len(sorted_avg_values)
-            stats_text = f"Min: {min_val:.2f}% | Max: {max_val:.2f}% | Avg: {avg_val:.2f}%"
-            plt.figtext(0.5, 0.01, stats_text, ha='center', fontsize=10, fontweight='bold')
-        
-        # Tight layout to maximize graph area
-        plt.tight_layout()
-        
-        # Create a descriptive filename
-        time_range = "24h" if hours_diff <= 24 else f"{int(hours_diff)}h"
-        filename = f"{output_dir}/{instance_name}_{metric_name.lower()}_{time_range}.png".replace(" ", "_")
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        
-        return filename
-
-    def generate_consolidated_report(self, aws_cli, instance_ids, output_path="consolidated_report.pdf", days=1):
+        positions = [index for index, element in enumerate(elements) if isinstance(element, PendingChart)]
+        charts = ChartImages()
+        count("charts", len(positions))
+
+        if self.chart_backend == "reportlab":
+            from .vector_charts import draw_chart
+            for index in positions:
+                elements[index] = draw_chart(elements[index].spec)
+            return charts
+
+        images = render_charts([elements[index].spec for index in positions], max_workers=self.chart_workers)
+        for index, image in zip(positions, images):
+            if image:
+                elements[index] = Image(charts.source(image), width=6*inch, height=2*inch)
+            else:
+                elements[index] = Spacer(1, 0)
+        return charts
+
+    def generate_consolidated_report(self, aws_cli, instance_ids, output_path="consolidated_report.pdf", days=1,
+                                     resources=None):
         """
         Generate a consolidated report for multiple instances
         
         Parameters:
         - instance_ids: List of EC2 instance IDs
-        - output_path: Path to save the PDF
+        - output_path: Path or file-like object to save the PDF
         - days: Number of days of data to retrieve
+        - resources: ResourceContext of the run, created from aws_cli if not given
         
         Returns:
         Path to the generated report
         """
-        # Create graphs directory if it doesn't exist
-        graphs_dir = "/tmp/graphs"
-        os.makedirs(graphs_dir, exist_ok=True)
-        
+        resources = resources or ResourceContext(aws_cli, REPORT_REGION)
+
         # Create document with letter page size
         doc = SimpleDocTemplate(
             output_path,
@@ -244,25 +229,28 @@ class ConsolidatedCloudReport:
         # Create a table for instance summary
         instance_summary_data = [["Instance ID", "Name", "Type", "Status"]]
         
+        # Resolve every instance with batched describe_instances calls
+        with stage("inventory"):
+            instances_info, instance_errors = resources.ec2_instances(instance_ids)
+
         # Process each instance
         all_instances_info = []
         for instance_id in instance_ids:
-            try:
-                # Get instance information
-                host_info = aws_cli.get_instance_info(instance_id)
-                all_instances_info.append(host_info)
-                
-                # Add to summary table
-                instance_summary_data.append([
-                    host_info["id"],
-                    host_info["name"],
-                    host_info["type"],
-                    host_info["state"]
-                ])
-                
-            except Exception as e:
-                print(f"Error processing instance {instance_id}: {e}")
+            if instance_id in instance_errors:
+                print(f"Error processing instance {instance_id}: {instance_errors[instance_id]}")
                 instance_summary_data.append([instance_id, "Error", "Error", "Error"])
+                continue
+
+            host_info = instances_info[instance_id]
+            all_instances_info.append(host_info)
+
+            # Add to summary table
+            instance_summary_data.append([
+                host_info["id"],
+                host_info["name"],
+                host_info["type"],
+                host_info["state"]
+            ])
         
         # Create and add the instances summary table
         instance_summary_table = Table(instance_summary_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 1*inch])
@@ -287,7 +275,8 @@ class ConsolidatedCloudReport:
         # Create a table for instance summary
         rds_instance_summary_data = [["Instance Name","Type", "Status", "Engine"]]
 
-        rds_instances = aws_cli.get_rds_instances()
+        with stage("inventory"):
+            rds_instances = resources.rds_instances()
 
         for instance in rds_instances:
             rds_instance_summary_data.append([
@@ -324,22 +313,85 @@ class ConsolidatedCloudReport:
         start_time_utc = start_time_ist.astimezone(pytz.utc)
         end_time_utc = end_time_ist.astimezone(pytz.utc)
 
-        # Process each ec2 instance
-        self.generate_ec2_report(elements, all_instances_info, aws_cli, start_time_utc, end_time_utc, graphs_dir)
+        # Fetch every metric in the report with batched GetMetricData calls
+        with stage("metrics"):
+            cloudwatch = resources.client('cloudwatch')
+            report_metrics = self.collect_metrics(cloudwatch, all_instances_info, rds_instances,
+                                                  start_time_utc, end_time_utc)
 
-        # Process each RDS instance
-        self.generate_rds_report(elements, aws_cli, start_time_utc, end_time_utc, graphs_dir)
+        with stage("layout"):
+            # Process each ec2 instance
+            self.generate_ec2_report(elements, all_instances_info, report_metrics)
+
+            # Process each RDS instance
+            self.generate_rds_report(elements, resources, report_metrics)
+
+        # Render all graphs in parallel
+        with stage("charts"):
+            charts = self.render_pending_charts(elements)
 
         # Build the PDF
-        doc.build(elements, onFirstPage=header_function, onLaterPages=header_function)
+        try:
+            with stage("pdf_build"):
+                doc.build(elements, onFirstPage=header_function, onLaterPages=header_function)
+        finally:
+            charts.cleanup()
         
         return output_path
     
-    def generate_rds_report(self, elements, aws_cli, start_time, end_time, graphs_dir):
+    def collect_metrics(self, cloudwatch, all_instances_info, rds_instances, start_time, end_time):
+        """
+        Fetch the metrics for every EC2 and RDS instance in the report
 
-        rds_metrics = ["cpu", "memory", "disk"]
+        Parameters:
+        - cloudwatch: boto3 CloudWatch client for the report region
+        - all_instances_info: List of EC2 host info dicts
+        - rds_instances: List of RDS instance dicts
+        - start_time, end_time: The time range in UTC for the report
 
-        all_instances_info = aws_cli.get_rds_instances()
+        Returns:
+        Dictionary keyed by (resource_type, instance_id, metric_key) with
+        {'Datapoints': [...]} values in the get_metric_statistics shape
+        """
+        # Datapoints already fetched by earlier runs come from the local metric store
+        collector = MetricDataCollector(cloudwatch, period=300, store=get_metric_store(),
+                                        scope=(self.account_id, REPORT_REGION))
+        catalog = MetricCatalog(cloudwatch)
+
+        resources = [('ec2', host_info['id'], str(host_info['os']).lower(), self.metrics.get(str(host_info['os']).lower(), []))
+                     for host_info in all_instances_info]
+        resources += [('rds', instance['id'], None, self.rds_metrics) for instance in rds_instances]
+
+        for resource_type, resource_id, resource_os, metric_keys in resources:
+            for metric_key in metric_keys:
+                definition = get_metric_definition(resource_type, metric_key, resource_os)
+                if not definition:
+                    continue
+                try:
+                    dimensions = resolve_dimensions(catalog, definition, resource_id)
+                except Exception as e:
+                    print(f"Error resolving {metric_key} for {resource_id}: {e}")
+                    continue
+                if dimensions is None:
+                    print(f"Skipping {metric_key} - CloudWatch agent metrics not available for {resource_id}")
+                    continue
+                collector.add((resource_type, resource_id, metric_key), definition['Namespace'],
+                              definition['MetricName'], dimensions, unit=definition['Unit'])
+
+        try:
+            return collector.collect(start_time, end_time)
+        except sqlite3.Error:
+            # A locked or broken metric store fails the account instead of emptying its report
+            raise
+        except Exception as e:
+            print(f"Error fetching metrics: {e}")
+            return {}
+
+    def generate_rds_report(self, elements, resources, report_metrics):
+
+        rds_metrics = self.rds_metrics
+
+        all_instances_info = resources.rds_instances()
         # Process each instance
         for host_info in all_instances_info:
             # Start a new page for each host
@@ -371,29 +423,29 @@ class ConsolidatedCloudReport:
             
             # Get metrics data for this instance
             metrics_data = {}
-            graphs_paths = {}
+            chart_specs = {}
 
             for metric_key in rds_metrics:
-                data = aws_cli.get_metrics(instance_id=host_info['id'], metric_name=metric_key, start_time=start_time,end_time=end_time,resource_type='rds', resource_os=None)
+                data = report_metrics.get(('rds', host_info['id'], metric_key))
                 if data:
+                    series = MetricSeries.from_datapoints(data)
                     if metric_key == "memory" or metric_key == "disk":
-                        convert_bytes_to_gb(data)
-                    metrics_data[metric_key] = data
-                    # Generate graph
-                    graph_path = self.generate_metric_graph(data, metric_key, host_info['id'], graphs_dir)
-                    if graph_path:
-                        graphs_paths[metric_key] = graph_path
+                        series = series.scaled(1 / 1024 ** 3, unit="GB")
+                    metrics_data[metric_key] = series
+                    # Queue graph, rendered with the rest of the report in render_pending_charts
+                    spec = chart_spec(series, metric_key, host_info['id'])
+                    if spec:
+                        chart_specs[metric_key] = spec
             
             # Add metrics sections side by side
             for metric_key in rds_metrics:
                 remarks = "Average utilization is normal"
                 if metric_key in metrics_data:
                     # Add utilization data table
-                    data = metrics_data[metric_key]
-                    avg_usage_list = [value['Average'] for value in data['Datapoints']]
+                    stats = metrics_data[metric_key].stats()
 
-                    if len(avg_usage_list) > 0:
-                        avg_val = sum(avg_usage_list) / len(avg_usage_list)
+                    if stats['count'] > 0:
+                        avg_val = stats['mean']
 
                         if metric_key == "memory" or metric_key == "disk":
                             elements.append(Paragraph(f"AVAILABLE {metric_key.upper()} (in GB)", self.label_style))
@@ -403,7 +455,7 @@ class ConsolidatedCloudReport:
                                 remarks = "Available " + metric_key + " capacity is sufficient"
                         else:
                             elements.append(Paragraph(f"{metric_key.upper()} UTILIZATION", self.label_style))
-                            if avg_val > 85:
+                            if avg_val > HIGH_UTILIZATION_THRESHOLD:
                                 remarks = "Average utilisation is high. Explore possibility of optimising the resources"
 
                         elements.append(Spacer(1, 0.1*inch))
@@ -432,16 +484,14 @@ class ConsolidatedCloudReport:
                         elements.append(Spacer(1, 0.2*inch))
                     
                         # Add graph if available
-                        if metric_key in graphs_paths and os.path.exists(graphs_paths[metric_key]):
-                            graph_path = graphs_paths[metric_key]
-                            img = Image(graph_path, width=6*inch, height=2*inch)
-                            elements.append(img)
+                        if metric_key in chart_specs:
+                            elements.append(PendingChart(chart_specs[metric_key]))
                             elements.append(Spacer(1, 0.2*inch))
                 else:
                     elements.append(Paragraph(f"No {metric_key} utilization data available.", self.normal_style))
                     elements.append(Spacer(1, 0.2*inch))    
 
-    def generate_ec2_report(self, elements, all_instances_info, aws_cli, start_time, end_time, graphs_dir):
+    def generate_ec2_report(self, elements, all_instances_info, report_metrics):
         
         # Process each instance
         for host_info in all_instances_info:
@@ -474,30 +524,29 @@ class ConsolidatedCloudReport:
             
             # Get metrics data for this instance
             metrics_data = {}
-            graphs_paths = {}
+            chart_specs = {}
             
             for metric_key in self.metrics[str(host_info['os']).lower()]:
-                data = aws_cli.get_metrics(instance_id=host_info['id'], metric_name=metric_key, start_time=start_time,end_time=end_time,resource_type='ec2', resource_os=str(host_info['os']).lower())
+                data = report_metrics.get(('ec2', host_info['id'], metric_key))
                 if data:
-                    metrics_data[metric_key] = data
-                    # Generate graph
-                    graph_path = self.generate_metric_graph(data, metric_key, host_info['name'], graphs_dir)
-                    if graph_path:
-                        graphs_paths[metric_key] = graph_path
+                    series = MetricSeries.from_datapoints(data)
+                    metrics_data[metric_key] = series
+                    # Queue graph, rendered with the rest of the report in render_pending_charts
+                    spec = chart_spec(series, metric_key, host_info['name'])
+                    if spec:
+                        chart_specs[metric_key] = spec
             
             # Add metrics sections side by side
             for metric_key in ["cpu", "memory", "disk"]:
                 if metric_key in metrics_data:
                     # Add utilization data table
-                    data = metrics_data[metric_key]
-                    avg_usage_list = [value['Average'] for value in data['Datapoints']]
+                    stats = metrics_data[metric_key].stats()
 
-
-                    if len(avg_usage_list) > 0:
-                        avg_val = sum(avg_usage_list) / len(avg_usage_list)
+                    if stats['count'] > 0:
+                        avg_val = stats['mean']
 
                         # Add remarks
-                        if avg_val > 85:
+                        if avg_val > HIGH_UTILIZATION_THRESHOLD:
                             remarks = "Average utilisation is high. Explore possibility of optimising the resources"
                         else:
                             remarks = "Average utilisation is low. No action needed at the time"
@@ -530,10 +579,8 @@ class ConsolidatedCloudReport:
                         elements.append(Spacer(1, 0.2*inch))
                     
                         # Add graph if available
-                        if metric_key in graphs_paths and os.path.exists(graphs_paths[metric_key]):
-                            graph_path = graphs_paths[metric_key]
-                            img = Image(graph_path, width=6*inch, height=2*inch)
-                            elements.append(img)
+                        if metric_key in chart_specs:
+                            elements.append(PendingChart(chart_specs[metric_key]))
                             elements.append(Spacer(1, 0.2*inch))
                 else:
                     elements.append(Paragraph(f"No {metric_key} utilization data available.", self.normal_style))
@@ -546,6 +593,8 @@ class ConsolidatedCloudReport:
         :param region_name: Optional specific region to check. If None, checks all regions.
         :return: List of instance IDs
         """
+        import boto3
+
         # Create an EC2 client
         ec2 = boto3.client('ec2')
         
@@ -574,32 +623,155 @@ class ConsolidatedCloudReport:
         return all_instance_ids
 
 
-def main(report_date, accounts):
-
+def report_key(report_date, account_name, account_id=None):
+    """Return the S3 key of an account's report; pass account_id to tell apart accounts sharing a name"""
+    file_name = account_name.replace(" ", "-")
+    if account_id is not None:
+        file_name += "-" + account_id
+    return "clients/manapuram/" + report_date + "/" + file_name + ".pdf"
+
+
+def aws_client(account_id):
+    """Return the provider client of an account, the default client_factory"""
+    # Imported here so the report code loads without the provider package
+    from .provider.aws.client import Client as Aws_Client
+    return Aws_Client(account_id=account_id)
+
+
+def generate_account_report(report_date, account_id, account_name, s3_key, chart_backend=None,
+                            chart_workers=None, client_factory=aws_client):
+    """
+    Generate the report for one account in memory and upload it to s3_key
+
+    client_factory(account_id) returns the account's provider client, with a
+    boto3 .session and the discovery calls ResourceContext makes
+
+    Returns:
+    Dictionary summarising the account's report and its upload; "status" is
+    "error" if the upload failed. "trace" holds the account's trace record
+    (see tracing.Trace)
+    """
+    trace = Trace("account", account_id=account_id, report_date=report_date)
+    with trace.activate():
+        result = _generate_account_report(report_date, account_id, account_name, s3_key, chart_backend,
+                                          chart_workers, client_factory)
+    result["trace"] = trace.record()
+    return result
+
+
+def _generate_account_report(report_date, account_id, account_name, s3_key, chart_backend, chart_workers,
+                             client_factory):
+    report_generator = ConsolidatedCloudReport(
+        account_name=account_name,
+        account_id=account_id,
+        report_date=report_date,
+        chart_backend=chart_backend,
+        chart_workers=chart_workers
+    )
+
+    # The client holds the account's assumed-role session, reused while it is valid
+    with stage("session"):
+        aws_cli = ACCOUNTS.get(account_id, lambda: client_factory(account_id))
+    resources = ResourceContext(aws_cli, REPORT_REGION, account_id=account_id)
+    with stage("discovery"):
+        instance_ids = resources.running_instance_ids()
+
+    # Generate the consolidated report straight into memory
+    report = io.BytesIO()
+    report_generator.generate_consolidated_report(
+        aws_cli,
+        instance_ids, 
+        report,
+        resources=resources,
+    )
+    print(f"Resource lookups for {account_id}: {resources.stats()}")
+    pdf = report.getvalue()
+    count("pdf_bytes", len(pdf))
+
+    # Uploaded from this worker with the account client's session, as
+    # aws_cli.upload_to_s3 did, so the parent never runs transfer threads while
+    # it forks further accounts. An account only counts as done once its report is in S3
+    with stage("upload"):
+        upload = upload_report(report_s3_client(aws_cli.session), s3_key, pdf)
+    count("upload_bytes", upload.get("bytes", 0))
+
+    return {
+        "s3_key": s3_key,
+        "ec2_instances": len(instance_ids),
+        "rds_instances": len(resources.rds_instances()),
+        **upload,
+    }
+
+
+def main(report_date, accounts, chart_backend=None, max_workers=ACCOUNT_WORKERS, deadline=None,
+         client_factory=aws_client):
+    """
+    Generate the reports of every account, up to max_workers accounts at a time
+
+    Each account runs in its own process, so one failing account never
+    stops the others. Every worker uploads its own report as soon as it is
+    built, while the remaining accounts are generated.
+
+    Parameters:
+    - report_date: Date of the report, YYYY-MM-DD
+    - accounts: Dictionary of account id to account name
+    - chart_backend: Chart backend for every report, see ConsolidatedCloudReport
+    - max_workers: Number of accounts processed concurrently
+    - deadline: Optional time.monotonic() value; accounts not generated and
+      uploaded by then are stopped and reported as "pending"
+    - client_factory: Returns the provider client of an account id, see
+      generate_account_report
+
+    Returns:
+    List of per-account result dictionaries with account_id, account_name,
+    status ("ok", "error" or "pending"), seconds, and s3_key or error
+    """
 
     # TODO: get start date and end date as an argument
 
-    for key, value in accounts.items():
-        report_generator = ConsolidatedCloudReport(
-            account_name=value,
-            account_id=key,
-            report_date=report_date
-        )
-
-        aws_cli = Aws_Client(account_id=key)
-        instance_ids = aws_cli.get_running_ec2_instance_ids("ap-south-1")
-
-        OUTPUT_PATH_PREFIX = "/tmp/"
-
-        FILE_NAME = value.replace(" ", "-") + ".pdf"
-
-        # Generate the consolidated report
-        report = report_generator.generate_consolidated_report(
-            aws_cli,
-            instance_ids, 
-            OUTPUT_PATH_PREFIX + FILE_NAME,
-        )
-        aws_cli.upload_to_s3(report, "nx-report", "clients/manapuram/" + report_date + "/" + FILE_NAME)
+    # Accounts run side by side, so each one renders its charts on its share of the cores
+    account_chart_workers = chart_workers(min(max_workers, len(accounts)))
+    # Accounts sharing a name get their id in the file name so neither report is overwritten
+    name_counts = Counter(accounts.values())
+    jobs = [
+        {"report_date": report_date, "account_id": key, "account_name": value,
+         "s3_key": report_key(report_date, value, key if name_counts[value] > 1 else None),
+         "chart_backend": chart_backend, "chart_workers": account_chart_workers,
+         "client_factory": client_factory}
+        for key, value in accounts.items()
+    ]
+    # One record for the whole run, with every account's stages added under "account."
+    trace = Trace("run", report_date=report_date, accounts=len(jobs))
+    with trace.activate():
+        # Load render assets and the chart backend before forking so every
+        # account worker inherits them instead of importing them again
+        with stage("preload"):
+            ASSETS.get("styles", build_report_styles)
+            ASSETS.get("logo", load_logo)
+            preload_chart_backend(chart_backend or CHART_BACKEND)
+
+        def merge_trace(index, result):
+            trace.merge(result.pop("trace", None), prefix="account.")
+
+        with stage("accounts"):
+            results = run_isolated(generate_account_report, jobs, max_workers=max_workers, deadline=deadline,
+                                   on_result=merge_trace)
+        for result in results:
+            count(f"accounts_{result['status']}")
+
+    summary = []
+    for job, result in zip(jobs, results):
+        if result["status"] == "error":
+            print(f"Report for account {job['account_id']} failed: {result.get('traceback') or result['error']}")
+            result.pop("traceback", None)
+        summary.append({"account_id": job["account_id"], "account_name": job["account_name"], **result})
+
+    # Keep the metric store inside its age and size limits
+    store = get_metric_store()
+    if store:
+        store.evict()
+
+    return summary
 
 # Define the header function - ReportLab will automatically pass canvas and doc parameters
 def header_function(canvas, doc):
@@ -610,22 +782,16 @@ def header_function(canvas, doc):
     canvas.setFont("Helvetica", 10)
     canvas.drawString(doc.leftMargin, doc.height + doc.topMargin - 0.25*inch, "www.nubinix.com")
 
-    # Add logo on the right
-    logo_path = '/var/task/app/static/nubinix_logo.jpg'
+    # Add logo on the right, decoded once per container
+    logo = ASSETS.get("logo", load_logo)
     logo_width = 1.5*inch
     logo_height = 1.5*inch
     # Calculate x position for right alignment
     logo_x = doc.width + doc.leftMargin - logo_width
-    logo = Image(logo_path, width=logo_width, height=logo_height)
-    logo.drawOn(canvas, logo_x, doc.height + doc.topMargin - 0.75*inch)
+    canvas.drawImage(logo, logo_x, doc.height + doc.topMargin - 0.75*inch, width=logo_width, height=logo_height)
 
     # Restore the state of the canvas
     canvas.restoreState()
 
-def convert_bytes_to_gb(data):
-    for dp in data['Datapoints']:
-        gb_value = dp['Average']/(1024 ** 3)
-        dp['Average'] = gb_value
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,273 @@
+import importlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import pytz
+
+# "matplotlib" renders PNG images; "reportlab" draws vector charts straight
+# into the PDF (see vector_charts.py), skipping matplotlib entirely
+CHART_BACKENDS = ("matplotlib", "reportlab")
+CHART_BACKEND = os.environ.get("CHART_BACKEND", "matplotlib")
+
+# Processes used to render a batch of charts. Unset (0), every account worker
+# running at the same time gets an equal share of the cores, see chart_workers()
+CHART_WORKERS = int(os.environ.get("CHART_WORKERS", "0"))
+
+# Lambda has no /dev/shm, so Pool/ProcessPoolExecutor (which need semaphores)
+# cannot run there. Workers are plain Processes talking over Pipes. fork reuses
+# the already imported matplotlib; set "spawn" for a clean interpreter per worker.
+CHART_MP_CONTEXT = os.environ.get("CHART_MP_CONTEXT", "fork")
+
+# Rendered PNGs are kept in memory and handed straight to ReportLab. Once a
+# report holds more than this many MB of chart images, further charts are
+# spilled to temporary files instead
+CHART_MEMORY_LIMIT_MB = float(os.environ.get("CHART_MEMORY_LIMIT_MB", "64"))
+
+# Where spilled charts go; /tmp is the only writable path in Lambda
+CHART_SPILL_DIR = os.environ.get("CHART_SPILL_DIR", tempfile.gettempdir())
+
+# Charts are printed 6 inches wide, so more points than this cannot be told
+# apart; longer series are downsampled before plotting. 0 disables it
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "600"))
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+def chart_workers(account_workers=1):
+    """Return the chart render processes for each of account_workers concurrent account reports"""
+    if CHART_WORKERS > 0:
+        return CHART_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, account_workers))
+
+
+class PendingChart:
+    """Placeholder flowable position for a chart that is rendered later in a batch"""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+
+def chart_spec(series, metric_name, instance_name, max_points=CHART_MAX_POINTS):
+    """
+    Describe a metric graph as plain, picklable data
+
+    The statistics footer is computed from the full series; only the plotted
+    line is downsampled to max_points.
+
+    Parameters:
+    - series: MetricSeries with the metric data
+    - metric_name: Name of the metric
+    - instance_name: Name of the instance
+    - max_points: Upper bound on plotted points, 0 to plot every datapoint
+
+    Returns:
+    Dictionary consumed by render_chart, or None for an empty series
+    """
+    if series is None or len(series) == 0:
+        return None
+
+    hours_diff = (series.timestamps[-1] - series.timestamps[0]) / 3600
+    time_range = "24h" if hours_diff <= 24 else f"{int(hours_diff)}h"
+    stats = series.stats()
+    plotted = series.downsampled(max_points) if max_points else series
+    return {
+        "timestamps": plotted.timestamps,
+        "values": plotted.values,
+        "unit": series.unit,
+        "metric_name": metric_name,
+        "instance_name": instance_name,
+        "stats_text": f"Min: {stats['min']:.2f}% | Max: {stats['max']:.2f}% | Avg: {stats['mean']:.2f}%",
+        "label": f"{instance_name} {metric_name.lower()} {time_range}",
+    }
+
+
+def _seed_matplotlib_cache():
+    # Copy the font cache built into the image (see Dockerfile) to the writable config dir
+    prebuilt = os.environ.get("MPL_PREBUILT_CACHE_DIR")
+    config_dir = os.environ.get("MPLCONFIGDIR")
+    if not prebuilt or not config_dir or not os.path.isdir(prebuilt) or os.path.isdir(config_dir):
+        return
+    shutil.copytree(prebuilt, config_dir, dirs_exist_ok=True)
+
+
+def preload_chart_backend(backend=CHART_BACKEND):
+    """
+    Import the modules a chart backend needs
+
+    Call before forking workers so they inherit the imports instead of
+    paying for them in every process.
+    """
+    if backend == "reportlab":
+        importlib.import_module(".vector_charts", __package__)
+    else:
+        _seed_matplotlib_cache()
+        importlib.import_module("matplotlib").use('Agg')
+        importlib.import_module("matplotlib.dates")
+        importlib.import_module("matplotlib.figure")
+
+
+def render_chart(spec):
+    """
+    Render one chart spec to PNG bytes with the object-oriented Figure API
+
+    No pyplot global state or shared files are touched, so this is safe to
+    run concurrently.
+
+    Returns:
+    The PNG image as bytes
+    """
+    # Imported here so reports using the reportlab backend never load matplotlib
+    preload_chart_backend("matplotlib")
+    import matplotlib.dates
+    from matplotlib.figure import Figure
+
+    datetimes = spec["timestamps"].astype('datetime64[s]')
+    start_time = datetimes[0].item()
+    end_time = datetimes[-1].item()
+    hours_diff = (end_time - start_time).total_seconds() / 3600
+
+    fig = Figure(figsize=(10, 4))
+    ax = fig.add_subplot()
+
+    # Plot the data with a bright, highlighted color
+    ax.plot(datetimes, spec["values"], color='#FF0066', linewidth=2.5,
+            marker='o', markersize=3, markerfacecolor='#FF0066',
+            label='Average', alpha=0.9)
+
+    # Add labels and title
+    ax.set_xlabel('Time', fontweight='bold')
+    ax.set_ylabel(f"{spec['metric_name']} ({spec['unit']})", fontweight='bold')
+
+    start_str = start_time.strftime('%Y-%m-%d %H:%M')
+    end_str = end_time.strftime('%Y-%m-%d %H:%M')
+    ax.set_title(f"{spec['instance_name']}: {spec['metric_name']}\n{start_str} to {end_str}", fontweight='bold')
+
+    # Format the x-axis to show dates nicely
+    fig.autofmt_xdate()
+    ax.set_xlim(start_time, end_time)
+    date_format = '%H:%M' if hours_diff <= 24 else '%m-%d %H:%M'
+    ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter(date_format, tz=IST))
+
+    ax.legend(loc='upper right', frameon=True)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    # Add statistics
+    fig.text(0.5, 0.01, spec["stats_text"], ha='center', fontsize=10, fontweight='bold')
+
+    # Tight layout to maximize graph area
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+
+    return buffer.getvalue()
+
+
+def _render_worker(indexed_specs, conn):
+    conn.send([(index, *_render_safely(spec)) for index, spec in indexed_specs])
+    conn.close()
+
+
+def _render_safely(spec):
+    # (png bytes, None), or (None, error message) if the chart failed
+    try:
+        return render_chart(spec), None
+    except Exception as e:
+        return None, str(e)
+
+
+def render_charts(specs, max_workers=None):
+    """
+    Render a batch of chart specs in parallel across processes
+
+    Parameters:
+    - specs: List of chart specs from chart_spec
+    - max_workers: Number of worker processes, chart_workers() if None
+
+    Returns:
+    List of PNG bytes in the same order as specs, None where rendering failed
+    """
+    if max_workers is None:
+        max_workers = chart_workers()
+    workers = max(1, min(max_workers, len(specs)))
+    if workers == 1:
+        images = []
+        for spec in specs:
+            image, error = _render_safely(spec)
+            if error:
+                print(f"Error rendering chart {spec['label']}: {error}")
+            images.append(image)
+        return images
+
+    preload_chart_backend("matplotlib")
+
+    context = multiprocessing.get_context(CHART_MP_CONTEXT)
+    indexed_specs = list(enumerate(specs))
+    processes = []
+    for worker in range(workers):
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        # Interleave specs so every worker gets a similar mix of chart sizes
+        process = context.Process(target=_render_worker, args=(indexed_specs[worker::workers], child_conn))
+        process.start()
+        child_conn.close()
+        processes.append((process, parent_conn))
+
+    images = [None] * len(specs)
+    for process, parent_conn in processes:
+        try:
+            for index, image, error in parent_conn.recv():
+                if error:
+                    print(f"Error rendering chart {specs[index]['label']}: {error}")
+                images[index] = image
+        except EOFError:
+            print(f"Chart worker {process.pid} exited without results")
+        process.join()
+
+    return images
+
+
+class ChartImages:
+    """
+    Turn rendered PNG bytes into image sources for ReportLab
+
+    Charts stay in memory until CHART_MEMORY_LIMIT_MB is used up; after that
+    each one is written to its own uniquely named temporary file, so two
+    hosts with the same name can never overwrite each other's graph.
+    Call cleanup() once the PDF has been built.
+
+    Usage:
+        charts = ChartImages()
+        Image(charts.source(png_bytes), width=6*inch, height=2*inch)
+        doc.build(elements)
+        charts.cleanup()
+    """
+
+    def __init__(self, memory_limit_mb=CHART_MEMORY_LIMIT_MB, spill_dir=CHART_SPILL_DIR):
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self.memory_bytes = 0
+        self.spilled = []
+
+    def source(self, image):
+        """Return a file-like object or path ReportLab's Image can read the PNG from"""
+        if self.memory_bytes + len(image) <= self.memory_limit:
+            self.memory_bytes += len(image)
+            return io.BytesIO(image)
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="chart-", suffix=".png", dir=self.spill_dir)
+        with os.fdopen(fd, "wb") as spill_file:
+            spill_file.write(image)
+        self.spilled.append(path)
+        return path
+
+    def cleanup(self):
+        """Delete the spilled chart files"""
+        for path in self.spilled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.spilled = []
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import uuid
+
+from botocore.exceptions import ClientError
+
+from .metric_store import get_metric_store
+from .uploads import report_s3_client
+
+# Bucket and prefix the checkpoints of unfinished runs are kept under
+CHECKPOINT_BUCKET = os.environ.get("REPORT_CHECKPOINT_BUCKET", "nx-report")
+CHECKPOINT_PREFIX = os.environ.get("REPORT_CHECKPOINT_PREFIX", "checkpoints/")
+
+# Seconds kept free before the Lambda deadline to stop workers and write the checkpoint
+CHECKPOINT_RESERVE_SECONDS = float(os.environ.get("REPORT_CHECKPOINT_RESERVE_SECONDS", "45"))
+
+
+class Checkpoint:
+    """
+    State of a report run that did not finish inside one Lambda invocation
+
+    The checkpoint holds the event parameters, the results of every account
+    whose report is already uploaded, and a snapshot of the metric store so
+    datapoints fetched before the cut-off are not requested again. It is
+    stored as checkpoints/<token>.json (plus checkpoints/<token>.db for the
+    metric snapshot) in CHECKPOINT_BUCKET.
+
+    Usage:
+        checkpoint = Checkpoint.load(token) if token else Checkpoint.start(event)
+        todo = checkpoint.remaining_accounts()
+        ...
+        checkpoint.record(results)
+        checkpoint.save() if checkpoint.remaining_accounts() else checkpoint.delete()
+    """
+
+    def __init__(self, token, report_date, accounts, chart_backend=None, done=None, s3=None):
+        self.token = token
+        self.report_date = report_date
+        self.accounts = accounts
+        self.chart_backend = chart_backend
+        self.done = done or {}
+        self.s3 = s3 or report_s3_client()
+
+    @classmethod
+    def start(cls, event, s3=None):
+        """Create the checkpoint of a new run from the invocation event"""
+        return cls(uuid.uuid4().hex, event['reportDate'], event['accounts'],
+                   chart_backend=event.get('chartBackend'), s3=s3)
+
+    @classmethod
+    def load(cls, token, s3=None):
+        """Load the checkpoint of an unfinished run and restore its metric snapshot"""
+        s3 = s3 or report_s3_client()
+        body = s3.get_object(Bucket=CHECKPOINT_BUCKET, Key=cls._key(token, "json"))['Body'].read()
+        state = json.loads(body)
+        checkpoint = cls(token, state['reportDate'], state['accounts'],
+                         chart_backend=state.get('chartBackend'), done=state.get('done'), s3=s3)
+        checkpoint._restore_metrics()
+        return checkpoint
+
+    @staticmethod
+    def _key(token, extension):
+        return f"{CHECKPOINT_PREFIX}{token}.{extension}"
+
+    def remaining_accounts(self):
+        """Return {account id: account name} of the accounts without an uploaded report"""
+        return {key: value for key, value in self.accounts.items() if key not in self.done}
+
+    def record(self, results):
+        """Mark the accounts whose result is "ok" or "error" as done; pending ones are retried"""
+        for result in results:
+            if result['status'] != 'pending':
+                self.done[result['account_id']] = result
+
+    def results(self):
+        """Return the final result of every account in event order"""
+        return [self.done[key] for key in self.accounts if key in self.done]
+
+    def save(self):
+        """Write the checkpoint and the metric store snapshot to S3"""
+        self._save_metrics()
+        state = {
+            "reportDate": self.report_date,
+            "accounts": self.accounts,
+            "chartBackend": self.chart_backend,
+            "done": self.done,
+        }
+        self.s3.put_object(Bucket=CHECKPOINT_BUCKET, Key=self._key(self.token, "json"),
+                           Body=json.dumps(state).encode(), ContentType="application/json")
+
+    def delete(self):
+        """Remove the checkpoint once the run is complete"""
+        for extension in ("json", "db"):
+            self.s3.delete_object(Bucket=CHECKPOINT_BUCKET, Key=self._key(self.token, extension))
+
+    def _save_metrics(self):
+        store = get_metric_store()
+        if store is None:
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.db")
+            store.export(path)
+            self.s3.upload_file(path, CHECKPOINT_BUCKET, self._key(self.token, "db"))
+
+    def _restore_metrics(self):
+        store = get_metric_store()
+        if store is None:
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.db")
+            try:
+                self.s3.download_file(CHECKPOINT_BUCKET, self._key(self.token, "db"), path)
+            except ClientError as e:
+                print(f"No metric snapshot for checkpoint {self.token}: {e}")
+                return
+            store.merge(path)
@@ -0,0 +1,184 @@
+import re
+import threading
+
+from botocore.exceptions import ClientError
+
+from .throttle import RETRY_CONFIG, rate_limited
+from .tracing import traced
+from .warm_cache import CLIENTS, INVENTORY, REGIONS, credential_fingerprint
+
+# DescribeInstances accepts at most 1000 instance IDs per request
+MAX_INSTANCE_IDS_PER_REQUEST = 1000
+
+# Errors EC2 raises for a whole request when any one of its IDs is bad
+INVALID_INSTANCE_ID_CODES = ("InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed")
+
+# Tokens of an error message that may name a rejected ID, e.g.
+# "The instance IDs 'i-1, i-2' do not exist" or 'Invalid id: "bogus"'
+MESSAGE_TOKEN_PATTERN = re.compile(r"[0-9A-Za-z_-]+")
+
+
+def instance_info(instance):
+    """
+    Flatten a describe_instances Instance into the host info dict used by the report
+
+    Returns:
+    Dictionary with id, name, type, state, os ("linux" or "windows"),
+    platform (EC2 PlatformDetails, e.g. "Linux/UNIX") and volumes
+    """
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    return {
+        "id": instance['InstanceId'],
+        "name": tags.get('Name', instance['InstanceId']),
+        "type": instance['InstanceType'],
+        "state": instance['State']['Name'],
+        "os": "windows" if instance.get('Platform') == 'windows' else "linux",
+        "platform": instance.get('PlatformDetails', 'Linux/UNIX'),
+        "volumes": [
+            {"id": mapping['Ebs']['VolumeId'], "device": mapping['DeviceName']}
+            for mapping in instance.get('BlockDeviceMappings', [])
+            if 'Ebs' in mapping
+        ],
+    }
+
+
+def describe_instances_bulk(ec2, instance_ids):
+    """
+    Resolve host info for many EC2 instances with as few describe_instances calls as possible
+
+    IDs are sent up to MAX_INSTANCE_IDS_PER_REQUEST at a time and every page
+    is followed. EC2 rejects a whole request if any ID in it is unknown or
+    malformed; those IDs are taken out, recorded as errors and the rest of
+    the batch is retried, so one stale ID never hides the other hosts.
+
+    Parameters:
+    - ec2: boto3 EC2 client
+    - instance_ids: List of EC2 instance IDs
+
+    Returns:
+    Tuple (instances, errors): {instance id: host info dict} and
+    {instance id: error message} for the IDs that could not be resolved
+    """
+    instances = {}
+    errors = {}
+    unique_ids = list(dict.fromkeys(instance_ids))
+    paginator = ec2.get_paginator('describe_instances')
+
+    for offset in range(0, len(unique_ids), MAX_INSTANCE_IDS_PER_REQUEST):
+        pending = unique_ids[offset:offset + MAX_INSTANCE_IDS_PER_REQUEST]
+        while pending:
+            try:
+                for page in paginator.paginate(InstanceIds=pending):
+                    for reservation in page['Reservations']:
+                        for instance in reservation['Instances']:
+                            instances[instance['InstanceId']] = instance_info(instance)
+                break
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                message = e.response['Error']['Message']
+                rejected = set(MESSAGE_TOKEN_PATTERN.findall(message)) & set(pending)
+                if code not in INVALID_INSTANCE_ID_CODES or not rejected:
+                    # Nothing to single out, so the batch as a whole failed
+                    for instance_id in pending:
+                        errors[instance_id] = f"{code}: {message}"
+                    break
+                for instance_id in rejected:
+                    errors[instance_id] = code
+                pending = [instance_id for instance_id in pending if instance_id not in rejected]
+
+    for instance_id in unique_ids:
+        if instance_id not in instances and instance_id not in errors:
+            errors[instance_id] = "Instance not returned by describe_instances"
+    return instances, errors
+
+
+class ResourceContext:
+    """
+    Inventory lookups for one report run, each made at most once
+
+    One context is created per account and run, and passed through the
+    report pipeline instead of the raw client, so the summary tables, the
+    metric collection and the per-host sections all share the same
+    EC2/RDS/volume/region results and boto3 clients.
+
+    Regions and inventory are also kept in the warm_cache module caches
+    under the account id, and clients under the session's credential
+    fingerprint, so a warm Lambda container reuses them across invocations
+    until their TTL runs out.
+
+    Usage:
+        resources = ResourceContext(aws_cli, "ap-south-1", account_id="123456789012")
+        resources.rds_instances()   # calls RDS
+        resources.rds_instances()   # served from memory
+        resources.stats()           # {'hits': 1, 'misses': 1}
+    """
+
+    def __init__(self, aws_cli, region, account_id=None):
+        self.aws_cli = aws_cli
+        self.region = region
+        self.account_id = account_id
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._lock = threading.RLock()
+
+    def _memo(self, key, loader):
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+            result = self._results[key] = loader()
+            return result
+
+    def _shared(self, cache, key, loader):
+        # Without an account id entries could leak between accounts, so skip the shared cache
+        if self.account_id is None:
+            return loader()
+        return cache.get((self.account_id, self.region) + key, loader)
+
+    def client(self, service):
+        """Return the rate-limited, traced boto3 client for a service in the report region"""
+        def load():
+            session = self.aws_cli.session
+            return CLIENTS.get((credential_fingerprint(session), self.region, service), lambda: traced(rate_limited(
+                session.client(service, region_name=self.region, config=RETRY_CONFIG), self.account_id)))
+        return self._memo(("client", service), load)
+
+    def running_instance_ids(self):
+        """Return the IDs of the running EC2 instances in the report region"""
+        return self._memo(("running_instance_ids",), lambda: self._shared(
+            INVENTORY, ("running_instance_ids",), lambda: self.aws_cli.get_running_ec2_instance_ids(self.region)))
+
+    def ec2_instances(self, instance_ids):
+        """Return (instances, errors) for the IDs, see describe_instances_bulk"""
+        key = ("ec2_instances", tuple(instance_ids))
+        return self._memo(key, lambda: self._shared(
+            INVENTORY, key, lambda: describe_instances_bulk(self.client('ec2'), instance_ids)))
+
+    def rds_instances(self):
+        """Return the RDS instance dicts of the account"""
+        return self._memo(("rds_instances",), lambda: self._shared(
+            INVENTORY, ("rds_instances",), self.aws_cli.get_rds_instances))
+
+    def volumes(self, volume_ids):
+        """Return {volume id: describe_volumes Volume} for the given EBS volume IDs"""
+        def load():
+            volumes = {}
+            if not volume_ids:
+                return volumes
+            for page in self.client('ec2').get_paginator('describe_volumes').paginate(VolumeIds=list(volume_ids)):
+                for volume in page['Volumes']:
+                    volumes[volume['VolumeId']] = volume
+            return volumes
+        return self._memo(("volumes", tuple(sorted(volume_ids))), load)
+
+    def regions(self):
+        """Return the names of the regions enabled for the account"""
+        return self._memo(("regions",), lambda: self._shared(REGIONS, ("regions",), lambda: [
+            region['RegionName'] for region in self.client('ec2').describe_regions()['Regions']
+        ]))
+
+    def stats(self):
+        """Return the lookup hit/miss counters for logging"""
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+# Set CLIO_METRIC_CACHE=0 to always fetch the full window from CloudWatch
+METRIC_CACHE_ENABLED = os.environ.get("CLIO_METRIC_CACHE", "1") != "0"
+
+# Where the datapoint cache lives; /tmp is the only writable path in Lambda
+METRIC_CACHE_DIR = os.environ.get("CLIO_METRIC_CACHE_DIR", "/tmp/metric-cache")
+
+# Datapoints older than this are evicted
+METRIC_CACHE_MAX_AGE_DAYS = float(os.environ.get("CLIO_METRIC_CACHE_MAX_AGE_DAYS", "35"))
+
+# Upper bound on the size of the cache database
+METRIC_CACHE_MAX_MB = float(os.environ.get("CLIO_METRIC_CACHE_MAX_MB", "256"))
+
+# Seconds a write waits for another account worker's transaction before failing
+METRIC_CACHE_BUSY_TIMEOUT = float(os.environ.get("CLIO_METRIC_CACHE_BUSY_TIMEOUT", "60"))
+
+# CloudWatch can still publish datapoints for the last few minutes, so recent
+# ranges are never marked as fetched
+SETTLE_SECONDS = 15 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datapoints (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (account, region, resource, metric, period, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS coverage (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS coverage_series
+    ON coverage (account, region, resource, metric, period);
+"""
+
+
+def to_epoch(value):
+    return int(value.timestamp())
+
+
+def from_epoch(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class MetricStore:
+    """
+    On-disk cache of CloudWatch datapoints with incremental refresh
+
+    Series are keyed by (account, region, resource, metric, period). Besides the
+    datapoints, the store records which time ranges have been fetched, so a
+    report only asks CloudWatch for the parts of its window it has not seen.
+
+    Usage:
+        store = MetricStore()
+        key = ("123456789012", "ap-south-1", "i-123", "AWS/EC2/CPUUtilization", 300)
+        for range_start, range_end in store.missing_ranges(key, start, end):
+            store.write(key, range_start, range_end, fetch(range_start, range_end))
+        points = store.read(key, start, end)  # [(datetime, value), ...]
+    """
+
+    def __init__(self, directory=METRIC_CACHE_DIR, max_age_days=METRIC_CACHE_MAX_AGE_DAYS,
+                 max_mb=METRIC_CACHE_MAX_MB):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "metrics.db")
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        # Account workers write to the same file from separate processes: WAL lets
+        # them read while another one writes, and the busy timeout makes writers queue
+        self._conn = sqlite3.connect(self.path, timeout=METRIC_CACHE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def missing_ranges(self, key, start_time, end_time):
+        """Return the (start, end) datetime ranges of the window not yet fetched for a series"""
+        start, end = to_epoch(start_time), to_epoch(end_time)
+        with self._lock:
+            covered = self._conn.execute(
+                "SELECT start_ts, end_ts FROM coverage"
+                " WHERE account=? AND region=? AND resource=? AND metric=? AND period=?"
+                " AND end_ts > ? AND start_ts < ? ORDER BY start_ts",
+                (*key, start, end)
+            ).fetchall()
+
+        missing = []
+        cursor = start
+        for covered_start, covered_end in covered:
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            missing.append((cursor, end))
+        return [(from_epoch(range_start), from_epoch(range_end)) for range_start, range_end in missing]
+
+    def write(self, key, start_time, end_time, points):
+        """
+        Store fetched datapoints and mark the range as fetched
+
+        Parameters:
+        - key: (account, region, resource, metric, period)
+        - start_time, end_time: The range that was requested from CloudWatch
+        - points: List of (timestamp, value) pairs returned for that range
+        """
+        start = to_epoch(start_time)
+        end = min(to_epoch(end_time), int(time.time()) - SETTLE_SECONDS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO datapoints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*key, to_epoch(timestamp), value) for timestamp, value in points]
+            )
+            if end > start:
+                self._add_coverage(key, start, end)
+
+    def read(self, key, start_time, end_time):
+        """Return the stored (timestamp, value) pairs of a series inside the window, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, value FROM datapoints"
+                " WHERE account=? AND region=? AND resource=? AND metric=? AND period=?"
+                " AND ts >= ? AND ts < ? ORDER BY ts",
+                (*key, to_epoch(start_time), to_epoch(end_time))
+            ).fetchall()
+        return [(from_epoch(ts), value) for ts, value in rows]
+
+    def export(self, path):
+        """Write a consistent snapshot of the store to path, e.g. to carry it to another invocation"""
+        with self._lock:
+            snapshot = sqlite3.connect(path)
+            try:
+                self._conn.backup(snapshot)
+            finally:
+                snapshot.close()
+
+    def merge(self, path):
+        """Add the datapoints and fetched ranges of a snapshot written by export()"""
+        snapshot = sqlite3.connect(path)
+        try:
+            points = snapshot.execute("SELECT * FROM datapoints").fetchall()
+            coverage = snapshot.execute("SELECT * FROM coverage").fetchall()
+        finally:
+            snapshot.close()
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO datapoints VALUES (?, ?, ?, ?, ?, ?, ?)", points)
+            for *key, start, end in coverage:
+                self._add_coverage(tuple(key), start, end)
+
+    def evict(self):
+        """Drop data older than the age limit, then the oldest data until the size limit is met"""
+        with self._lock, self._conn:
+            self._evict_before(int(time.time() - self.max_age_seconds))
+
+            while self._used_bytes() > self.max_bytes:
+                oldest, newest = self._conn.execute("SELECT MIN(ts), MAX(ts) FROM datapoints").fetchone()
+                if oldest is None or oldest >= newest:
+                    break
+                # Drop the oldest tenth of the stored time span and check again
+                self._evict_before(oldest + max((newest - oldest) // 10, 1))
+
+    def _add_coverage(self, key, start, end):
+        # Merge with every overlapping or touching range so coverage stays one row per gap-free span
+        overlapping = self._conn.execute(
+            "SELECT rowid, start_ts, end_ts FROM coverage"
+            " WHERE account=? AND region=? AND resource=? AND metric=? AND period=?"
+            " AND end_ts >= ? AND start_ts <= ?",
+            (*key, start, end)
+        ).fetchall()
+        for rowid, covered_start, covered_end in overlapping:
+            start = min(start, covered_start)
+            end = max(end, covered_end)
+            self._conn.execute("DELETE FROM coverage WHERE rowid=?", (rowid,))
+        self._conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?)", (*key, start, end))
+
+    def _evict_before(self, cutoff):
+        self._conn.execute("DELETE FROM datapoints WHERE ts < ?", (cutoff,))
+        self._conn.execute("DELETE FROM coverage WHERE end_ts <= ?", (cutoff,))
+        self._conn.execute("UPDATE coverage SET start_ts=? WHERE start_ts < ?", (cutoff, cutoff))
+
+    def _used_bytes(self):
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+
+_store = None
+_store_pid = None
+
+
+def get_metric_store():
+    """Return the shared MetricStore, or None when the cache is disabled"""
+    global _store, _store_pid
+    # SQLite connections must not cross fork(), so account workers open their own
+    if METRIC_CACHE_ENABLED and (_store is None or _store_pid != os.getpid()):
+        _store = MetricStore()
+        _store_pid = os.getpid()
+    return _store
@@ -0,0 +1,318 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from .tracing import in_context
+
+# CloudWatch accepts at most 500 MetricDataQuery entries per GetMetricData call
+MAX_QUERIES_PER_REQUEST = 500
+
+# Datapoints get_metric_statistics returns per call. Windows are split so no
+# series in a chunk is longer than this, which also keeps GetMetricData pages small
+MAX_DATAPOINTS_PER_QUERY = 1440
+
+# Concurrent chunk fetches per collect()
+CHUNK_WORKERS = 4
+
+# Report metric keys mapped to CloudWatch metrics, per resource type and OS.
+# "Dimensions" lists the dimensions a metric needs besides the resource id.
+METRIC_DEFINITIONS = {
+    "ec2": {
+        "linux": {
+            "cpu": {"Namespace": "AWS/EC2", "MetricName": "CPUUtilization", "Unit": "Percent"},
+            "memory": {"Namespace": "CWAgent", "MetricName": "mem_used_percent", "Unit": "Percent"},
+            "disk": {"Namespace": "CWAgent", "MetricName": "disk_used_percent", "Unit": "Percent",
+                     "Dimensions": [{"Name": "path", "Value": "/"}]},
+        },
+        "windows": {
+            "cpu": {"Namespace": "AWS/EC2", "MetricName": "CPUUtilization", "Unit": "Percent"},
+            "memory": {"Namespace": "CWAgent", "MetricName": "Memory % Committed Bytes In Use", "Unit": "Percent",
+                       "Dimensions": [{"Name": "objectname", "Value": "Memory"}]},
+            "disk": {"Namespace": "CWAgent", "MetricName": "LogicalDisk % Free Space", "Unit": "Percent",
+                     "Dimensions": [{"Name": "instance", "Value": "C:"}, {"Name": "objectname", "Value": "LogicalDisk"}]},
+        },
+    },
+    "rds": {
+        "cpu": {"Namespace": "AWS/RDS", "MetricName": "CPUUtilization", "Unit": "Percent"},
+        "memory": {"Namespace": "AWS/RDS", "MetricName": "FreeableMemory", "Unit": "Bytes"},
+        "disk": {"Namespace": "AWS/RDS", "MetricName": "FreeStorageSpace", "Unit": "Bytes"},
+    },
+}
+
+# Dimension that identifies the resource in each namespace
+RESOURCE_DIMENSIONS = {
+    "AWS/EC2": "InstanceId",
+    "CWAgent": "InstanceId",
+    "AWS/RDS": "DBInstanceIdentifier",
+}
+
+
+def split_window(start_time, end_time, period, max_points=MAX_DATAPOINTS_PER_QUERY):
+    """
+    Split [start_time, end_time) into consecutive chunks of at most max_points datapoints
+
+    Returns:
+    List of (chunk_start, chunk_end) tuples covering the window
+    """
+    step = timedelta(seconds=period * max_points)
+    chunks = []
+    chunk_start = start_time
+    while chunk_start < end_time:
+        chunk_end = min(chunk_start + step, end_time)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def get_metric_definition(resource_type, metric_key, resource_os=None):
+    """Return the CloudWatch definition for a report metric, or None if it is not collected"""
+    definitions = METRIC_DEFINITIONS[resource_type]
+    if resource_type == "ec2":
+        definitions = definitions.get(str(resource_os).lower(), definitions["linux"])
+    return definitions.get(metric_key)
+
+
+def resolve_dimensions(catalog, definition, resource_id):
+    """
+    Return the full dimension set to query a metric for one resource
+
+    The CloudWatch agent appends its own dimensions (ImageId, InstanceType,
+    device, fstype...), so CWAgent metrics are looked up in the metric
+    catalog and None is returned when the agent does not publish the metric.
+    """
+    dimensions = [{"Name": RESOURCE_DIMENSIONS[definition["Namespace"]], "Value": resource_id}]
+    dimensions += definition.get("Dimensions", [])
+    if definition["Namespace"] != "CWAgent":
+        return dimensions
+
+    matches = catalog.find(definition["Namespace"], definition["MetricName"], resource_id,
+                           required=definition.get("Dimensions"))
+    return matches[0] if matches else None
+
+class MetricDataCollector:
+    """
+    Batch many CloudWatch metric lookups into as few GetMetricData calls as possible
+
+    Usage:
+        collector = MetricDataCollector(cloudwatch)
+        collector.add(("ec2", "i-123", "cpu"), "AWS/EC2", "CPUUtilization",
+                      [{"Name": "InstanceId", "Value": "i-123"}], unit="Percent")
+        results = collector.collect(start_time, end_time)
+        results[("ec2", "i-123", "cpu")]  # {'Datapoints': [...]}
+
+    Results keep the get_metric_statistics shape: each datapoint is a dict with
+    'Timestamp', the statistic name (e.g. 'Average') and 'Unit'.
+
+    When a MetricStore is given, only the parts of the window the store has
+    not seen are requested from CloudWatch and the rest is read from disk.
+    """
+
+    def __init__(self, cloudwatch, period=300, stat="Average", store=None, scope=None):
+        """
+        Parameters:
+        - cloudwatch: boto3 CloudWatch client
+        - period: Datapoint period in seconds
+        - stat: Statistic to fetch
+        - store: Optional MetricStore used as a persistent cache
+        - scope: (account, region) the store keys series under, required with store
+        """
+        self.cloudwatch = cloudwatch
+        self.period = period
+        self.stat = stat
+        self.store = store
+        self.scope = scope
+        self.queries = []
+
+    def add(self, key, namespace, metric_name, dimensions, unit=None):
+        """Queue a metric; key is any hashable used to look the result up after collect()"""
+        self.queries.append({
+            "key": key,
+            "namespace": namespace,
+            "metric_name": metric_name,
+            "dimensions": dimensions,
+            "unit": unit,
+        })
+
+    def collect(self, start_time, end_time):
+        """
+        Fetch every queued metric for the window and return {key: {'Datapoints': [...]}}
+
+        Keys whose series came back empty are left out.
+        """
+        if self.store is None:
+            series = self._fetch(range(len(self.queries)), start_time, end_time)
+        else:
+            series = self._collect_cached(start_time, end_time)
+
+        results = {}
+        for index, query in enumerate(self.queries):
+            points = series.get(index)
+            if not points:
+                continue
+            points.sort(key=lambda point: point[0])
+            results[query["key"]] = {
+                "Label": query["metric_name"],
+                "Datapoints": [
+                    {"Timestamp": timestamp, self.stat: value, "Unit": query["unit"] or "None"}
+                    for timestamp, value in points
+                ],
+            }
+        return results
+
+    def _collect_cached(self, start_time, end_time):
+        # Queries missing the same range (typically the whole window or its newest part)
+        # are fetched together, then every series is read back from the store
+        pending = defaultdict(list)
+        for index, query in enumerate(self.queries):
+            for missing in self.store.missing_ranges(self._store_key(query), start_time, end_time):
+                pending[missing].append(index)
+
+        for (range_start, range_end), indexes in pending.items():
+            fetched = self._fetch(indexes, range_start, range_end)
+            for index in indexes:
+                self.store.write(self._store_key(self.queries[index]), range_start, range_end,
+                                 fetched.get(index, []))
+
+        return {index: self.store.read(self._store_key(query), start_time, end_time)
+                for index, query in enumerate(self.queries)}
+
+    def _store_key(self, query):
+        account, region = self.scope
+        resource = ",".join(sorted(f"{d['Name']}={d['Value']}" for d in query["dimensions"]))
+        metric = f"{query['namespace']}/{query['metric_name']}/{self.stat}"
+        return (account, region, resource, metric, self.period)
+
+    def _fetch(self, indexes, start_time, end_time):
+        """
+        Fetch the given queries for one window, returning {query index: [(timestamp, value)]}
+
+        Windows longer than MAX_DATAPOINTS_PER_QUERY periods are split into
+        chunks that are fetched concurrently and stitched back together.
+        """
+        indexes = list(indexes)
+        chunks = split_window(start_time, end_time, self.period)
+        with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(chunks)))) as executor:
+            chunk_series = list(executor.map(in_context(lambda chunk: self._fetch_window(indexes, *chunk)), chunks))
+
+        # Chunks are half-open so they never overlap; keying by timestamp still
+        # guards against a datapoint being reported on both sides of a boundary
+        series = defaultdict(dict)
+        for fetched in chunk_series:
+            for index, points in fetched.items():
+                series[index].update(points)
+        return {index: list(points.items()) for index, points in series.items()}
+
+    def _fetch_window(self, indexes, start_time, end_time):
+        series = defaultdict(dict)
+        for offset in range(0, len(indexes), MAX_QUERIES_PER_REQUEST):
+            batch = indexes[offset:offset + MAX_QUERIES_PER_REQUEST]
+            for query_id, timestamp, value in self._fetch_batch(batch, start_time, end_time):
+                series[int(query_id[1:])][timestamp] = value
+        return series
+
+    def _fetch_batch(self, batch, start_time, end_time):
+        # Ids carry the query index so results can be matched back to self.queries
+        metric_queries = [
+            {
+                "Id": f"m{index}",
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": self.queries[index]["namespace"],
+                        "MetricName": self.queries[index]["metric_name"],
+                        "Dimensions": self.queries[index]["dimensions"],
+                    },
+                    "Period": self.period,
+                    "Stat": self.stat,
+                },
+                "ReturnData": True,
+            }
+            for index in batch
+        ]
+
+        request = {
+            "MetricDataQueries": metric_queries,
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "ScanBy": "TimestampAscending",
+        }
+        while True:
+            response = self.cloudwatch.get_metric_data(**request)
+            for result in response["MetricDataResults"]:
+                for timestamp, value in zip(result["Timestamps"], result["Values"]):
+                    yield result["Id"], timestamp, value
+            for message in response.get("Messages", []):
+                print(f"GetMetricData: {message.get('Code')} {message.get('Value')}")
+
+            next_token = response.get("NextToken")
+            if not next_token:
+                break
+            request["NextToken"] = next_token
+
+class MetricCatalog:
+    """
+    In-memory index of the metrics CloudWatch publishes in one region
+
+    Each namespace is listed once, with pagination, the first time it is
+    queried. Lookups are then dictionary hits instead of one list_metrics
+    probe per (instance, metric).
+
+    Usage:
+        catalog = MetricCatalog(cloudwatch)
+        catalog.find("CWAgent", "mem_used_percent", "i-123")
+        # [[{'Name': 'InstanceId', 'Value': 'i-123'}, {'Name': 'ImageId', ...}]]
+    """
+
+    def __init__(self, cloudwatch):
+        self.cloudwatch = cloudwatch
+        self.list_calls = 0
+        self._loaded = set()
+        self._lock = threading.Lock()
+        # (namespace, metric name) -> {resource id: [dimension list, ...]}
+        self._index = defaultdict(lambda: defaultdict(list))
+        # (namespace, metric name) -> set of dimension-name sets the metric is published under
+        self._dimension_sets = defaultdict(set)
+
+    def load(self, namespace):
+        """List every metric in a namespace and index it, unless already done"""
+        with self._lock:
+            if namespace in self._loaded:
+                return
+            resource_dimension = RESOURCE_DIMENSIONS.get(namespace)
+            for page in self.cloudwatch.get_paginator('list_metrics').paginate(Namespace=namespace):
+                self.list_calls += 1
+                for metric in page['Metrics']:
+                    key = (namespace, metric['MetricName'])
+                    dimensions = metric.get('Dimensions', [])
+                    self._dimension_sets[key].add(frozenset(d['Name'] for d in dimensions))
+                    resource_id = next((d['Value'] for d in dimensions if d['Name'] == resource_dimension), None)
+                    if resource_id is not None:
+                        self._index[key][resource_id].append(dimensions)
+            self._loaded.add(namespace)
+
+    def find(self, namespace, metric_name, resource_id, required=None):
+        """
+        Return the dimension lists a resource publishes a metric under
+
+        Parameters:
+        - required: Optional list of {'Name', 'Value'} dimensions every match must contain
+
+        Returns:
+        List of dimension lists, empty if the metric is not published for the resource
+        """
+        self.load(namespace)
+        matches = self._index.get((namespace, metric_name), {}).get(resource_id, [])
+        if required:
+            matches = [dimensions for dimensions in matches
+                       if all(dimension in dimensions for dimension in required)]
+        return matches
+
+    def resources(self, namespace, metric_name):
+        """Return the ids of every resource that publishes a metric"""
+        self.load(namespace)
+        return set(self._index.get((namespace, metric_name), {}))
+
+    def dimension_sets(self, namespace, metric_name):
+        """Return the distinct sets of dimension names a metric is published under"""
+        self.load(namespace)
+        return set(self._dimension_sets.get((namespace, metric_name), set()))
@@ -0,0 +1,410 @@
+import base64
+import glob
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from botocore import handlers
+from botocore.awsrequest import AWSResponse
+from urllib3.response import HTTPResponse
+
+# Bundle to record every AWS exchange of a run to: a local path or s3://bucket/key
+RECORD_PATH = os.environ.get("AWS_RECORD_PATH")
+
+# Bundle to answer AWS requests from instead of AWS (local path)
+REPLAY_PATH = os.environ.get("AWS_REPLAY_PATH")
+
+# Delay added to each replayed response in milliseconds, or "recorded" to
+# wait as long as the recorded request took
+REPLAY_LATENCY_MS = os.environ.get("AWS_REPLAY_LATENCY_MS", "0")
+
+# Share of replayed requests first answered with a throttling error (0 to 1), and the seed of the draws
+REPLAY_THROTTLE_RATE = float(os.environ.get("AWS_REPLAY_THROTTLE_RATE", "0"))
+REPLAY_SEED = int(os.environ.get("AWS_REPLAY_SEED", "0"))
+
+# "1" fails requests missing from the bundle instead of serving the closest
+# recorded response of the same operation
+REPLAY_STRICT = os.environ.get("AWS_REPLAY_STRICT", "0") == "1"
+
+BUNDLE_FORMAT = 1
+
+# Access key ID in a SigV4 Authorization header
+_CREDENTIAL_PATTERN = re.compile(r"Credential=([^/,\s]+)/")
+
+# Error code of an injected throttling response, per protocol
+_THROTTLE_CODES = {
+    "query": "Throttling",
+    "ec2": "RequestLimitExceeded",
+    "json": "ThrottlingException",
+    "rest-json": "ThrottlingException",
+    "rest-xml": "SlowDown",
+    "smithy-rpc-v2-cbor": "ThrottlingException",
+}
+
+# Recorder or Replayer the hooks currently serve; clients created for an
+# earlier invocation keep their hooks, which then follow the new one
+_active = None
+_local = threading.local()
+_hooks_registered = False
+
+
+class ReplayMiss(Exception):
+    """Raised for a request the replayed bundle has no response for"""
+
+
+def _request_key(service, operation, request):
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode()
+    digest = hashlib.sha256(body).hexdigest() if isinstance(body, (bytes, bytearray)) else None
+    authorization = request.headers.get("Authorization") or ""
+    if isinstance(authorization, bytes):
+        authorization = authorization.decode()
+    match = _CREDENTIAL_PATTERN.search(authorization)
+    return {
+        "service": service,
+        "operation": operation,
+        "method": request.method,
+        "url": request.url,
+        "body_sha256": digest,
+        "access_key": match.group(1) if match else None,
+    }
+
+
+def _event_parts(event_name):
+    # "before-send.cloudwatch.GetMetricData" -> ("cloudwatch", "GetMetricData")
+    _, service, operation = event_name.split(".", 2)
+    return service, operation
+
+
+def _before_call(model=None, **kwargs):
+    if model is not None:
+        _local.protocol = getattr(model.service_model, "resolved_protocol", model.service_model.protocol)
+
+
+def _before_send(request, event_name, **kwargs):
+    if _active is not None:
+        return _active.before_send(request, *_event_parts(event_name))
+
+
+def _response_received(response_dict=None, event_name=None, **kwargs):
+    if _active is not None:
+        _active.response_received(response_dict)
+
+
+def _register_hooks(session=None):
+    """Register the dispatching hooks for every session created from now on (and on session)"""
+    global _hooks_registered
+    specs = [("before-call", _before_call),
+             ("before-send", _before_send, handlers.REGISTER_LAST),
+             ("response-received", _response_received)]
+    if not _hooks_registered:
+        handlers.BUILTIN_HANDLERS.extend(specs)
+        _hooks_registered = True
+    if session is not None:
+        events = session.get_component("event_emitter")
+        events.register("before-call", _before_call, unique_id="replay-call")
+        events.register_last("before-send", _before_send, unique_id="replay-send")
+        events.register("response-received", _response_received, unique_id="replay-response")
+
+
+class Recorder:
+    """
+    Write every HTTP exchange to a gzip'd JSON-lines bundle
+
+    Recording happens at the HTTP layer, for every boto3 client (the
+    provider client's included), retries and throttling responses too, so
+    any service protocol is captured as is.
+
+    Exchanges are appended as they happen to one part file per process, so
+    forked account workers record too; finish() gathers the parts into
+    the bundle.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts_dir = tempfile.mkdtemp(prefix="aws-record-")
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def before_send(self, request, service, operation):
+        _local.pending = (_request_key(service, operation, request), time.perf_counter())
+        return None
+
+    def response_received(self, response_dict):
+        pending = getattr(_local, "pending", None)
+        _local.pending = None
+        if pending is None or response_dict is None:
+            return
+        key, started = pending
+        body = response_dict.get("body")
+        entry = {
+            **key,
+            "status": response_dict["status_code"],
+            "headers": dict(response_dict["headers"]),
+            # Streaming bodies (e.g. S3 GetObject) cannot be read here without consuming them
+            "body": base64.b64encode(body).decode() if isinstance(body, (bytes, bytearray)) else None,
+            "elapsed": round(time.perf_counter() - started, 4),
+            "time": time.time(),
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._file = open(os.path.join(self.parts_dir, f"{self._pid}.jsonl"), "a")
+            self._file.write(line)
+            self._file.flush()
+
+    def finish(self):
+        """Write the bundle to self.path (local or s3://) and return the number of exchanges"""
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file = None
+
+        entries = []
+        for part in glob.glob(os.path.join(self.parts_dir, "*.jsonl")):
+            with open(part) as part_file:
+                for line in part_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # last line of a worker stopped mid-write
+        entries.sort(key=lambda entry: entry["time"])
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as bundle:
+            bundle.write((json.dumps({"format": BUNDLE_FORMAT, "created": time.time(),
+                                      "exchanges": len(entries)}) + "\n").encode())
+            for entry in entries:
+                bundle.write((json.dumps(entry) + "\n").encode())
+
+        if self.path.startswith("s3://"):
+            from .uploads import report_s3_client
+            # The hooks are off by now (see finish()), so the upload itself is not recorded
+            bucket, _, key = self.path[len("s3://"):].partition("/")
+            report_s3_client().put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+        else:
+            with open(self.path, "wb") as output:
+                output.write(buffer.getvalue())
+        print(f"Recorded {len(entries)} AWS exchanges to {self.path}")
+        return len(entries)
+
+
+def load_bundle(path):
+    """Return (header, entries) of a bundle"""
+    with gzip.open(path, "rt") as bundle:
+        header = json.loads(bundle.readline())
+        if header.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path} is not a format {BUNDLE_FORMAT} AWS recording")
+        return header, [json.loads(line) for line in bundle if line.strip()]
+
+
+class Replayer:
+    """
+    Answer HTTP requests from a recorded bundle instead of AWS
+
+    Used to reproduce a production account's run offline for benchmarks
+    and profiling, optionally with extra latency and injected throttling
+    errors (which go through botocore's retries and the rate limiter like
+    real ones).
+
+    A request is matched on operation, URL, body and the access key that
+    signed it; then on the same without the access key (the base
+    credentials differ between environments, assumed-role keys come from
+    the replayed STS response). Unless strict, a request with no such
+    match gets the first recorded response of the same operation and URL.
+    Responses recorded for the same request are served in order, the last
+    one repeating once they are used up.
+    """
+
+    def __init__(self, path, latency_ms=0, throttle_rate=0.0, seed=0, strict=False):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._levels = [defaultdict(list) for _ in range(3)]
+        # Served, loose and throttled counts, in shared memory so forked account workers add to them
+        self._stats = multiprocessing.Array("l", 3)
+        _, entries = load_bundle(path)
+        for entry in entries:
+            for index, key in enumerate(self._keys(entry)):
+                self._levels[index][key].append(entry)
+        self._used = set()
+
+    @staticmethod
+    def _keys(key):
+        exact = (key["service"], key["operation"], key["method"], key["url"], key["body_sha256"])
+        return [exact + (key["access_key"],), exact, (key["service"], key["operation"], key["url"].split("?")[0])]
+
+    def _match(self, key):
+        levels = self._levels[:2] if self.strict else self._levels
+        with self._lock:
+            for level, lookup in zip(levels, self._keys(key)):
+                candidates = level.get(lookup)
+                if not candidates:
+                    continue
+                entry = next((entry for entry in candidates if id(entry) not in self._used), candidates[-1])
+                self._used.add(id(entry))
+                self._add(served=1, loose=int(level is self._levels[2]))
+                return entry
+        return None
+
+    def _add(self, served=0, loose=0, throttled=0):
+        with self._stats.get_lock():
+            self._stats[0] += served
+            self._stats[1] += loose
+            self._stats[2] += throttled
+
+    @property
+    def served(self):
+        return self._stats[0]
+
+    def _throttle(self):
+        protocol = getattr(_local, "protocol", "query")
+        code = _THROTTLE_CODES.get(protocol, "Throttling")
+        message = "Rate exceeded (injected by replay)"
+        headers = {"x-amzn-requestid": "replay"}
+        status = 400
+        if protocol == "query":
+            body = (f"<ErrorResponse><Error><Type>Sender</Type><Code>{code}</Code><Message>{message}</Message>"
+                    "</Error><RequestId>replay</RequestId></ErrorResponse>").encode()
+        elif protocol == "ec2":
+            status = 503
+            body = (f"<Response><Errors><Error><Code>{code}</Code><Message>{message}</Message></Error></Errors>"
+                    "<RequestID>replay</RequestID></Response>").encode()
+        elif protocol == "rest-xml":
+            status = 503
+            body = f"<Error><Code>{code}</Code><Message>{message}</Message></Error>".encode()
+        elif protocol == "smithy-rpc-v2-cbor":
+            headers.update({"smithy-protocol": "rpc-v2-cbor", "x-amzn-query-error": "Throttling;Sender"})
+            body = _cbor_map({"__type": code, "message": message})
+        else:
+            headers["x-amzn-query-error"] = "Throttling;Sender"
+            body = json.dumps({"__type": code, "message": message}).encode()
+        return status, headers, body
+
+    def before_send(self, request, service, operation):
+        key = _request_key(service, operation, request)
+        with self._lock:
+            throttled = self.throttle_rate and self._random.random() < self.throttle_rate
+        if throttled:
+            self._add(throttled=1)
+            status, headers, body = self._throttle()
+            elapsed = 0
+        else:
+            entry = self._match(key)
+            if entry is None:
+                raise ReplayMiss(f"No recorded response for {service}.{operation} {request.url}")
+            status, headers = entry["status"], entry["headers"]
+            body = base64.b64decode(entry["body"]) if entry["body"] is not None else b""
+            elapsed = entry["elapsed"]
+
+        delay = elapsed if self.latency_ms == "recorded" else float(self.latency_ms) / 1000
+        if delay:
+            time.sleep(delay)
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status,
+                           preload_content=False, decode_content=False)
+        return AWSResponse(request.url, status, headers, raw)
+
+    def response_received(self, response_dict):
+        pass
+
+    def finish(self):
+        """Log what was served and rewind the bundle for the next run"""
+        with self._stats.get_lock():
+            served, loose, throttled = self._stats[:]
+            self._stats[:] = [0, 0, 0]
+        print(f"Replayed {served} AWS responses from {self.path} ({loose} loose matches, "
+              f"{throttled} injected throttles)")
+        with self._lock:
+            self._used.clear()
+        return served
+
+
+def _cbor_map(values):
+    # Minimal CBOR: a map of short text strings, enough for an error body
+    def text(value):
+        data = value.encode()
+        header = bytes([0x60 + len(data)]) if len(data) < 24 else bytes([0x78, len(data)])
+        return header + data
+    return bytes([0xA0 + len(values)]) + b"".join(text(key) + text(value) for key, value in values.items())
+
+
+def install(runner):
+    """Serve every boto3 client's requests through runner (a Recorder or Replayer)"""
+    global _active
+    import boto3
+    _register_hooks(boto3.DEFAULT_SESSION._session if boto3.DEFAULT_SESSION else None)
+    _active = runner
+    return runner
+
+
+def uninstall():
+    global _active
+    _active = None
+
+
+def install_from_env():
+    """
+    Start recording or replaying as configured by AWS_RECORD_PATH / AWS_REPLAY_PATH
+
+    Usage:
+        AWS_RECORD_PATH=/tmp/run.jsonl.gz  (then invoke the handler)
+        AWS_REPLAY_PATH=run.jsonl.gz AWS_REPLAY_THROTTLE_RATE=0.05 \\
+            python -c "import handler, json; handler.lambda_handler(json.load(open('event.json')), None)"
+        python -m app.replay run.jsonl.gz  # summary of a bundle
+
+    Returns:
+    The Recorder or Replayer to pass to finish() at the end of the run, or None
+    """
+    if REPLAY_PATH:
+        latency = REPLAY_LATENCY_MS if REPLAY_LATENCY_MS == "recorded" else float(REPLAY_LATENCY_MS)
+        return install(Replayer(REPLAY_PATH, latency_ms=latency, throttle_rate=REPLAY_THROTTLE_RATE,
+                                seed=REPLAY_SEED, strict=REPLAY_STRICT))
+    if RECORD_PATH:
+        return install(Recorder(RECORD_PATH))
+    return None
+
+
+def finish(runner):
+    """End a run started by install_from_env(): stop the hooks and write or rewind the bundle"""
+    if runner is None:
+        return
+    uninstall()
+    runner.finish()
+
+
+def summary(path):
+    """Return exchange counts, statuses and response bytes per operation of a bundle"""
+    header, entries = load_bundle(path)
+    operations = defaultdict(lambda: {"exchanges": 0, "bytes": 0, "seconds": 0.0, "statuses": Counter()})
+    for entry in entries:
+        stats = operations[f"{entry['service']}.{entry['operation']}"]
+        stats["exchanges"] += 1
+        stats["bytes"] += len(base64.b64decode(entry["body"])) if entry["body"] else 0
+        stats["seconds"] = round(stats["seconds"] + entry["elapsed"], 4)
+        stats["statuses"][str(entry["status"])] += 1
+    return {"created": header["created"], "exchanges": len(entries),
+            "operations": {name: {**stats, "statuses": dict(stats["statuses"])}
+                           for name, stats in sorted(operations.items())}}
+
+
+if __name__ == "__main__":
+    for bundle_path in sys.argv[1:]:
+        print(json.dumps({"bundle": bundle_path, **summary(bundle_path)}, indent=2))
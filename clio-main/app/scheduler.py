@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from . import warm_cache
+
+# Accounts whose reports are generated at the same time
+ACCOUNT_WORKERS = int(os.environ.get("REPORT_ACCOUNT_WORKERS", "4"))
+
+# Same reasoning as CHART_MP_CONTEXT: plain Processes and Pipes work in Lambda,
+# and fork avoids re-importing the Lambda bootstrap in every worker
+ACCOUNT_MP_CONTEXT = os.environ.get("REPORT_ACCOUNT_MP_CONTEXT", "fork")
+
+
+def run_job(func, job):
+    """
+    Run one job and turn its outcome into a result dict instead of raising
+
+    Returns:
+    func's result dict with "status": "ok" and "seconds" added, or
+    {"status": "error", "error": ..., "traceback": ...} if it raised
+    """
+    started = time.perf_counter()
+    try:
+        result = dict(func(**job) or {})
+        result.setdefault("status", "ok")
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _job_worker(func, job, conn):
+    # Counters start from zero so the parent can add them to its own
+    warm_cache.reset_stats()
+    result = run_job(func, job)
+    conn.send((result, warm_cache.export_loaded()))
+    conn.close()
+
+
+def run_isolated(func, jobs, max_workers=ACCOUNT_WORKERS, deadline=None, on_result=None):
+    """
+    Run func(**job) for every job, up to max_workers at a time, each in its own process
+
+    A job that raises, or whose process dies outright (e.g. out of memory),
+    only fails its own result; the other jobs carry on.
+
+    Parameters:
+    - func: Module-level function returning a JSON-serialisable dict
+    - jobs: List of keyword-argument dicts, one per job
+    - max_workers: Number of jobs running at the same time
+    - deadline: Optional time.monotonic() value. No job is started after
+      it, and jobs still running at it are stopped
+    - on_result: Optional callback(index, result) called in this process as
+      soon as each job finishes, e.g. to start uploading its output
+
+    Returns:
+    List of result dicts (see run_job) in the same order as jobs; jobs cut
+    off by the deadline get {"status": "pending"}
+    """
+    workers = max(1, min(max_workers, len(jobs)))
+    if workers == 1 and deadline is None:
+        results = []
+        for index, job in enumerate(jobs):
+            results.append(run_job(func, job))
+            if on_result:
+                on_result(index, results[index])
+        return results
+
+    context = multiprocessing.get_context(ACCOUNT_MP_CONTEXT)
+    results = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    running = {}
+
+    while pending or running:
+        if deadline is not None and time.monotonic() >= deadline:
+            for index, _ in pending:
+                results[index] = {"status": "pending", "seconds": 0}
+            pending = []
+            for conn, (index, process, started) in running.items():
+                process.terminate()
+                process.join()
+                results[index] = {"status": "pending", "error": "Stopped at the time budget",
+                                  "seconds": round(time.perf_counter() - started, 3)}
+            break
+
+        while pending and len(running) < workers:
+            index, job = pending.pop(0)
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(target=_job_worker, args=(func, job, child_conn))
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (index, process, time.perf_counter())
+
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        for conn in wait(list(running), timeout=timeout):
+            index, process, started = running.pop(conn)
+            try:
+                results[index], loaded = conn.recv()
+                warm_cache.merge_loaded(loaded)
+            except EOFError:
+                results[index] = {"status": "error", "error": "Worker process exited without a result",
+                                  "seconds": round(time.perf_counter() - started, 3)}
+            process.join()
+            if results[index]["status"] == "error" and process.exitcode:
+                results[index]["exitcode"] = process.exitcode
+            if on_result:
+                on_result(index, results[index])
+
+    return results
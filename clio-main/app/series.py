@@ -0,0 +1,142 @@
+import numpy as np
+
+# Utilisation above this (in percent) is flagged in the report remarks
+HIGH_UTILIZATION_THRESHOLD = 85
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Pick the indexes of at most max_points samples with Largest-Triangle-Three-Buckets
+
+    The first and last samples are always kept. The rest of the series is cut
+    into equal buckets and, per bucket, the sample forming the largest
+    triangle with the previously kept sample and the next bucket's average is
+    kept, which preserves the visual shape including spikes.
+
+    Returns:
+    Sorted NumPy array of indexes into x and y
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indexes = np.empty(max_points, dtype=np.int64)
+    indexes[0] = 0
+    indexes[-1] = n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        indexes[bucket + 1] = previous
+    return indexes
+
+
+class MetricSeries:
+    """
+    Columnar time series built once from CloudWatch datapoints
+
+    Timestamps are kept as epoch seconds and values as float64 NumPy arrays,
+    sorted by time. Statistics are computed together on first use and cached,
+    so the graph, remarks and tables all read the same numbers.
+    """
+
+    def __init__(self, timestamps, values, unit="Percent"):
+        order = np.argsort(timestamps, kind="stable")
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self.unit = unit
+        self._stats = None
+
+    @classmethod
+    def from_datapoints(cls, metric_data, stat="Average"):
+        """
+        Build a series from a {'Datapoints': [...]} response
+
+        Parameters:
+        - metric_data: get_metric_statistics-shaped dict
+        - stat: Statistic key to read from each datapoint
+        """
+        points = (metric_data or {}).get('Datapoints') or []
+        timestamps = np.fromiter((point['Timestamp'].timestamp() for point in points), dtype=np.float64, count=len(points))
+        values = np.fromiter((point[stat] for point in points), dtype=np.float64, count=len(points))
+        unit = points[0].get('Unit', 'Percent') if points else 'Percent'
+        return cls(timestamps, values, unit)
+
+    def __len__(self):
+        return len(self.values)
+
+    def scaled(self, factor, unit=None):
+        """Return a copy with every value multiplied by factor, e.g. 1 / 1024 ** 3 for bytes to GB"""
+        return MetricSeries(self.timestamps, self.values * factor, unit or self.unit)
+
+    def downsampled(self, max_points):
+        """
+        Return a copy reduced to about max_points samples for plotting
+
+        Uses LTTB and additionally keeps the global minimum and maximum, so
+        peaks always survive. Statistics must still be taken from the full
+        series, not from the copy.
+        """
+        if len(self) <= max_points:
+            return self
+        indexes = lttb_indices(self.timestamps, self.values, max_points)
+        indexes = np.union1d(indexes, [self.values.argmin(), self.values.argmax()])
+        return MetricSeries(self.timestamps[indexes], self.values[indexes], self.unit)
+
+    def datetimes(self):
+        """Timestamps as UTC datetime64 values, ready for matplotlib"""
+        return self.timestamps.astype('datetime64[s]')
+
+    @property
+    def start(self):
+        return self.datetimes()[0].item() if len(self) else None
+
+    @property
+    def end(self):
+        return self.datetimes()[-1].item() if len(self) else None
+
+    def stats(self, thresholds=(HIGH_UTILIZATION_THRESHOLD,)):
+        """
+        Return summary statistics for the series
+
+        Returns:
+        Dictionary with count, min, max, mean, p50, p95, p99, stddev and
+        "exceedances", the number of datapoints above each threshold.
+        Statistics are None for an empty series.
+        """
+        if self._stats is not None and set(thresholds) <= set(self._stats['exceedances']):
+            return self._stats
+
+        values = self.values
+        if len(values) == 0:
+            self._stats = {
+                'count': 0, 'min': None, 'max': None, 'mean': None,
+                'p50': None, 'p95': None, 'p99': None, 'stddev': None,
+                'exceedances': {threshold: 0 for threshold in thresholds},
+            }
+            return self._stats
+
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        exceeded = values[np.newaxis, :] > np.asarray(thresholds, dtype=np.float64)[:, np.newaxis]
+        self._stats = {
+            'count': int(len(values)),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'mean': float(values.mean()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'stddev': float(values.std()),
+            'exceedances': dict(zip(thresholds, (int(count) for count in exceeded.sum(axis=1)))),
+        }
+        return self._stats
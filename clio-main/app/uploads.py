@@ -0,0 +1,79 @@
+import io
+import os
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from .warm_cache import CLIENTS, credential_fingerprint
+
+# Bucket the finished reports are uploaded to
+REPORT_BUCKET = os.environ.get("REPORT_BUCKET", "nx-report")
+
+# Point at a local S3 stand-in (MinIO, moto server, ...) for testing
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+
+# Parts of one report uploaded at the same time
+UPLOAD_PART_CONCURRENCY = int(os.environ.get("REPORT_UPLOAD_PART_CONCURRENCY", "4"))
+
+# Reports above this size go up as a multipart upload in parts of this size
+UPLOAD_PART_MB = int(os.environ.get("REPORT_UPLOAD_PART_MB", "8"))
+
+# Whole-upload attempts; individual requests (parts included) are also retried by botocore
+UPLOAD_ATTEMPTS = int(os.environ.get("REPORT_UPLOAD_ATTEMPTS", "3"))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_PART_MB * 1024 * 1024,
+    multipart_chunksize=UPLOAD_PART_MB * 1024 * 1024,
+    max_concurrency=UPLOAD_PART_CONCURRENCY,
+    use_threads=True,
+)
+
+S3_CLIENT_CONFIG = Config(
+    retries={"max_attempts": 8, "mode": "adaptive"},
+    max_pool_connections=UPLOAD_PART_CONCURRENCY,
+)
+
+
+def report_s3_client(session=None):
+    """
+    Return the pooled S3 client for the report bucket, honouring S3_ENDPOINT_URL
+
+    Parameters:
+    - session: boto3 Session to upload with, the Lambda's own default session if None
+    """
+    if session is None:
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        session = boto3.DEFAULT_SESSION
+    # Keyed like every pooled client, plus the endpoint it was built for
+    key = (credential_fingerprint(session), session.region_name, 's3', S3_ENDPOINT_URL)
+    return CLIENTS.get(key, lambda: session.client(
+        's3', endpoint_url=S3_ENDPOINT_URL, config=S3_CLIENT_CONFIG))
+
+
+def upload_report(s3, key, data, bucket=REPORT_BUCKET):
+    """
+    Upload a finished report from memory, retrying the whole upload with backoff
+
+    Reports above UPLOAD_PART_MB go up as a multipart upload. Call it from
+    the account worker: s3transfer starts threads, and the parent process
+    must not have any while it still forks workers.
+
+    Returns:
+    {"status": "ok", "bytes", "attempts", "upload_seconds"}, or
+    {"status": "error", "error", "attempts"} once every attempt failed
+    """
+    started = time.perf_counter()
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            s3.upload_fileobj(io.BytesIO(data), bucket, key, Config=TRANSFER_CONFIG)
+            return {"status": "ok", "bytes": len(data), "attempts": attempt,
+                    "upload_seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            print(f"Upload of {key} failed (attempt {attempt}/{UPLOAD_ATTEMPTS}): {e}")
+            if attempt == UPLOAD_ATTEMPTS:
+                return {"status": "error", "error": f"Upload failed: {type(e).__name__}: {e}",
+                        "attempts": attempt}
+            time.sleep(2 ** attempt)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Lifetimes in seconds of the module-level caches. They live as long as the
+# Lambda container, so warm invocations reuse them; 0 disables a cache
+CLIENT_TTL = float(os.environ.get("WARM_CACHE_CLIENT_TTL", "2700"))        # below the 1h assumed-role session
+ACCOUNT_TTL = float(os.environ.get("WARM_CACHE_ACCOUNT_TTL", "2700"))
+REGION_TTL = float(os.environ.get("WARM_CACHE_REGION_TTL", "86400"))
+INVENTORY_TTL = float(os.environ.get("WARM_CACHE_INVENTORY_TTL", "300"))
+ASSET_TTL = float(os.environ.get("WARM_CACHE_ASSET_TTL", "86400"))
+
+# Most live clients kept at once; the least recently used one goes first
+CLIENT_MAX_SIZE = int(os.environ.get("WARM_CACHE_CLIENT_MAX_SIZE", "256"))
+
+_caches = {}
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache whose entries expire after a fixed time
+
+    Caches register themselves by name so their statistics can be logged
+    together. Entries of a "shareable" cache are plain data; values loaded
+    in a forked account worker are sent back to the parent with
+    export_loaded() and added to its cache, so the next invocation in the
+    same container sees them. Clients and other live objects stay in the
+    process that made them.
+
+    With max_size set the cache also drops its least recently used entries
+    beyond that many.
+
+    Usage:
+        REGIONS = TTLCache("regions", ttl=86400, shareable=True)
+        regions = REGIONS.get(account_id, lambda: describe_regions())
+    """
+
+    def __init__(self, name, ttl, shareable=False, max_size=None):
+        self.name = name
+        self.ttl = ttl
+        self.shareable = shareable
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        _caches[name] = self
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() if it is missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+
+            value = loader()
+            if self.ttl > 0:
+                self._entries[key] = (now + self.ttl, value, os.getpid())
+                self._entries.move_to_end(key)
+                while self.max_size and len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions, "size": len(self._entries)}
+
+
+def export_loaded():
+    """
+    Return what this process added to the shareable caches, for merge_loaded() in the parent
+
+    Returns:
+    Dictionary {cache name: {"entries": {key: (seconds left, value)}, "hits", "misses", "evictions"}}
+    """
+    now = time.monotonic()
+    pid = os.getpid()
+    exported = {}
+    for name, cache in _caches.items():
+        with cache._lock:
+            entries = {}
+            if cache.shareable:
+                entries = {key: (expires - now, value) for key, (expires, value, owner) in cache._entries.items()
+                           if owner == pid and expires > now}
+            exported[name] = {"entries": entries, "hits": cache.hits, "misses": cache.misses,
+                              "evictions": cache.evictions}
+    return exported
+
+
+def merge_loaded(exported):
+    """Add entries and counters exported by a worker process"""
+    now = time.monotonic()
+    pid = os.getpid()
+    for name, loaded in exported.items():
+        cache = _caches.get(name)
+        if cache is None:
+            continue
+        with cache._lock:
+            cache.hits += loaded["hits"]
+            cache.misses += loaded["misses"]
+            cache.evictions += loaded["evictions"]
+            for key, (seconds_left, value) in loaded["entries"].items():
+                cache._entries[key] = (now + seconds_left, value, pid)
+
+
+def reset_stats():
+    """Zero the counters of every cache, e.g. at the start of an invocation"""
+    for cache in _caches.values():
+        cache.reset_stats()
+
+
+def cache_stats():
+    """Return {cache name: {"hits", "misses", "hit_rate", "evictions", "size"}} for every cache"""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def credential_fingerprint(session):
+    """
+    Return a short hash of a boto3 session's current access key
+
+    Clients are pooled under it, so a refreshed assumed-role session gets
+    new clients instead of ones holding the previous credentials.
+    """
+    credentials = session.get_credentials()
+    access_key = credentials.access_key if credentials is not None else ""
+    return hashlib.sha256(access_key.encode()).hexdigest()[:16]
+
+
+# Live boto3 clients, keyed by (credential fingerprint, region, service)
+CLIENTS = TTLCache("clients", CLIENT_TTL, max_size=CLIENT_MAX_SIZE)
+
+# Account clients holding the assumed-role session, keyed by account id
+ACCOUNTS = TTLCache("accounts", ACCOUNT_TTL)
+
+# Enabled regions, keyed by account id
+REGIONS = TTLCache("regions", REGION_TTL, shareable=True)
+
+# Inventory results (running instance IDs, EC2 host info, RDS instances), keyed by (account id, lookup, ...)
+INVENTORY = TTLCache("inventory", INVENTORY_TTL, shareable=True)
+
+# Stylesheets and images used to render every report
+ASSETS = TTLCache("assets", ASSET_TTL)
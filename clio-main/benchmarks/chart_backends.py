@@ -0,0 +1,100 @@
+"""
+Compare the matplotlib and reportlab chart backends
+
+Builds the same PDF of synthetic metric charts with each backend and reports
+render time, PDF build time and PDF size. Run from clio-main:
+
+    python -m benchmarks.chart_backends --charts 60 --points 288
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, SimpleDocTemplate, Spacer
+
+from app.charts import ChartImages, chart_spec, render_charts
+from app.series import MetricSeries
+from app.vector_charts import draw_chart
+
+
+def synthetic_specs(charts, points, period=300):
+    rng = np.random.default_rng(0)
+    end = time.time() // period * period
+    timestamps = end - period * np.arange(points)[::-1]
+    specs = []
+    for index in range(charts):
+        values = np.clip(40 + 20 * np.sin(np.linspace(0, 6, points)) + rng.normal(0, 8, points), 0, 100)
+        specs.append(chart_spec(MetricSeries(timestamps, values), "cpu", f"host-{index}"))
+    return specs
+
+
+def build_pdf(path, flowables):
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    elements = []
+    for flowable in flowables:
+        elements.extend([flowable, Spacer(1, 0.2*inch)])
+    doc.build(elements)
+
+
+def run_matplotlib(specs, path):
+    started = time.perf_counter()
+    images = render_charts(specs)
+    charts = ChartImages()
+    flowables = [Image(charts.source(image), width=6*inch, height=2*inch) for image in images]
+    rendered = time.perf_counter()
+    try:
+        build_pdf(path, flowables)
+    finally:
+        charts.cleanup()
+    return rendered - started, time.perf_counter() - rendered
+
+
+def run_reportlab(specs, path):
+    started = time.perf_counter()
+    flowables = [draw_chart(spec) for spec in specs]
+    rendered = time.perf_counter()
+    build_pdf(path, flowables)
+    return rendered - started, time.perf_counter() - rendered
+
+
+BACKENDS = {
+    "matplotlib": run_matplotlib,
+    "reportlab": run_reportlab,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--charts", type=int, default=60, help="Charts per report")
+    parser.add_argument("--points", type=int, default=288, help="Datapoints per chart")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend; the fastest is reported")
+    args = parser.parse_args()
+
+    specs = synthetic_specs(args.charts, args.points)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend, run in BACKENDS.items():
+            path = os.path.join(directory, f"{backend}.pdf")
+            timings = [run(specs, path) for _ in range(args.repeat)]
+            render_seconds, build_seconds = min(timings, key=sum)
+            results.append({
+                "backend": backend,
+                "charts": args.charts,
+                "points": args.points,
+                "render_seconds": round(render_seconds, 3),
+                "build_seconds": round(build_seconds, 3),
+                "total_seconds": round(render_seconds + build_seconds, 3),
+                "pdf_bytes": os.path.getsize(path),
+            })
+
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure the import cost of the report Lambda with python -X importtime
+
+Imports each target in a fresh interpreter several times and reports the
+median cumulative import time of the target and its heaviest dependencies.
+Run from clio-main:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms handler=150 --budget-ms app.app=900
+
+With --budget-ms the script exits non-zero when a target exceeds its
+budget, so it can gate a build.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules imported at each stage of a cold start
+TARGETS = ("handler", "app.app", "app.charts", "app.vector_charts", "matplotlib.figure")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """
+    Import module in a fresh interpreter
+
+    Returns:
+    Tuple (cumulative microseconds of module, {dependency: cumulative
+    microseconds}) for the modules module imports directly, leaving out
+    interpreter startup such as site
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    # Each line is "import time: self | cumulative | <indent>name"; a module's
+    # dependencies are the more indented lines right above it
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+
+    for position in range(len(entries) - 1, -1, -1):
+        depth, name, total = entries[position]
+        if name != module:
+            continue
+        children = []
+        for child in reversed(entries[:position]):
+            if child[0] <= depth:
+                break
+            children.append(child)
+        direct_depth = min((child[0] for child in children), default=0)
+        return total, {child_name: child_total for child_depth, child_name, child_total in children
+                       if child_depth == direct_depth}
+    return 0, {}
+
+
+def measure(module, repeat, top):
+    runs = [import_times(module) for _ in range(repeat)]
+    total = statistics.median(run_total for run_total, _ in runs)
+    heaviest = sorted(runs[-1][1].items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "import_ms": round(total / 1000, 1),
+        "heaviest": {name: round(micros / 1000, 1) for name, micros in heaviest},
+    }
+
+
+def parse_budget(value):
+    module, _, millis = value.partition("=")
+    return module, float(millis)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("targets", nargs="*", default=TARGETS, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest dependencies to list")
+    parser.add_argument("--budget-ms", type=parse_budget, action="append", default=[],
+                        metavar="MODULE=MS", help="Fail when MODULE takes longer than MS to import")
+    args = parser.parse_args()
+
+    budgets = dict(args.budget_ms)
+    over_budget = []
+    for module in list(args.targets) + [module for module in budgets if module not in args.targets]:
+        result = measure(module, args.repeat, args.top)
+        if module in budgets:
+            result["budget_ms"] = budgets[module]
+            if result["import_ms"] > budgets[module]:
+                over_budget.append(module)
+        print(json.dumps(result))
+
+    if over_budget:
+        print(f"Over import budget: {', '.join(over_budget)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+Benchmark report generation against synthetic fleets of 10 to 5,000 instances
+
+Each scenario seeds an offline AWS account with moto (EC2, RDS, S3) and
+serves CloudWatch ListMetrics/GetMetricData from a generator, so every
+queried series has one datapoint per period of the requested window, as a
+fully monitored account would. The scenario then runs, each in a fresh
+process:
+
+- instances: POST /instances of the API (api/main.py)
+- consolidated: ConsolidatedCloudReport.generate_consolidated_report for one account
+- main: app.main() for --accounts accounts, uploads included
+
+and writes wall time, AWS API calls per operation, peak RSS, PDF size and
+the run's trace record to <output-dir>/fleet-<size>.json. A size with a
+failed target gets no result file and the benchmark exits with status 1.
+The report targets use SyntheticAccount as the provider client. Needs moto,
+and fastapi with httpx for the API target. Run from clio-main:
+
+    python -m benchmarks.synthetic_fleet --sizes 10 100
+    python -m benchmarks.synthetic_fleet --targets main --sizes 1000 --accounts 4
+    python -m benchmarks.synthetic_fleet --compare old-results benchmarks/results
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = (10, 100, 1000, 5000)
+TARGETS = ("instances", "consolidated", "main")
+
+# Region the Lambda reports on (app.app.REPORT_REGION)
+REGION = "ap-south-1"
+
+# Account moto serves every request from
+ACCOUNT_ID = "123456789012"
+
+# Limits of the real GetMetricData and ListMetrics APIs
+MAX_DATAPOINTS_PER_RESPONSE = 100800
+LIST_METRICS_PAGE_SIZE = 500
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class SyntheticFleet:
+    """
+    Offline account holding `size` EC2 instances, a share of them Windows
+    and a share running the CloudWatch agent, plus one RDS instance per
+    `rds_ratio` EC2 instances
+    """
+
+    def __init__(self, size, rds_ratio=0.1, windows_share=0.1, agent_share=0.8):
+        self.size = size
+        self.rds_count = max(1, int(size * rds_ratio))
+        self.windows_share = windows_share
+        self.agent_share = agent_share
+        self.instances = []   # (instance id, platform, image id)
+        self.databases = []
+
+    def seed(self):
+        """Create the fleet in the active moto backend"""
+        import boto3
+
+        ec2 = boto3.client("ec2", region_name=REGION)
+        images = ec2.describe_images()["Images"]
+        linux_image = next(image["ImageId"] for image in images if image.get("Platform") != "windows")
+        windows_image = next((image["ImageId"] for image in images if image.get("Platform") == "windows"), linux_image)
+
+        windows = int(self.size * self.windows_share)
+        for platform, image, count in (("windows", windows_image, windows),
+                                       ("linux", linux_image, self.size - windows)):
+            for offset in range(0, count, 500):
+                batch = min(500, count - offset)
+                response = ec2.run_instances(
+                    ImageId=image, MinCount=batch, MaxCount=batch, InstanceType="t3.medium",
+                    TagSpecifications=[{"ResourceType": "instance",
+                                        "Tags": [{"Key": "Name", "Value": f"{platform}-host"}]}],
+                )
+                self.instances += [(instance["InstanceId"], platform, image) for instance in response["Instances"]]
+
+        rds = boto3.client("rds", region_name=REGION)
+        for index in range(self.rds_count):
+            identifier = f"db-{index}"
+            rds.create_db_instance(DBInstanceIdentifier=identifier, DBInstanceClass="db.t3.medium",
+                                   Engine="postgres", AllocatedStorage=100,
+                                   MasterUsername="bench", MasterUserPassword="benchmark-password")
+            self.databases.append(identifier)
+
+        boto3.client("s3", region_name=REGION).create_bucket(
+            Bucket=os.environ.get("REPORT_BUCKET", "nx-report"),
+            CreateBucketConfiguration={"LocationConstraint": REGION})
+
+    def catalog(self):
+        """Return every metric the fleet publishes, as ListMetrics entries"""
+        metrics = [{"Namespace": "AWS/EC2", "MetricName": "CPUUtilization",
+                    "Dimensions": [{"Name": "InstanceId", "Value": instance_id}]}
+                   for instance_id, _, _ in self.instances]
+        agents = self.instances[:int(len(self.instances) * self.agent_share)]
+        for instance_id, platform, image in agents:
+            common = [{"Name": "InstanceId", "Value": instance_id}, {"Name": "ImageId", "Value": image},
+                      {"Name": "InstanceType", "Value": "t3.medium"}]
+            if platform == "windows":
+                metrics += [
+                    {"Namespace": "CWAgent", "MetricName": "Memory % Committed Bytes In Use",
+                     "Dimensions": common + [{"Name": "objectname", "Value": "Memory"}]},
+                    {"Namespace": "CWAgent", "MetricName": "LogicalDisk % Free Space",
+                     "Dimensions": common + [{"Name": "instance", "Value": "C:"},
+                                             {"Name": "objectname", "Value": "LogicalDisk"}]},
+                ]
+            else:
+                metrics += [
+                    {"Namespace": "CWAgent", "MetricName": "mem_used_percent", "Dimensions": common},
+                    {"Namespace": "CWAgent", "MetricName": "disk_used_percent",
+                     "Dimensions": common + [{"Name": "path", "Value": "/"}, {"Name": "device", "Value": "nvme0n1p1"},
+                                             {"Name": "fstype", "Value": "xfs"}]},
+                ]
+        for identifier in self.databases:
+            for metric_name in ("CPUUtilization", "FreeableMemory", "FreeStorageSpace"):
+                metrics.append({"Namespace": "AWS/RDS", "MetricName": metric_name,
+                                "Dimensions": [{"Name": "DBInstanceIdentifier", "Value": identifier}]})
+        return metrics
+
+
+class SyntheticCloudWatch:
+    """
+    Answer CloudWatch ListMetrics and GetMetricData for a SyntheticFleet
+    without moto, and count every AWS call made by any client
+
+    Installed through botocore's built-in handlers, so it applies to every
+    client created afterwards, in this process and in forked workers. Calls
+    are counted in a multiprocessing manager so workers' calls add up too.
+    """
+
+    def __init__(self, fleet, manager):
+        self.fleet = fleet
+        self.calls = manager.dict()
+        self._metrics = None
+
+    def install(self):
+        from botocore.handlers import BUILTIN_HANDLERS
+        BUILTIN_HANDLERS.append(("before-parameter-build", self._keep_params))
+        BUILTIN_HANDLERS.append(("before-call", self._before_call))
+
+    def call_counts(self):
+        totals = {}
+        for (_, operation), calls in self.calls.items():
+            totals[operation] = totals.get(operation, 0) + calls
+        return dict(sorted(totals.items()))
+
+    @staticmethod
+    def _keep_params(params, context, **kwargs):
+        # before-call only sees the serialised request, so keep the API parameters for it
+        context["benchmark_params"] = params
+
+    def _before_call(self, model, context, **kwargs):
+        service = model.service_model.endpoint_prefix
+        key = (os.getpid(), f"{service}.{model.name}")
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if service != "monitoring" or model.name not in ("ListMetrics", "GetMetricData"):
+            return None
+
+        from botocore.awsrequest import AWSResponse
+        params = context.get("benchmark_params", {})
+        handler = self._list_metrics if model.name == "ListMetrics" else self._get_metric_data
+        return AWSResponse("https://monitoring.synthetic", 200, {}, None), handler(params)
+
+    def _list_metrics(self, params):
+        if self._metrics is None:
+            self._metrics = self.fleet.catalog()
+        matches = [metric for metric in self._metrics
+                   if metric["Namespace"] == params.get("Namespace", metric["Namespace"])
+                   and metric["MetricName"] == params.get("MetricName", metric["MetricName"])]
+        start = int(params.get("NextToken", 0))
+        response = {"Metrics": matches[start:start + LIST_METRICS_PAGE_SIZE]}
+        if start + LIST_METRICS_PAGE_SIZE < len(matches):
+            response["NextToken"] = str(start + LIST_METRICS_PAGE_SIZE)
+        return response
+
+    def _get_metric_data(self, params):
+        queries = params["MetricDataQueries"]
+        start = int(params.get("NextToken", 0))
+        budget = params.get("MaxDatapoints", MAX_DATAPOINTS_PER_RESPONSE)
+        results = []
+        index = start
+        # Whole queries per page, as many as fit the datapoint limit
+        while index < len(queries):
+            timestamps, values = self._series(queries[index], params["StartTime"], params["EndTime"])
+            if results and len(timestamps) > budget:
+                break
+            budget -= len(timestamps)
+            results.append({"Id": queries[index]["Id"], "Label": queries[index]["MetricStat"]["Metric"]["MetricName"],
+                            "Timestamps": timestamps, "Values": values, "StatusCode": "Complete"})
+            index += 1
+        response = {"MetricDataResults": results, "Messages": []}
+        if index < len(queries):
+            response["NextToken"] = str(index)
+        return response
+
+    @staticmethod
+    def _series(query, start_time, end_time):
+        stat = query["MetricStat"]
+        metric = stat["Metric"]
+        period = stat["Period"]
+        start = int(start_time.timestamp()) // period * period
+        if start < start_time.timestamp():
+            start += period
+        # One datapoint per period in [StartTime, EndTime)
+        count = max(0, -(-(int(end_time.timestamp()) - start) // period))
+
+        # Same curve for the same series on every run
+        name = metric["MetricName"] + "".join(d["Value"] for d in metric.get("Dimensions", []))
+        rng = np.random.default_rng(zlib.crc32(name.encode()))
+        base = rng.uniform(10, 70)
+        phase = np.arange(count) * (2 * np.pi * period / 86400)
+        values = np.clip(base + 15 * np.sin(phase + rng.uniform(0, np.pi)) + rng.normal(0, 4, count), 0, 100)
+        if "Memory" in metric["MetricName"] or "Storage" in metric["MetricName"]:
+            values = values * 2 ** 30
+        timestamps = [datetime.fromtimestamp(start + period * offset, tz=timezone.utc) for offset in range(count)]
+        return timestamps, values.tolist()
+
+
+class SyntheticAccount:
+    """Provider client (app.provider.aws.client.Client) of the synthetic account"""
+
+    def __init__(self, account_id):
+        import boto3
+        self.account_id = account_id
+        self.session = boto3.Session(region_name=REGION)
+
+    def get_running_ec2_instance_ids(self, region):
+        ec2 = self.session.client("ec2", region_name=region)
+        return [instance["InstanceId"]
+                for page in ec2.get_paginator("describe_instances").paginate(
+                    Filters=[{"Name": "instance-state-name", "Values": ["running"]}])
+                for reservation in page["Reservations"] for instance in reservation["Instances"]]
+
+    def get_rds_instances(self):
+        rds = self.session.client("rds", region_name=REGION)
+        return [{"id": db["DBInstanceIdentifier"], "type": db["DBInstanceClass"],
+                 "status": db["DBInstanceStatus"], "engine": db["Engine"]}
+                for page in rds.get_paginator("describe_db_instances").paginate()
+                for db in page["DBInstances"]]
+
+
+def report_date():
+    return (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def capture_traces(tracing_module):
+    records = []
+    tracing_module.add_observer(records.append)
+    return records
+
+
+def run_instances_endpoint(fleet, args):
+    sys.path.insert(0, args.api_dir)
+    from fastapi.testclient import TestClient
+    import main as api
+    import tracing
+
+    traces = capture_traces(tracing)
+    response = TestClient(api.app).post("/instances", json={
+        "accessKeyId": os.environ["AWS_ACCESS_KEY_ID"],
+        "secretAccessKey": os.environ["AWS_SECRET_ACCESS_KEY"],
+        "region": REGION,
+    })
+    response.raise_for_status()
+    body = response.json()
+    return {"ec2_instances": len(body["ec2Instances"]), "rds_instances": len(body["rdsInstances"]),
+            "response_bytes": len(response.content), "trace": traces[-1] if traces else None}
+
+
+def run_consolidated(fleet, args):
+    from app import app, tracing
+    from app.inventory import ResourceContext
+
+    traces = capture_traces(tracing)
+    aws_cli = SyntheticAccount(ACCOUNT_ID)
+    resources = ResourceContext(aws_cli, app.REPORT_REGION, account_id=ACCOUNT_ID)
+    report = io.BytesIO()
+    with tracing.Trace("consolidated", account_id=ACCOUNT_ID).activate():
+        instance_ids = resources.running_instance_ids()
+        app.ConsolidatedCloudReport(account_name="Synthetic", account_id=ACCOUNT_ID, report_date=report_date(),
+                                    chart_backend=args.chart_backend).generate_consolidated_report(
+            aws_cli, instance_ids, report, resources=resources)
+    return {"ec2_instances": len(instance_ids), "pdf_bytes": len(report.getvalue()), "trace": traces[-1]}
+
+
+def run_main(fleet, args):
+    from app import app, tracing
+
+    traces = capture_traces(tracing)
+    accounts = {f"{ACCOUNT_ID[:-3]}{index:03d}": f"Synthetic {index}" for index in range(args.accounts)}
+    results = app.main(report_date(), accounts, chart_backend=args.chart_backend, client_factory=SyntheticAccount)
+    # app.main reports failed accounts instead of raising; a run with any is no measurement
+    failed = [result for result in results if result["status"] != "ok"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(results)} accounts did not finish, first: "
+                           f"{failed[0]['status']} {failed[0].get('error', '')}")
+    return {"accounts": {result["status"]: sum(1 for r in results if r["status"] == result["status"])
+                         for result in results},
+            "pdf_bytes": sum(result.get("bytes", 0) for result in results),
+            "trace": next(record for record in traces if record["trace"] == "run")}
+
+
+RUNNERS = {
+    "instances": run_instances_endpoint,
+    "consolidated": run_consolidated,
+    "main": run_main,
+}
+
+
+def _child(func, conn, *args):
+    try:
+        started = time.perf_counter()
+        result = func(*args)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result["peak_rss_bytes"] = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * RSS_UNIT
+    conn.send(result)
+    conn.close()
+
+
+def in_child(func, *args):
+    """Run func(*args) in a forked process and return its result dict with peak_rss_bytes added"""
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(func, child_conn) + args)
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {"error": "Benchmark process exited without a result"}
+    process.join()
+    return result
+
+
+def run_scenario(size, args):
+    from moto import mock_aws
+
+    with multiprocessing.get_context("fork").Manager() as manager, mock_aws():
+        fleet = SyntheticFleet(size, rds_ratio=args.rds_ratio, windows_share=args.windows_share,
+                               agent_share=args.agent_share)
+        # Installed before the first client so every client, boto3's default session included, is covered
+        cloudwatch = SyntheticCloudWatch(fleet, manager)
+        cloudwatch.install()
+        started = time.perf_counter()
+        fleet.seed()
+        scenario = {
+            "scenario": f"fleet-{size}",
+            "ec2_instances": len(fleet.instances),
+            "rds_instances": len(fleet.databases),
+            "seed_seconds": round(time.perf_counter() - started, 3),
+            "targets": {},
+        }
+        for target in args.targets:
+            cloudwatch.calls.clear()
+            result = in_child(RUNNERS[target], fleet, args)
+            result["api_calls"] = cloudwatch.call_counts()
+            result["api_calls_total"] = sum(result["api_calls"].values())
+            scenario["targets"][target] = result
+            print(f"fleet-{size} {target}: {result.get('seconds')}s, {result['api_calls_total']} API calls, "
+                  f"{result['peak_rss_bytes'] / 2 ** 20:.0f} MB{' ' + result['error'] if 'error' in result else ''}",
+                  file=sys.stderr)
+    return scenario
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_dir, new_dir):
+    """Print the new/old ratio of seconds, API calls and peak RSS for every scenario and target in both"""
+    for name in sorted(os.listdir(new_dir)):
+        old_path = os.path.join(old_dir, name)
+        if not name.endswith(".json") or not os.path.exists(old_path):
+            continue
+        with open(old_path) as old_file, open(os.path.join(new_dir, name)) as new_file:
+            old, new = json.load(old_file), json.load(new_file)
+        for target, result in new["targets"].items():
+            before = old["targets"].get(target)
+            if not before or "error" in before or "error" in result:
+                continue
+            print(json.dumps({
+                "scenario": new["scenario"], "target": target,
+                "commits": [old.get("commit"), new.get("commit")],
+                **{f"{field}_ratio": round(result[field] / before[field], 3) if before[field] else None
+                   for field in ("seconds", "api_calls_total", "peak_rss_bytes")},
+            }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="EC2 instances per scenario")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS, help="What to run per scenario")
+    parser.add_argument("--accounts", type=int, default=1, help="Accounts passed to app.main()")
+    parser.add_argument("--rds-ratio", type=float, default=0.1, help="RDS instances per EC2 instance")
+    parser.add_argument("--windows-share", type=float, default=0.1, help="Share of Windows EC2 instances")
+    parser.add_argument("--agent-share", type=float, default=0.8,
+                        help="Share of EC2 instances publishing CloudWatch agent metrics")
+    parser.add_argument("--chart-backend", default=None, help="Chart backend of the reports")
+    parser.add_argument("--api-dir", default=os.path.join(os.path.dirname(ROOT), "api"),
+                        help="Directory of the FastAPI app serving /instances")
+    parser.add_argument("--output-dir", default=os.path.join(ROOT, "benchmarks", "results"))
+    parser.add_argument("--compare", nargs=2, metavar=("OLD_DIR", "NEW_DIR"),
+                        help="Compare two result directories instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    # Offline credentials, and a cold metric cache so every run fetches everything
+    for name, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                        ("AWS_DEFAULT_REGION", REGION), ("CLIO_METRIC_CACHE", "0")):
+        os.environ.setdefault(name, value)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    commit = git_commit()
+    failed = False
+    for size in args.sizes:
+        scenario = in_child(run_scenario, size, args)
+        scenario["commit"] = commit
+        path = os.path.join(args.output_dir, f"fleet-{size}.json")
+        errors = [scenario["error"]] if "error" in scenario else []
+        errors += [f"{target}: {result['error']}" for target, result in scenario.get("targets", {}).items()
+                   if "error" in result]
+        if errors:
+            # A failed run is no result; drop any earlier one so --compare cannot pick it up
+            failed = True
+            print(f"fleet-{size} failed: {'; '.join(errors)}", file=sys.stderr)
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            with open(path, "w") as output:
+                json.dump(scenario, output, indent=2, default=str)
+        summary = {"scenario": scenario.get("scenario"), "seed_seconds": scenario.get("seed_seconds"),
+                   "error": scenario.get("error")}
+        for target, result in scenario.get("targets", {}).items():
+            summary[target] = {field: result.get(field)
+                               for field in ("seconds", "api_calls_total", "peak_rss_bytes", "pdf_bytes", "error")}
+        print(json.dumps(summary))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
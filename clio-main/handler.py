@@ -1,6 +1,8 @@
 import json
 import logging
-from app import app
+import time
+
+from app import warm_cache
 
 # Configure logging
 logger = logging.getLogger()
@@ -12,17 +14,68 @@ def lambda_handler(event, context):
 
     logger.info(f"Invoking report generator: {json.dumps(event)}")
 
-    report_date = event['reportDate']
-    accounts = event['accounts']
+    # The report stack (boto3, ReportLab, NumPy) is imported on first use rather
+    # than at init, and stays loaded in warm containers
+    from app import app, replay
+    from app.checkpoint import CHECKPOINT_RESERVE_SECONDS, Checkpoint
+
+    # AWS_RECORD_PATH / AWS_REPLAY_PATH record every AWS exchange of the run, or replay one offline
+    aws_run = replay.install_from_env()
+    try:
+        warm_cache.reset_stats()
+
+        # A continuation token resumes a run that hit the time budget earlier
+        token = event.get('continuationToken')
+        checkpoint = Checkpoint.load(token) if token else Checkpoint.start(event)
+        accounts = checkpoint.remaining_accounts()
+
+        # Stop early enough to write the checkpoint before Lambda kills the invocation
+        deadline = None
+        if context is not None:
+            remaining_seconds = context.get_remaining_time_in_millis() / 1000
+            deadline = time.monotonic() + remaining_seconds - CHECKPOINT_RESERVE_SECONDS
+
+        results = app.main(checkpoint.report_date, accounts, chart_backend=checkpoint.chart_backend,
+                           max_workers=int(event.get('maxWorkers', app.ACCOUNT_WORKERS)),
+                           deadline=deadline)
+        checkpoint.record(results)
+
+        pending = [result['account_id'] for result in results if result['status'] == 'pending']
+        results = checkpoint.results()
+        failed = [result['account_id'] for result in results if result['status'] != 'ok']
+        logger.info(f"Reports done: {len(results) - len(failed)} ok, {len(failed)} failed {failed}, "
+                    f"{len(pending)} pending {pending}")
+
+        # Module caches outlive the invocation; show how much a warm container saved
+        logger.info(f"Warm cache stats: {json.dumps(warm_cache.cache_stats())}")
+
+        body = {
+            "reportDate": checkpoint.report_date,
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "pending": len(pending),
+            "accounts": results
+        }
+        if pending:
+            # Invoke again with {"continuationToken": ...} to finish the run
+            checkpoint.save()
+            body["continuationToken"] = checkpoint.token
+            status_code = 202
+        else:
+            if token:
+                checkpoint.delete()
+            status_code = 200 if not failed else 207
+    finally:
+        # Unhook the recorder even if the run failed, keeping what it captured
+        replay.finish(aws_run)
 
-    app.main(report_date, accounts)
-    
     # Prepare the response
     response = {
-        "statusCode": 200,
+        "statusCode": status_code,
         "headers": {
             "Content-Type": "application/json"
-        }
+        },
+        "body": json.dumps(body)
     }
     
     return response
\ No newline at end of file
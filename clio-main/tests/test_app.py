@@ -0,0 +1,52 @@
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app import app, metric_store, uploads
+
+REGION = "ap-south-1"
+
+
+class StubClient:
+    """Provider client of an empty account"""
+
+    def __init__(self, account_id):
+        self.account_id = account_id
+        self.session = boto3.Session(region_name=REGION)
+
+    def get_running_ec2_instance_ids(self, region):
+        return []
+
+    def get_rds_instances(self):
+        return []
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    monkeypatch.setattr(metric_store, "METRIC_CACHE_DIR", str(tmp_path))
+    with mock_aws():
+        client = boto3.client("s3", region_name=REGION)
+        client.create_bucket(Bucket=uploads.REPORT_BUCKET,
+                             CreateBucketConfiguration={"LocationConstraint": REGION})
+        yield client
+
+
+def test_report_code_loads_without_the_provider_package():
+    assert "app.provider.aws.client" not in sys.modules
+
+
+def test_accounts_sharing_a_name_get_their_own_report(s3):
+    accounts = {"111111111111": "Acme", "222222222222": "Acme", "333333333333": "Globex"}
+
+    # One worker runs the accounts in this process, so their uploads land in this moto backend
+    results = app.main("2025-03-23", accounts, max_workers=1, client_factory=StubClient)
+
+    assert [result["status"] for result in results] == ["ok"] * 3
+    keys = [result["s3_key"] for result in results]
+    assert keys == ["clients/manapuram/2025-03-23/Acme-111111111111.pdf",
+                    "clients/manapuram/2025-03-23/Acme-222222222222.pdf",
+                    "clients/manapuram/2025-03-23/Globex.pdf"]
+    for key in keys:
+        assert s3.get_object(Bucket=uploads.REPORT_BUCKET, Key=key)["Body"].read().startswith(b"%PDF")
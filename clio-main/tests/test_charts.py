@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app import charts
+from app.charts import chart_spec, chart_workers, render_charts
+from app.series import MetricSeries
+
+START = 1740787200.0  # 2025-03-01T00:00:00Z
+
+
+def cpu_series(count=288):
+    timestamps = START + 300.0 * np.arange(count)
+    values = 50 + 30 * np.sin(np.arange(count) / 20)
+    return MetricSeries(timestamps, values)
+
+
+def test_inline_render_returns_none_for_a_failed_chart():
+    good = chart_spec(cpu_series(), "CPU", "web")
+    bad = dict(good, timestamps=None)
+
+    images = render_charts([good, bad, good], max_workers=1)
+
+    assert images[0].startswith(b"\x89PNG")
+    assert images[1] is None
+    assert images[2].startswith(b"\x89PNG")
+
+
+def test_parallel_render_returns_none_for_a_failed_chart():
+    good = chart_spec(cpu_series(), "CPU", "web")
+    bad = dict(good, timestamps=None)
+
+    images = render_charts([good, bad], max_workers=2)
+
+    assert images[0].startswith(b"\x89PNG")
+    assert images[1] is None
+
+
+@pytest.mark.parametrize("cpus, account_workers, expected", [(8, 4, 2), (8, 1, 8), (2, 4, 1), (8, 0, 8)])
+def test_chart_workers_split_the_cores_between_accounts(monkeypatch, cpus, account_workers, expected):
+    monkeypatch.setattr(charts, "CHART_WORKERS", 0)
+    monkeypatch.setattr(charts.os, "cpu_count", lambda: cpus)
+    assert chart_workers(account_workers) == expected
+
+
+def test_chart_workers_setting_wins(monkeypatch):
+    monkeypatch.setattr(charts, "CHART_WORKERS", 3)
+    assert chart_workers(4) == 3
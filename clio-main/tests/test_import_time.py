@@ -0,0 +1,20 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on the first report, never during the Lambda init phase
+HEAVY_MODULES = ("matplotlib", "reportlab", "numpy")
+
+
+def modules_loaded_by(module):
+    script = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return {name.split(".")[0] for name in json.loads(completed.stdout)}
+
+
+def test_handler_import_skips_the_report_stack():
+    loaded = modules_loaded_by("handler")
+    assert not loaded & set(HEAVY_MODULES)
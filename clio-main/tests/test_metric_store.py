@@ -0,0 +1,51 @@
+import multiprocessing
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.metric_store import MetricStore
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def write_series(directory, resource, count):
+    store = MetricStore(directory)
+    key = ("123456789012", "ap-south-1", resource, "AWS/EC2/CPUUtilization/Average", 300)
+    for index in range(count):
+        start = START + timedelta(minutes=5 * index)
+        store.write(key, start, start + timedelta(minutes=5), [(start, float(index))])
+
+
+def test_store_uses_wal(tmp_path):
+    store = MetricStore(str(tmp_path))
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_forked_writers_share_the_store(tmp_path):
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=write_series, args=(str(tmp_path), f"i-{n}", 200)) for n in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert [writer.exitcode for writer in writers] == [0, 0, 0, 0]
+    store = MetricStore(str(tmp_path))
+    for n in range(4):
+        key = ("123456789012", "ap-south-1", f"i-{n}", "AWS/EC2/CPUUtilization/Average", 300)
+        assert len(store.read(key, START, START + timedelta(days=1))) == 200
+
+
+def test_locked_store_raises_after_busy_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.metric_store.METRIC_CACHE_BUSY_TIMEOUT", 0.1)
+    store = MetricStore(str(tmp_path))
+    blocker = sqlite3.connect(store.path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        key = ("123456789012", "ap-south-1", "i-1", "AWS/EC2/CPUUtilization/Average", 300)
+        with pytest.raises(sqlite3.OperationalError):
+            store.write(key, START, START + timedelta(minutes=5), [(START, 1.0)])
+    finally:
+        blocker.rollback()
+        blocker.close()
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from app.metrics import MAX_DATAPOINTS_PER_QUERY, MetricDataCollector, split_window
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+END = START + timedelta(days=31)
+
+
+class FakeCloudWatch:
+    """Answers GetMetricData with one datapoint per period, two pages per window"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy, NextToken=None):
+        self.calls.append((StartTime, EndTime, NextToken))
+        period = MetricDataQueries[0]["MetricStat"]["Period"]
+        timestamps = []
+        timestamp = StartTime
+        while timestamp < EndTime:
+            timestamps.append(timestamp)
+            timestamp += timedelta(seconds=period)
+        half = len(timestamps) // 2
+        page = timestamps[half:] if NextToken else timestamps[:half]
+        response = {"MetricDataResults": [
+            {"Id": query["Id"], "Timestamps": page, "Values": [1.0] * len(page)}
+            for query in MetricDataQueries
+        ]}
+        if not NextToken:
+            response["NextToken"] = "page-2"
+        return response
+
+
+def test_split_window_covers_the_window_in_bounded_chunks():
+    chunks = split_window(START, END, 300)
+
+    assert chunks[0][0] == START and chunks[-1][1] == END
+    assert all(left[1] == right[0] for left, right in zip(chunks, chunks[1:]))
+    assert all(end - start <= timedelta(seconds=300 * MAX_DATAPOINTS_PER_QUERY) for start, end in chunks)
+
+
+def test_monthly_window_at_300s_is_not_truncated():
+    cloudwatch = FakeCloudWatch()
+    collector = MetricDataCollector(cloudwatch, period=300)
+    collector.add("cpu", "AWS/EC2", "CPUUtilization", [{"Name": "InstanceId", "Value": "i-123"}])
+
+    results = collector.collect(START, END)
+
+    datapoints = results["cpu"]["Datapoints"]
+    assert len(datapoints) == 31 * 288
+    assert [point["Timestamp"] for point in datapoints] == sorted(point["Timestamp"] for point in datapoints)
+    windows = {(start, end) for start, end, _ in cloudwatch.calls}
+    assert len(windows) == len(split_window(START, END, 300))
+    # Every window was paged through with NextToken
+    assert len(cloudwatch.calls) == 2 * len(windows)
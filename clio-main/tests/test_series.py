@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.charts import chart_spec
+from app.series import MetricSeries, lttb_indices
+
+START = 1740787200.0  # 2025-03-01T00:00:00Z
+
+
+def noisy_series(count=8640, seed=7):
+    rng = np.random.default_rng(seed)
+    timestamps = START + 300.0 * np.arange(count)
+    values = 40 + 10 * np.sin(np.arange(count) / 50) + rng.normal(0, 2, count)
+    values[count // 7] = 99.5  # short spike
+    values[count * 2 // 3] = 0.5  # short dip
+    return MetricSeries(timestamps, values)
+
+
+@pytest.mark.parametrize("max_points", [3, 10, 600, 8639])
+def test_lttb_keeps_endpoints_within_budget(max_points):
+    series = noisy_series()
+
+    indexes = lttb_indices(series.timestamps, series.values, max_points)
+
+    assert len(indexes) <= max_points
+    assert indexes[0] == 0 and indexes[-1] == len(series) - 1
+    assert np.all(np.diff(indexes) > 0)
+
+
+def test_lttb_returns_every_index_for_short_series():
+    series = noisy_series(100)
+    assert list(lttb_indices(series.timestamps, series.values, 600)) == list(range(100))
+
+
+def test_downsampled_keeps_the_extremes():
+    series = noisy_series()
+
+    plotted = series.downsampled(600)
+
+    assert len(plotted) <= 602
+    assert plotted.values.max() == series.values.max()
+    assert plotted.values.min() == series.values.min()
+    assert series.timestamps[series.values.argmax()] in plotted.timestamps
+    assert series.timestamps[series.values.argmin()] in plotted.timestamps
+    assert np.all(np.diff(plotted.timestamps) > 0)
+
+
+def test_short_series_is_not_downsampled():
+    series = noisy_series(100)
+    assert series.downsampled(600) is series
+
+
+def test_chart_spec_stats_come_from_the_full_series():
+    series = noisy_series()
+    stats = series.stats()
+
+    spec = chart_spec(series, "CPU", "web", max_points=600)
+
+    assert len(spec["values"]) <= 602
+    assert spec["stats_text"] == (
+        f"Min: {stats['min']:.2f}% | Max: {stats['max']:.2f}% | Avg: {stats['mean']:.2f}%")
+    # The plotted copy has a different mean, so the footer cannot come from it
+    plotted_mean = MetricSeries(spec["timestamps"], spec["values"]).stats()["mean"]
+    assert f"{plotted_mean:.4f}" != f"{stats['mean']:.4f}"
+
+
+def test_chart_spec_of_empty_series_is_none():
+    assert chart_spec(MetricSeries([], []), "CPU", "web") is None
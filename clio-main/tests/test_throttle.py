@@ -0,0 +1,61 @@
+import pytest
+
+from app import throttle
+from app.throttle import RATE_DECREASE_INTERVAL, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle, "time", clock)
+    return clock
+
+
+def test_acquire_paces_requests_at_the_rate(clock):
+    bucket = TokenBucket(rate=10, max_rate=10)
+    started = clock.now
+    for _ in range(21):
+        bucket.acquire()
+    # The first request uses the initial token; the other 20 wait 0.1 s each
+    assert clock.now - started == pytest.approx(2.0)
+    assert bucket.requests == 21
+
+
+def test_burst_of_throttles_halves_the_rate_once(clock):
+    bucket = TokenBucket(rate=80, max_rate=100)
+    for _ in range(50):
+        bucket.on_throttle()
+        clock.now += 0.001
+    assert bucket.rate == 40
+    assert bucket.throttles == 50
+
+    clock.now += RATE_DECREASE_INTERVAL
+    bucket.on_throttle()
+    assert bucket.rate == 20
+
+
+def test_rate_recovers_additively_up_to_the_maximum(clock):
+    bucket = TokenBucket(rate=4, max_rate=7)
+    for _ in range(5):
+        clock.now += 1
+        bucket.on_success()
+    assert bucket.rate == 7
+
+
+def test_rate_never_drops_below_the_minimum(clock):
+    bucket = TokenBucket(rate=1, max_rate=10, min_rate=0.5)
+    for _ in range(5):
+        clock.now += RATE_DECREASE_INTERVAL
+        bucket.on_throttle()
+    assert bucket.rate == 0.5
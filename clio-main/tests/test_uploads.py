@@ -0,0 +1,81 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from app import uploads
+from app.uploads import report_s3_client, upload_report
+
+BUCKET = "reports"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(uploads.time, "sleep", lambda seconds: None)
+    with mock_aws():
+        session = boto3.Session(region_name="us-east-1")
+        client = report_s3_client(session)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+class FlakyS3:
+    """Fails the first upload attempts, then hands over to the real client"""
+
+    def __init__(self, s3, failures):
+        self.s3 = s3
+        self.failures = failures
+        self.calls = 0
+
+    def upload_fileobj(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("connection reset")
+        return self.s3.upload_fileobj(*args, **kwargs)
+
+
+def test_large_report_goes_up_in_parts(s3):
+    data = bytes(range(256)) * (4 * 1024 * (2 * uploads.UPLOAD_PART_MB + 1))
+
+    outcome = upload_report(s3, "clients/x/2025-03-23/Acme.pdf", data, bucket=BUCKET)
+
+    assert outcome["status"] == "ok"
+    assert outcome["bytes"] == len(data)
+    head = s3.head_object(Bucket=BUCKET, Key="clients/x/2025-03-23/Acme.pdf", PartNumber=1)
+    assert head["PartsCount"] == 3
+    assert s3.get_object(Bucket=BUCKET, Key="clients/x/2025-03-23/Acme.pdf")["Body"].read() == data
+
+
+def test_failed_upload_is_retried(s3):
+    flaky = FlakyS3(s3, failures=1)
+
+    outcome = upload_report(flaky, "clients/x/2025-03-23/Acme.pdf", b"%PDF-1.4", bucket=BUCKET)
+
+    assert outcome["status"] == "ok"
+    assert outcome["attempts"] == 2
+    assert s3.get_object(Bucket=BUCKET, Key="clients/x/2025-03-23/Acme.pdf")["Body"].read() == b"%PDF-1.4"
+
+
+def test_upload_reports_an_error_after_every_attempt(s3):
+    flaky = FlakyS3(s3, failures=uploads.UPLOAD_ATTEMPTS)
+
+    outcome = upload_report(flaky, "clients/x/2025-03-23/Acme.pdf", b"%PDF-1.4", bucket=BUCKET)
+
+    assert outcome["status"] == "error"
+    assert outcome["attempts"] == uploads.UPLOAD_ATTEMPTS
+    assert "connection reset" in outcome["error"]
+
+
+def test_client_is_pooled_per_session():
+    with mock_aws():
+        first = boto3.Session(aws_access_key_id="a", aws_secret_access_key="a", region_name="us-east-1")
+        second = boto3.Session(aws_access_key_id="b", aws_secret_access_key="b", region_name="us-east-1")
+        assert report_s3_client(first) is report_s3_client(first)
+        assert report_s3_client(first) is not report_s3_client(second)
+
+
+def test_client_is_pooled_per_region():
+    with mock_aws():
+        mumbai = boto3.Session(aws_access_key_id="a", aws_secret_access_key="a", region_name="ap-south-1")
+        virginia = boto3.Session(aws_access_key_id="a", aws_secret_access_key="a", region_name="us-east-1")
+        assert report_s3_client(mumbai).meta.region_name == "ap-south-1"
+        assert report_s3_client(virginia).meta.region_name == "us-east-1"
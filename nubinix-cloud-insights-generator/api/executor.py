@@ -0,0 +1,46 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# Blocking AWS calls (boto3) run on a bounded thread pool
+AWS_IO_WORKERS = int(os.environ.get("AWS_IO_WORKERS", "32"))
+
+# CPU-heavy chart and PDF work runs on a process pool, off the GIL
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+io_executor = ThreadPoolExecutor(max_workers=AWS_IO_WORKERS, thread_name_prefix="aws-io")
+_cpu_executor = None
+
+
+def get_cpu_executor():
+    """Create the render process pool on first use so importing the app stays cheap"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _cpu_executor
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O call on the AWS thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, partial(func, *args, **kwargs))
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Run a CPU-bound call on the render process pool
+
+    func and its arguments must be picklable, i.e. module-level functions
+    and plain data or pydantic models
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown():
+    global _cpu_executor
+    io_executor.shutdown(wait=False, cancel_futures=True)
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
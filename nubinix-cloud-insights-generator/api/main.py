@@ -18,6 +18,8 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.pdfgen import canvas
 
+from executor import run_cpu, shutdown as shutdown_executors
+
 class Instance(BaseModel):
     id: str
     name: str = ""
@@ -41,6 +43,7 @@ class ReportRequest(BaseModel):
     frequency: str
 
 app = FastAPI()
+app.router.add_event_handler("shutdown", shutdown_executors)
 
 # Configure CORS properly
 app.add_middleware(
@@ -109,106 +112,112 @@ def get_time_range(frequency):
         start_time = now - timedelta(days=30)
     return start_time, now
 
-@app.post("/generate-report")
-async def generate_report(request: ReportRequest):
-    try:
-        start_time, end_time = get_time_range(request.frequency)
-        temp_dir = tempfile.mkdtemp(dir="temp_reports") #Use temp_reports directory
-        pdf_filename = f"{request.credentials.accountName}-{datetime.now().strftime('%Y-%m-%d')}.pdf"
-        pdf_path = os.path.join(temp_dir, pdf_filename)
-
-        session = boto3.Session(
-            aws_access_key_id=request.credentials.accessKeyId,
-            aws_secret_access_key=request.credentials.secretAccessKey,
-            region_name=request.credentials.region or 'us-east-1'
-        )
-        cloudwatch = session.client('cloudwatch')
-
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=24,
-            spaceAfter=30
-        )
-        elements.append(Paragraph(f"{request.credentials.accountName}", title_style))
-        elements.append(Paragraph(f"Account {request.frequency.capitalize()} Report", title_style))
-
-        # Add report information table
-        data = [
-            ["Account", request.credentials.accountName],
-            ["Report", "Resource Utilization"],
-            ["Cloud Provider", request.provider.upper()],
-            ["Account ID", request.credentials.accountId or "N/A"],
-            ["Date", datetime.now().strftime("%Y-%m-%d")]
+def build_report(request: ReportRequest):
+    start_time, end_time = get_time_range(request.frequency)
+    temp_dir = tempfile.mkdtemp(dir="temp_reports") #Use temp_reports directory
+    pdf_filename = f"{request.credentials.accountName}-{datetime.now().strftime('%Y-%m-%d')}.pdf"
+    pdf_path = os.path.join(temp_dir, pdf_filename)
+
+    session = boto3.Session(
+        aws_access_key_id=request.credentials.accessKeyId,
+        aws_secret_access_key=request.credentials.secretAccessKey,
+        region_name=request.credentials.region or 'us-east-1'
+    )
+    cloudwatch = session.client('cloudwatch')
+
+    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=24,
+        spaceAfter=30
+    )
+    elements.append(Paragraph(f"{request.credentials.accountName}", title_style))
+    elements.append(Paragraph(f"Account {request.frequency.capitalize()} Report", title_style))
+
+    # Add report information table
+    data = [
+        ["Account", request.credentials.accountName],
+        ["Report", "Resource Utilization"],
+        ["Cloud Provider", request.provider.upper()],
+        ["Account ID", request.credentials.accountId or "N/A"],
+        ["Date", datetime.now().strftime("%Y-%m-%d")]
+    ]
+
+    table = Table(data, colWidths=[1.5*inch, 3*inch])
+    table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (0, -1), colors.grey),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 20))
+
+    # Process each instance
+    for instance in request.selected_instances:
+        elements.append(PageBreak())
+        elements.append(Paragraph(f"Host: {instance.name}", styles['Heading1']))
+
+        # Instance info table
+        instance_data = [
+            ["Instance ID", instance.id],
+            ["Type", instance.type],
+            ["Operating System", instance.os],
+            ["State", instance.state]
         ]
 
-        table = Table(data, colWidths=[1.5*inch, 3*inch])
-        table.setStyle(TableStyle([
+        instance_table = Table(instance_data, colWidths=[1.5*inch, 4*inch])
+        instance_table.setStyle(TableStyle([
             ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('BACKGROUND', (0, 0), (0, -1), colors.grey),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.whitesmoke),
+            ('BACKGROUND', (0, 0), (0, -1), colors.white),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
             ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('PADDING', (0, 0), (-1, -1), 6)
         ]))
-        elements.append(table)
+        elements.append(instance_table)
         elements.append(Spacer(1, 20))
 
-        # Process each instance
-        for instance in request.selected_instances:
-            elements.append(PageBreak())
-            elements.append(Paragraph(f"Host: {instance.name}", styles['Heading1']))
-
-            # Instance info table
-            instance_data = [
-                ["Instance ID", instance.id],
-                ["Type", instance.type],
-                ["Operating System", instance.os],
-                ["State", instance.state]
-            ]
-
-            instance_table = Table(instance_data, colWidths=[1.5*inch, 4*inch])
-            instance_table.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('BACKGROUND', (0, 0), (0, -1), colors.white),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('PADDING', (0, 0), (-1, -1), 6)
-            ]))
-            elements.append(instance_table)
-            elements.append(Spacer(1, 20))
-
-            # Get metrics and generate graphs
-            metrics = ["cpu", "memory", "disk"]
-            for metric in metrics:
-                try:
-                    response = cloudwatch.get_metric_statistics(
-                        Namespace="AWS/EC2",
-                        MetricName=f"{metric}Utilization",
-                        Dimensions=[{"Name": "InstanceId", "Value": instance.id}],
-                        StartTime=start_time,
-                        EndTime=end_time,
-                        Period=300,
-                        Statistics=["Average"]
-                    )
-
-                    if response['Datapoints']:
-                        graph_path = generate_metric_graph(response, metric, instance.name, temp_dir)
-                        if graph_path:
-                            elements.append(Paragraph(f"{metric.upper()} UTILIZATION", styles['Heading2']))
-                            img = Image(graph_path, width=6*inch, height=2*inch)
-                            elements.append(img)
-                            elements.append(Spacer(1, 20))
-                except Exception as e:
-                    print(f"Error getting metrics for {instance.id}: {str(e)}")
-
-        doc.build(elements)
+        # Get metrics and generate graphs
+        metrics = ["cpu", "memory", "disk"]
+        for metric in metrics:
+            try:
+                response = cloudwatch.get_metric_statistics(
+                    Namespace="AWS/EC2",
+                    MetricName=f"{metric}Utilization",
+                    Dimensions=[{"Name": "InstanceId", "Value": instance.id}],
+                    StartTime=start_time,
+                    EndTime=end_time,
+                    Period=300,
+                    Statistics=["Average"]
+                )
+
+                if response['Datapoints']:
+                    graph_path = generate_metric_graph(response, metric, instance.name, temp_dir)
+                    if graph_path:
+                        elements.append(Paragraph(f"{metric.upper()} UTILIZATION", styles['Heading2']))
+                        img = Image(graph_path, width=6*inch, height=2*inch)
+                        elements.append(img)
+                        elements.append(Spacer(1, 20))
+            except Exception as e:
+                print(f"Error getting metrics for {instance.id}: {str(e)}")
+
+    doc.build(elements)
+
+    return pdf_path, pdf_filename
+
+@app.post("/generate-report")
+async def generate_report(request: ReportRequest):
+    try:
+        # Metric fetch, charts and doc.build run in the render process pool
+        pdf_path, pdf_filename = await run_cpu(build_report, request)
 
         headers = {
             "Content-Disposition": f"attachment; filename={pdf_filename}",
@@ -4,7 +4,7 @@ import { Input } from '@/components/ui/input';
 import { CloudProvider, Credentials, InstanceData } from '@/types'; // Added InstanceData type
 import { Eye, EyeOff, Key, Lock } from 'lucide-react';
 import LoadingSpinner from './LoadingSpinner';
-import { validateCredentials, fetchInstances } from '@/services/api';
+import { validateCredentials, streamInstances } from '@/services/api';
 import { Select, SelectTrigger, SelectValue, SelectContent, SelectItem } from '@radix-ui/react-select'
 import { Globe } from 'lucide-react';
 
@@ -37,7 +37,8 @@ const CredentialsInput: React.FC<CredentialsInputProps> = ({
       console.log('Starting validation with credentials');
       await validateCredentials(provider, credentials);
       console.log('Credentials validated, fetching instances');
-      const instances = await fetchInstances(provider, credentials);
+      // Regions are shown as they finish scanning instead of after the slowest one
+      const instances = await streamInstances(provider, credentials, onInstancesUpdate);
       console.log('Instances fetched:', instances);
       onInstancesUpdate(instances); // Passing instances to parent component
       if (!instances.ec2Instances || instances.ec2Instances.length === 0) {
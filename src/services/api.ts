@@ -1,6 +1,6 @@
 
 import axios from 'axios';
-import { CloudProvider, Credentials, Instance, RDSInstance } from '@/types';
+import { CloudProvider, Credentials, Instance, InstanceData, RDSInstance } from '@/types';
 
 const API_URL = window.location.protocol + '//' + window.location.hostname + ':8000';
 
@@ -39,6 +39,58 @@ export const fetchInstances = async (provider: CloudProvider, credentials: Crede
   }
 };
 
+// Like fetchInstances, but reads /instances/stream and calls onProgress with
+// everything found so far each time a region finishes scanning
+export const streamInstances = async (
+  provider: CloudProvider,
+  credentials: Credentials,
+  onProgress?: (instances: InstanceData) => void
+): Promise<InstanceData> => {
+  const found: InstanceData = { ec2Instances: [], rdsInstances: [] };
+  let response: Response;
+  try {
+    response = await fetch(`${API_URL}/instances/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+      body: JSON.stringify(credentials)
+    });
+  } catch (error: any) {
+    console.error('Error fetching instances:', error);
+    throw new Error('Network error while fetching instances');
+  }
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.detail || 'Failed to fetch instances');
+  }
+
+  const handleRecord = (record: any) => {
+    if (record.type === 'region') {
+      found.ec2Instances = [...found.ec2Instances, ...record.ec2Instances.map((instance: any) => ({ ...instance, selected: false }))];
+      found.rdsInstances = [...found.rdsInstances, ...record.rdsInstances.map((instance: any) => ({ ...instance, selected: false }))];
+      onProgress?.({ ...found });
+    } else if (record.type === 'error' || (record.type === 'summary' && record.error)) {
+      throw new Error(record.detail || record.error);
+    }
+  };
+
+  // One JSON record per line; a read can end mid-line
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split('\n');
+    buffered = lines.pop() ?? '';
+    lines.filter(line => line.trim()).forEach(line => handleRecord(JSON.parse(line)));
+    if (done) break;
+  }
+  if (buffered.trim()) {
+    handleRecord(JSON.parse(buffered));
+  }
+  return found;
+};
+
 export const generateReport = async (
   provider: CloudProvider,
   credentials: Credentials,
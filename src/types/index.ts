@@ -44,6 +44,11 @@ export interface RDSInstance extends Instance {
   size: string;
 }
 
+export interface InstanceData {
+  ec2Instances: Instance[];
+  rdsInstances: RDSInstance[];
+}
+
 export type ReportFrequency = 'daily' | 'weekly' | 'monthly';
 
 export type Step = 